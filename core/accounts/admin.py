@@ -9,7 +9,8 @@ from django.utils.translation import gettext_lazy as _
 from .models import (
     User,
     Profile,
-    Address
+    Address,
+    Referral
 )
 
 
@@ -21,6 +22,10 @@ class ProfileAdminInline(admin.StackedInline):
     fk_name = 'user'
     readonly_fields = ['thumbnail']
 
+    def get_queryset(self, request):
+        # Shown with its __str__, which reads the user
+        return super().get_queryset(request).select_related('user')
+
     def thumbnail(self, instance):
         """
         Thumbnail of the profile picture in the admin site.
@@ -45,6 +50,10 @@ class AddressAdminInline(admin.StackedInline):
     verbose_name_plural = _('Address')
     fk_name = 'user'
 
+    def get_queryset(self, request):
+        # Shown with its __str__, which reads the user
+        return super().get_queryset(request).select_related('user')
+
 
 @admin.register(User)
 class UserAdmin(UserAdmin):
@@ -53,6 +62,8 @@ class UserAdmin(UserAdmin):
     ordering = ['id']
     model = User
     list_display = ("phone_number",)
+    # Also used by the autocomplete widgets of the user foreign keys
+    search_fields = ("phone_number",)
     fieldsets = (
         (None, {'fields': (
             "phone_number", "referral_counter",
@@ -80,3 +91,11 @@ class UserAdmin(UserAdmin):
             )
         }),
     )
+
+
+@admin.register(Referral)
+class ReferralAdmin(admin.ModelAdmin):
+    """Admin panel config for referral edges."""
+    list_display = ('referrer', 'referred', 'created_at')
+    list_select_related = ('referrer', 'referred')
+    raw_id_fields = ('referrer', 'referred')
@@ -2,26 +2,38 @@
 Serializers for Accounts app.
 """
 import logging
-import uuid
-import random
-from datetime import (
-    datetime,
-    timedelta
-)
 
-from django.utils import timezone
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
 from django.contrib.auth.password_validation import validate_password
 from django.core import exceptions
+from django.db import transaction
 from django.utils.translation import gettext_lazy as _
+from redis.exceptions import RedisError
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
 
 from ...models import (
     Profile,
     Address
 )
+from ...services import provision_user
+from ...tokens import (
+    RefreshToken,
+    is_blacklisted,
+    is_blacklisted_in_db
+)
+from ...tasks import (
+    deliver_temporary_password,
+    generate_temporary_password,
+    send_otp
+)
+from ...otp import (
+    OtpStore,
+    OtpRestError,
+    otp_store
+)
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -50,14 +62,14 @@ class RegistrationSerializer(serializers.ModelSerializer):
         password = attrs.get('password', None)
         password1 = attrs.get('password1', None)
         if referral is not None:
-            try:
-                user_obj = User.objects.get(referral_code=referral)
-                user_obj.referral_counter += 1
-                user_obj.save()
-            except User.DoesNotExist:
+            referrer_id = User.objects.filter(
+                referral_code=referral
+            ).values_list('id', flat=True).first()
+            if referrer_id is None:
                 raise serializers.ValidationError(
                     {'referral': _('The referral code is not valid.')}
                 )
+            attrs['referrer_id'] = referrer_id
 
         if password != password1:
             raise serializers.ValidationError(
@@ -80,33 +92,20 @@ class RegistrationSerializer(serializers.ModelSerializer):
         """Creating user objects with encrypted password."""
         phone_number = validated_data.get('phone_number')
         validated_data.pop('password1')
-        referral_code = validated_data.pop('referral', None)
-        if referral_code:
-            encrypted_user = User.objects.create_user(
-                used_referral_code=True,
-                default_discount=5,
-                **validated_data
-            )
-
-        else:
-            encrypted_user = User.objects.create_user(
-                **validated_data
-            )
-        otp = random.randint(100000, 999999)
-        otp_expiry = datetime.now() + timedelta(minutes=2)
-        max_try_otp = 19
-
+        validated_data.pop('referral', None)
+        referrer_id = validated_data.pop('referrer_id', None)
+        if referrer_id:
+            validated_data.update(used_referral_code=True, default_discount=5)
+        encrypted_user = provision_user(
+            referrer_id=referrer_id, **validated_data
+        )
         try:
-            cache.set(
-                key=f'{phone_number}',
-                value=f'{phone_number}/{otp_expiry}/{max_try_otp}/{otp}',
-            )
-            # TODO:Send OTP via SMS
-
-        except Exception as e:
+            send_otp(phone_number, otp_store.issue(phone_number))
+        except OtpRestError:
+            pass
+        except RedisError as e:
             logger.warning(
-                _(f"Check the Redis connection...\
-                  The error {list(e)} has occurred.")
+                "Check the Redis connection...The error %s has occurred.", e
             )
 
         return encrypted_user
@@ -124,96 +123,69 @@ class VerificationSerializer(serializers.Serializer):
 
         try:
             user = User.objects.get(phone_number=phone_number)
-            if user.is_verified:
-                raise serializers.ValidationError(
-                    {'detail': _('You have already been verified.')}
-                )
-            otp_data = cache.get(phone_number)
-            if otp_data:
-                otp_expiry = otp_data.split('/')[1]
-                max_try_otp = str(otp_data).split('/')[2]
-                otp_code = otp_data.split('/')[3]
-
-                if int(otp_code) != otp:
-                    """Validating OTP."""
-                    raise serializers.ValidationError(
-                        {'detail': _(
-                            'OTP(one time password) is not valid.'
-                        )}
-                    )
-                elif int(max_try_otp) == 0:
-                    """
-                    Prevent getting OTP too many times
-                    and deleting the old OTP from cache.
-                    """
-                    try:
-                        rest = datetime.now() + timedelta(hours=2)
-                        new_value = f'{otp_data}/{rest}'
-
-                        try:
-                            cache.delete(phone_number)
-                            cache.set(
-                                key=f'{phone_number}',
-                                value=new_value,
-                            )
-                        except Exception as e:
-                            logger.warning(
-                                _(f"Check the Redis connection...\
-                                  The error {list(e)} has occurred.")
-                            )
-
-                    except Exception as e:
-                        logger.warning(
-                            _(
-                                f"Check the Redis connection...\
-                                    The error {list(e)} has occurred."
-                            )
-                        )
-                    raise serializers.ValidationError(
-                        {'detail': _(
-                            'You must wait until the rest time(2 Hours) finishes.' # noqa
-                        )}
-                    )
-
-                elif otp_expiry < str(timezone.now()):
-                    """
-                    If otp_expiry is less than timezone.now():
-                    TODO: decreasing otp_max_try value in
-                    cache key and updating the expiry time.
-                    """
-                    new_max_try_otp = int(max_try_otp) - 1
-                    new_value = f'{phone_number}/{otp_expiry}/{new_max_try_otp}/{otp}' # noqa
-
-                    try:
-                        cache.delete(phone_number)
-                        cache.set(key=f'{phone_number}', value=new_value)
-                    except Exception as e:
-                        logger.warning(
-                            _(
-                                f"Check the Redis connection...\
-                                    The error {list(e)} has occurred."
-                            )
-                        )
-
-                    raise serializers.ValidationError(
-                        {'detail': _(
-                            'The expiry time of the OTP(one time password) has been reached...Get a new one.' # noqa
-                        )}
-                    )
         except User.DoesNotExist:
             raise serializers.ValidationError(
                 {'detail': _(
                     'There is no user with the provided phone number.'
                 )}
             )
+        if user.is_verified:
+            raise serializers.ValidationError(
+                {'detail': _('You have already been verified.')}
+            )
+
+        try:
+            result = otp_store.verify(phone_number, otp)
+        except RedisError as e:
+            logger.warning(
+                "Check the Redis connection...The error %s has occurred.", e
+            )
+            raise serializers.ValidationError(
+                {'detail': _(
+                    'Verification is not available right now...Try again later.' # noqa
+                )}
+            )
+
+        if result == OtpStore.RESTING:
+            raise serializers.ValidationError(
+                {'detail': _(
+                    'You must wait until the rest time(2 Hours) finishes.'
+                )}
+            )
+        elif result == OtpStore.EXPIRED:
+            raise serializers.ValidationError(
+                {'detail': _(
+                    'The expiry time of the OTP(one time password) has been reached...Get a new one.' # noqa
+                )}
+            )
+        elif result == OtpStore.EXHAUSTED:
+            raise serializers.ValidationError(
+                {'detail': _(
+                    'Too many wrong OTP(one time password) attempts...Get a new one.' # noqa
+                )}
+            )
+        elif result != OtpStore.VALID:
+            raise serializers.ValidationError(
+                {'detail': _('OTP(one time password) is not valid.')}
+            )
 
         attrs['user'] = user
         attrs['otp'] = otp
         return super(VerificationSerializer, self).validate(attrs)
 
 
-class LoginSerializer(TokenObtainPairSerializer):
+class LoginSerializer(jwt_serializers.TokenObtainPairSerializer):
     """Serializer for login endpoint."""
+    token_class = RefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        """Adding claims for authenticating without loading the user."""
+        token = super().get_token(user)
+        token['phone_number'] = user.phone_number
+        token['is_staff'] = user.is_staff
+        token['is_verified'] = user.is_verified
+        return token
 
     def validate(self, attrs):
         validated_data = super(LoginSerializer, self).validate(attrs)
@@ -225,54 +197,56 @@ class LoginSerializer(TokenObtainPairSerializer):
         return validated_data
 
 
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """Serializer for refreshing tokens with the Redis blacklist."""
+    token_class = RefreshToken
+
+
+class TokenVerifySerializer(jwt_serializers.TokenVerifySerializer):
+    """Serializer for verifying tokens with the Redis blacklist."""
+
+    def validate(self, attrs):
+        token = UntypedToken(attrs['token'])
+        jti = token.get(api_settings.JTI_CLAIM)
+        try:
+            blacklisted = is_blacklisted(jti)
+        except RedisError as e:
+            logger.warning(
+                "Check the Redis connection...The error %s has occurred.", e
+            )
+            blacklisted = None
+        if blacklisted is None:
+            blacklisted = is_blacklisted_in_db(jti)
+        if blacklisted:
+            raise serializers.ValidationError(_('Token is blacklisted'))
+        return {}
+
+
 class ResendOtpSerializer(serializers.Serializer):
     """Serializer for resend verification endpoint."""
     phone_number = serializers.CharField(required=True)
 
     def validate(self, attrs):
         phone_number = attrs.get('phone_number', None)
-        otp = random.randint(100000, 999999)
-        otp_expiry = datetime.now() + timedelta(minutes=1)
-        cached_data = cache.get(phone_number)
-
-        if phone_number:
-            try:
-                User.objects.get(phone_number=phone_number)
-                if cached_data:
-                    max_try_otp = str(cached_data).split('/')[2]
-                    if len(cached_data.split('/')) >= 5:
-                        rest = cached_data.split('/')[4]
-                        if rest > str(timezone.now()):
-                            raise serializers.ValidationError(
-                                {
-                                    'detail': _(
-                                        'You must wait until the rest time(2 Hours) finishes.' # noqa
-                                    )
-                                }
-                            )
-                        elif rest < str(timezone.now()):
-                            max_try_otp = 19
-
-                    new_value = f'{phone_number}/{otp_expiry}/{max_try_otp}/{otp}' # noqa
-                    try:
-                        cache.delete(phone_number)
-                        cache.set(
-                            key=f'{phone_number}',
-                            value=f'{new_value}',
-                        )
-                    except Exception as e:
-                        logger.warning(
-                            _(
-                                f"Check the Redis connection...The error {list(e)} has occurred." # noqa
-                            )
-                        )
-                    # TODO: Sending OTP with provided phone_number here
-            except User.DoesNotExist:
-                raise serializers.ValidationError(
-                    {'detail': _(
-                        'There is no user with the provided phone number.'
-                    )}
-                )
+
+        if not User.objects.filter(phone_number=phone_number).exists():
+            raise serializers.ValidationError(
+                {'detail': _(
+                    'There is no user with the provided phone number.'
+                )}
+            )
+        try:
+            send_otp(phone_number, otp_store.issue(phone_number))
+        except OtpRestError:
+            raise serializers.ValidationError(
+                {'detail': _(
+                    'You must wait until the rest time(2 Hours) finishes.'
+                )}
+            )
+        except RedisError as e:
+            logger.warning(
+                "Check the Redis connection...The error %s has occurred.", e
+            )
 
         return super(ResendOtpSerializer, self).validate(attrs)
 
@@ -311,23 +285,31 @@ class ResetPasswordSerializer(ResendOtpSerializer):
     """Serializer for Reset password endpoint."""
     def validate(self, attrs):
         phone_number = attrs.get('phone_number', None)
-        try:
-            user = User.objects.get(phone_number=phone_number)
-            temp_pass = self.temp_password()
-            user.set_password(temp_pass)
-            user.save()
-            # TODO: sending new password to the provided phone_number
-
-        except User.DoesNotExist:
+        user_id = User.objects.filter(
+            phone_number=phone_number
+        ).values_list('id', flat=True).first()
+        if user_id is None:
             raise serializers.ValidationError(
                 {'detail': _('There is no user with this phone number.')}
             )
-        return super(ResetPasswordSerializer, self).validate(attrs)
+        attrs = super(ResetPasswordSerializer, self).validate(attrs)
+        # Delivering only once the request is validated and committed
+        temp_pass = generate_temporary_password()
+        transaction.on_commit(
+            lambda: deliver_temporary_password.delay(user_id, temp_pass)
+        )
+        return attrs
+
+
+class UserSerializer(serializers.ModelSerializer):
+    """Authenticated user serializer."""
 
-    def temp_password(self):
-        """Generate and return string for temporary password."""
-        temp_pass = uuid.uuid4()
-        return str(temp_pass).split('-')[0]
+    class Meta:
+        model = User
+        fields = [
+            'id', 'phone_number', 'referral_code', 'is_verified', 'is_staff'
+        ]
+        read_only_fields = fields
 
 
 class ProfileSerializer(serializers.ModelSerializer):
@@ -0,0 +1,37 @@
+"""
+Throttles for Accounts app.
+"""
+from core.throttling import SlidingWindowRateThrottle
+
+
+class OtpIpRateThrottle(SlidingWindowRateThrottle):
+    """
+    Limiting OTP related requests per client IP.
+    Refused while Redis is down, each allowed request may send an SMS.
+    """
+    scope = 'otp_ip'
+    fail_open = False
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident(request)
+        }
+
+
+class OtpPhoneNumberRateThrottle(SlidingWindowRateThrottle):
+    """
+    Limiting OTP related requests per requested phone number.
+    Refused while Redis is down, each allowed request may send an SMS.
+    """
+    scope = 'otp_phone'
+    fail_open = False
+
+    def get_cache_key(self, request, view):
+        phone_number = request.data.get('phone_number', None)
+        if not phone_number:
+            return None
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': phone_number
+        }
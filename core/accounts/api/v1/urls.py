@@ -42,6 +42,9 @@ urlpatterns = [
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
 
+    # ========= User, profile and address in one response ========= #
+    path('me/', views.MeApiView.as_view(), name='me'),
+
     # ========= Retrieve and update personal information ========= #
     path('profile/me/', views.ProfileApiView.as_view(), name='profile'),
 
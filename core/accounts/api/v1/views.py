@@ -1,8 +1,13 @@
 """
 Accounts app view's.
 """
-from django.core.cache import cache
+import json
+
 from django.contrib.auth import get_user_model
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control
+)
 from django.utils.translation import gettext_lazy as _
 from rest_framework import generics
 from rest_framework import status
@@ -13,6 +18,12 @@ from rest_framework.permissions import (
 
 from rest_framework_simplejwt.views import TokenObtainPairView
 
+from core.conditional import make_etag
+
+from .throttles import (
+    OtpIpRateThrottle,
+    OtpPhoneNumberRateThrottle
+)
 from .serializers import (
     RegistrationSerializer,
     VerificationSerializer,
@@ -21,7 +32,16 @@ from .serializers import (
     ChangePasswordSerializer,
     ResetPasswordSerializer,
     ProfileSerializer,
-    AddressSerializer
+    AddressSerializer,
+    UserSerializer
+)
+from ...documents import (
+    ADDRESS,
+    DOCUMENTS,
+    PROFILE,
+    add_documents,
+    get_documents,
+    set_documents
 )
 from ...models import (
     Profile,
@@ -32,6 +52,7 @@ from ...models import (
 class RegistrationApiView(generics.GenericAPIView):
     """Registration endpoint."""
     serializer_class = RegistrationSerializer
+    throttle_classes = [OtpIpRateThrottle, OtpPhoneNumberRateThrottle]
 
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data)
@@ -49,6 +70,7 @@ class RegistrationApiView(generics.GenericAPIView):
 class VerificationApiView(generics.GenericAPIView):
     """Verification endpoint via SMS."""
     serializer_class = VerificationSerializer
+    throttle_classes = [OtpIpRateThrottle, OtpPhoneNumberRateThrottle]
 
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data)
@@ -57,8 +79,7 @@ class VerificationApiView(generics.GenericAPIView):
         otp = serializer.validated_data.get('otp', None)
         if user and otp:
             user.is_verified = True
-            user.save()
-            cache.delete(otp)
+            user.save(update_fields=['is_verified'])
         return Response(
             {'detail': _('Your account verified successfully.')},
             status=status.HTTP_200_OK
@@ -68,6 +89,7 @@ class VerificationApiView(generics.GenericAPIView):
 class ResendOtpApiView(generics.GenericAPIView):
     """Resending verification code."""
     serializer_class = ResendOtpSerializer
+    throttle_classes = [OtpIpRateThrottle, OtpPhoneNumberRateThrottle]
 
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data)
@@ -107,7 +129,7 @@ class ChangePasswordApiView(generics.GenericAPIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         user_object.set_password(new_password)
-        user_object.save()
+        user_object.save(update_fields=['password'])
         return Response(
             {'detail': _('Your password changed successfully.')},
             status=status.HTTP_200_OK
@@ -117,6 +139,7 @@ class ChangePasswordApiView(generics.GenericAPIView):
 class ResetPasswordApiView(generics.GenericAPIView):
     """Reset password endpoint."""
     serializer_class = ResetPasswordSerializer
+    throttle_classes = [OtpIpRateThrottle, OtpPhoneNumberRateThrottle]
 
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data)
@@ -128,21 +151,90 @@ class ResetPasswordApiView(generics.GenericAPIView):
 
 
 class BaseApiView(generics.RetrieveUpdateAPIView):
-    """Base class for inheriting in ProfileApiView and AddressApiView."""
+    """
+    Base class for inheriting in ProfileApiView and AddressApiView.
+    The serialized object is cached per user as `document`.
+    """
     permission_classes = [IsAuthenticated]
+    document = None
 
     def get_object(self):
         """Retrieving the authenticated user."""
         return self.queryset.get(user=self.request.user)
 
+    def retrieve(self, request, *args, **kwargs):
+        """Serving the cached document if there is any."""
+        data = get_documents(request.user.pk, [self.document]).get(
+            self.document
+        )
+        if data is None:
+            data = self.get_serializer(self.get_object()).data
+            add_documents(request.user.pk, **{self.document: dict(data)})
+        return Response(data)
+
+    def update(self, request, *args, **kwargs):
+        """Writing the updated document through to the cache."""
+        response = super().update(request, *args, **kwargs)
+        set_documents(request.user.pk, **{self.document: dict(response.data)})
+        return response
+
 
 class ProfileApiView(BaseApiView):
     """Retrieve and update profile by authenticated user."""
     serializer_class = ProfileSerializer
     queryset = Profile.objects.select_related('user').all()
+    document = PROFILE
 
 
 class AddressApiView(BaseApiView):
     """Retrieve and update address by authenticated user."""
     serializer_class = AddressSerializer
     queryset = Address.objects.select_related('user').all()
+    document = ADDRESS
+
+
+class MeApiView(generics.GenericAPIView):
+    """
+    Retrieve the authenticated user with profile and address in one
+    response. Documents are read from the per-user cache and the
+    response is validated by an ETag of its content.
+    """
+    serializer_class = UserSerializer
+    permission_classes = [IsAuthenticated]
+    document_views = {
+        PROFILE: ProfileApiView,
+        ADDRESS: AddressApiView
+    }
+
+    def get_documents(self):
+        user = self.request.user
+        documents = get_documents(user.pk)
+        missing = {}
+        for document in DOCUMENTS:
+            if document in documents:
+                continue
+            view = self.document_views[document]
+            instance = view.queryset.get(user=user)
+            missing[document] = dict(view.serializer_class(
+                instance, context=self.get_serializer_context()
+            ).data)
+        if missing:
+            add_documents(user.pk, **missing)
+            documents.update(missing)
+        return documents
+
+    def get(self, request, *args, **kwargs):
+        data = {
+            'user': self.get_serializer(request.user).data,
+            **self.get_documents()
+        }
+        etag = make_etag(
+            request.get_full_path(),
+            json.dumps(data, sort_keys=True, default=str)
+        )
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(data)
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,75 @@
+"""
+Authentication backends for Accounts app.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from redis.exceptions import RedisError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from core.redis import client_side_cache
+from .models import user_cache_key
+
+logger = logging.getLogger(__name__)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication loading the user from a short TTL cache
+    instead of the database, the cached user is removed on User.save.
+    The user is usually read from the client-side cache of the worker.
+
+    Only `cached_fields` are cached (never the password hash), the
+    other fields of the user are deferred and loaded when accessed.
+    """
+    cached_fields = (
+        'id', 'phone_number', 'referral_code',
+        'is_active', 'is_staff', 'is_superuser', 'is_verified'
+    )
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        values = client_side_cache.get(user_cache_key(user_id))
+        if values is not None and values['is_active']:
+            return self.user_model.from_db(
+                router.db_for_read(self.user_model),
+                list(values), list(values.values())
+            )
+
+        user = super().get_user(validated_token)
+        try:
+            cache.set(
+                user_cache_key(user_id),
+                {field: getattr(user, field) for field in self.cached_fields},
+                settings.AUTH_USER_CACHE_TTL
+            )
+        except RedisError as e:
+            logger.warning(
+                "Check the Redis connection...The error %s has occurred.", e
+            )
+        return user
+
+
+class SafeMethodsStatelessJWTAuthentication(CachedJWTAuthentication):
+    """
+    For read-only requests the user is built from the signed claims
+    of the token without any lookup, for other requests the cached
+    user is used. Meant for endpoints which don't read request.user
+    on safe methods.
+    """
+
+    def authenticate(self, request):
+        self.is_safe_method = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if self.is_safe_method:
+            return api_settings.TOKEN_USER_CLASS(validated_token)
+        return super().get_user(validated_token)
@@ -0,0 +1,95 @@
+"""
+Per-user cache of the serialized profile and address documents.
+When Redis fails, reads miss and writes are skipped.
+
+Invalidation replaces a document with a short lived tombstone instead
+of deleting it, and documents loaded after a miss are only added where
+there is no key. A request which loaded the old row before an update
+can't cache it afterwards, while the writer overwrites the tombstone
+with the new document. Writes of several documents are pipelined.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from redis.exceptions import RedisError
+
+from core.redis import cache_pipeline
+
+logger = logging.getLogger(__name__)
+
+PROFILE = 'profile'
+ADDRESS = 'address'
+DOCUMENTS = (PROFILE, ADDRESS)
+TOMBSTONE = 'invalidated'
+
+
+def document_cache_key(document, user_id):
+    return f'{document}:doc:{user_id}'
+
+
+def get_documents(user_id, documents=DOCUMENTS):
+    """Return a dict of the cached documents, misses are left out."""
+    keys = {
+        document_cache_key(document, user_id): document
+        for document in documents
+    }
+    try:
+        cached = cache.get_many(keys)
+    except RedisError as e:
+        logger.warning(
+            "Check the Redis connection...The error %s has occurred.", e
+        )
+        return {}
+    return {
+        keys[key]: data for key, data in cached.items() if data != TOMBSTONE
+    }
+
+
+def add_documents(user_id, **documents):
+    """Caching documents loaded after a miss, unless they were replaced."""
+    try:
+        with cache_pipeline() as pipeline:
+            for document, data in documents.items():
+                cache.add(
+                    document_cache_key(document, user_id), data,
+                    settings.ACCOUNT_DOCUMENT_CACHE_TTL, client=pipeline
+                )
+    except RedisError as e:
+        logger.warning(
+            "Check the Redis connection...The error %s has occurred.", e
+        )
+
+
+def set_documents(user_id, **documents):
+    """Writing updated documents through to the cache."""
+    try:
+        cache.set_many(
+            {
+                document_cache_key(document, user_id): data
+                for document, data in documents.items()
+            },
+            settings.ACCOUNT_DOCUMENT_CACHE_TTL
+        )
+    except RedisError as e:
+        logger.warning(
+            "Check the Redis connection...The error %s has occurred.", e
+        )
+
+
+def invalidate_documents(user_id, documents=DOCUMENTS, pipeline=None):
+    """
+    Replacing the documents with tombstones, queued on the pipeline
+    of the caller if one is given.
+    """
+    try:
+        with cache_pipeline(pipeline) as pipeline:
+            for document in documents:
+                cache.set(
+                    document_cache_key(document, user_id), TOMBSTONE,
+                    settings.ACCOUNT_DOCUMENT_TOMBSTONE_TTL, client=pipeline
+                )
+    except RedisError as e:
+        logger.warning(
+            "Check the Redis connection...The error %s has occurred.", e
+        )
@@ -0,0 +1,16 @@
+"""
+Password hashers for Accounts app.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 hasher with iterations taken from PASSWORD_HASH_ITERATIONS,
+    existing hashes are upgraded on the next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
@@ -0,0 +1,38 @@
+"""
+Django command to prune expired JWT tokens.
+"""
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+from ...tokens import (
+    prune_blacklist,
+    warm_blacklist
+)
+
+
+class Command(BaseCommand):
+    """
+    Deleting expired outstanding tokens (their blacklist rows are
+    deleted by cascade) in batches, and pruning the Redis blacklist.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        now = aware_utcnow()
+        deleted = 0
+        while True:
+            ids = list(OutstandingToken.objects.filter(
+                expires_at__lte=now
+            ).values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            deleted += OutstandingToken.objects.filter(id__in=ids).delete()[0]
+
+        pruned = prune_blacklist()
+        warm_blacklist()
+        self.stdout.write(self.style.SUCCESS(
+            f'{deleted} rows deleted and {pruned} jtis pruned from Redis.'
+        ))
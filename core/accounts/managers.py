@@ -2,10 +2,40 @@
 Managers for Accounts app.
 """
 from django.contrib.auth.base_user import BaseUserManager
+from django.db import (
+    models,
+    transaction
+)
 from django.utils.translation import gettext_lazy as _
 
+from core.managers import CacheInvalidatingQuerySet
 
-class CustomUserManager(BaseUserManager):
+
+class UserQuerySet(CacheInvalidatingQuerySet):
+    """
+    Queryset of users whose updates drop the cached users once the
+    transaction commits, like saves do. New users aren't cached and
+    deletes send post_delete, so only updates are handled.
+    """
+
+    def update(self, **kwargs):
+        """Updating the users, return their number."""
+        # Read before the write, which may change the filtered columns
+        users = list(self.values_list('pk', 'phone_number'))
+        rows = super().update(**kwargs)
+        if rows:
+            transaction.on_commit(
+                lambda: self.model.invalidate_cached([
+                    (user_id, [phone_number])
+                    for user_id, phone_number in users
+                ]), self.db
+            )
+        return rows
+
+    update.alters_data = True
+
+
+class CustomUserManager(BaseUserManager.from_queryset(UserQuerySet)):
     """
     Custom user model manager where phone_number is the unique identifiers
     for authentication instead of usernames.
@@ -35,3 +65,15 @@ class CustomUserManager(BaseUserManager):
         if extra_fields.get("is_superuser") is not True:
             raise ValueError(_("Superuser must have is_superuser=True."))
         return self.create_user(phone_number, password, **extra_fields)
+
+
+class ReferralQuerySet(models.QuerySet):
+    """Queryset for reading referral edges."""
+
+    def leaderboard(self, limit=10):
+        """Return referrers with the most referred users."""
+        return self.values(
+            'referrer', 'referrer__phone_number'
+        ).annotate(
+            total=models.Count('id')
+        ).order_by('-total')[:limit]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2 on 2026-10-19 11:20
+
+import accounts.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import secrets
+
+
+def deduplicate_referral_codes(apps, schema_editor):
+    """
+    Regenerating the referral codes which more than one user share,
+    the first user of each keeps the code, the unique index can't be
+    created otherwise.
+    """
+    User = apps.get_model('accounts', 'User')
+    duplicates = (
+        User.objects.values('referral_code')
+        .annotate(users=models.Count('id'))
+        .filter(users__gt=1)
+        .values_list('referral_code', flat=True)
+    )
+    for code in list(duplicates):
+        for user in User.objects.filter(referral_code=code).order_by('id')[1:]:
+            new_code = secrets.token_hex(5)
+            while User.objects.filter(referral_code=new_code).exists():
+                new_code = secrets.token_hex(5)
+            user.referral_code = new_code
+            user.save(update_fields=['referral_code'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            deduplicate_referral_codes, migrations.RunPython.noop
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='referral_code',
+            field=models.CharField(default=accounts.models.referral_code_generator, max_length=100, unique=True, verbose_name='referral code'),
+        ),
+        migrations.CreateModel(
+            name='Referral',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('referred', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='referred_by', to=settings.AUTH_USER_MODEL)),
+                ('referrer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='referrals', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='referral',
+            index=models.Index(fields=['referrer', 'created_at'], name='accounts_re_referre_acaab4_idx'),
+        ),
+    ]
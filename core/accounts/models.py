@@ -1,23 +1,41 @@
 """
 Accounts Models.
 """
+import logging
 import os
+import secrets
 import uuid
 
-from django.db import models
+from django.db import (
+    IntegrityError,
+    models,
+    transaction
+)
 from django.contrib.auth.models import (
     AbstractBaseUser,
     PermissionsMixin
 )
 from django.utils.text import Truncator
 from django.utils.translation import gettext_lazy as _
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from django.db.models.signals import (
+    post_delete,
+    post_save
+)
 from django.contrib.auth import get_user_model
 from django.dispatch import receiver
+from redis.exceptions import RedisError
 
+from core.redis import cache_pipeline
 from core.timestamp import TimeStamp
+from .documents import (
+    ADDRESS,
+    PROFILE,
+    invalidate_documents
+)
 from .managers import (
-    CustomUserManager
+    CustomUserManager,
+    ReferralQuerySet
 )
 from .validators import (
     phone_validator,
@@ -25,13 +43,32 @@ from .validators import (
     age_validator
 )
 
+logger = logging.getLogger(__name__)
+
 
 def referral_code_generator():
     """
-    Generating 10 digits code.
+    Generating 10 characters code.
+    Collisions are caught by the unique index, see User.save.
     """
-    x = uuid.uuid4()
-    return str(x).split('-')[0]
+    return secrets.token_hex(5)
+
+
+def unique_referral_codes(count):
+    """
+    Generating `count` referral codes which aren't taken yet,
+    all the candidates of a round are checked with one query.
+    """
+    codes = set()
+    while len(codes) < count:
+        candidates = {
+            referral_code_generator() for _ in range(count - len(codes))
+        }
+        taken = User.objects.filter(
+            referral_code__in=candidates
+        ).values_list('referral_code', flat=True)
+        codes |= candidates - set(taken)
+    return list(codes)
 
 
 def profile_img_file_path(instance, filename):
@@ -60,6 +97,7 @@ class User(
     referral_code = models.CharField(
         _('referral code'),
         max_length=100,
+        unique=True,
         default=referral_code_generator
     )
     referral_counter = models.IntegerField(
@@ -77,6 +115,10 @@ class User(
     is_superuser = models.BooleanField(default=False)
     is_verified = models.BooleanField(default=False)  # verification via SMS
 
+    REFERRAL_CODE_ATTEMPTS = 3
+    # Fields whose validators or uniqueness checks need a full_clean
+    VALIDATED_FIELDS = frozenset(['phone_number', 'referral_code'])
+
     USERNAME_FIELD = "phone_number"
     REQUIRED_FIELDS = []
 
@@ -85,11 +127,131 @@ class User(
     def __str__(self):
         return self.phone_number
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Keeping the loaded values for tracking dirty fields."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def get_dirty_fields(self):
+        """
+        Return the fields which changed since the user was loaded
+        (or saved), or None when the user isn't being tracked.
+        """
+        loaded_values = getattr(self, '_loaded_values', None)
+        if loaded_values is None:
+            return None
+        dirty_fields = []
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.attname not in self.__dict__:
+                continue
+            if (
+                field.attname not in loaded_values
+                or getattr(self, field.attname) != loaded_values[
+                    field.attname
+                ]
+            ):
+                dirty_fields.append(field.attname)
+        return dirty_fields
+
     def save(self, *args, **kwargs):
-        self.full_clean()
+        """
+        Running full checks only on creation or when a validated
+        field changes, and updating only the dirty fields.
+        """
+        if self._state.adding:
+            self.full_clean(exclude=['referral_code'])
+            self._insert_with_unique_referral_code(*args, **kwargs)
+        else:
+            if kwargs.get('update_fields') is None and not args:
+                kwargs['update_fields'] = self.get_dirty_fields()
+            changed_fields = kwargs.get('update_fields')
+
+            if changed_fields is None:
+                self.full_clean()
+            elif self.VALIDATED_FIELDS.intersection(changed_fields):
+                self.full_clean(exclude=[
+                    field.name for field in self._meta.fields
+                    if field.name not in changed_fields
+                ])
+            super().save(*args, **kwargs)
+
+        self.track_loaded_values()
+
+    def track_loaded_values(self):
+        """Keeping the current values as the saved ones."""
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+    @classmethod
+    def invalidate_cached(cls, users):
+        """
+        Invalidating the cached users, their ids by phone number and
+        their profile and address documents (which contain the phone
+        number) with one round trip. `users` are pairs of an id and
+        the phone numbers to drop.
+        """
+        try:
+            with cache_pipeline() as pipeline:
+                cache.delete_many([
+                    key for user_id, phone_numbers in users
+                    for key in [user_cache_key(user_id)] + [
+                        phone_number_cache_key(phone_number)
+                        for phone_number in phone_numbers
+                    ]
+                ], client=pipeline)
+                for user_id, _phone_numbers in users:
+                    invalidate_documents(user_id, pipeline=pipeline)
+        except RedisError as e:
+            logger.warning(
+                "Check the Redis connection...The error %s has occurred.", e
+            )
+
+    def _insert_with_unique_referral_code(self, *args, **kwargs):
+        """
+        Inserting the user and drawing a new referral code
+        whenever the generated one is already taken.
+        """
+        for attempt in range(self.REFERRAL_CODE_ATTEMPTS - 1):
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                if not User.objects.filter(
+                    referral_code=self.referral_code
+                ).exists():
+                    raise
+                self.referral_code = referral_code_generator()
         return super().save(*args, **kwargs)
 
 
+def user_cache_key(user_id):
+    """Cache key of the user loaded by the JWT authentication."""
+    return f'user:{user_id}'
+
+
+def phone_number_cache_key(phone_number):
+    """Cache key of the user id of a phone number."""
+    return f'user_id:{phone_number}'
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalid_cached_user(sender, instance, **kwargs):
+    """
+    Invalidating the cached user after any changes in the user
+    object, by its old phone number too.
+    """
+    loaded_values = getattr(instance, '_loaded_values', None) or {}
+    User.invalidate_cached([(instance.pk, {
+        instance.phone_number,
+        loaded_values.get('phone_number', instance.phone_number)
+    })])
+
+
 class Profile(TimeStamp):
     """
     This class defines attributes of the Profile model.
@@ -140,6 +302,7 @@ def save_profile(sender, instance, created, **kwargs):
     """
     Signal for adding profile object for the user
     instance automatically after creating user object.
+    Users created by accounts.services get it in bulk instead.
     """
     if created:
         Profile.objects.create(user=instance)
@@ -222,11 +385,51 @@ class Address(TimeStamp):
         verbose_name_plural = 'Addresses'
 
 
+@receiver([post_save, post_delete], sender=Profile)
+def invalid_profile_document(sender, instance, **kwargs):
+    """Invalidating the cached profile document of the user."""
+    invalidate_documents(instance.user_id, [PROFILE])
+
+
 @receiver(post_save, sender=User)
 def address(sender, instance, created, **kwargs):
     """
     Signal for adding address object for the user
     instance automatically after creating user object.
+    Users created by accounts.services get it in bulk instead.
     """
     if created:
         Address.objects.create(user=instance)
+
+
+@receiver([post_save, post_delete], sender=Address)
+def invalid_address_document(sender, instance, **kwargs):
+    """Invalidating the cached address document of the user."""
+    invalidate_documents(instance.user_id, [ADDRESS])
+
+
+class Referral(TimeStamp):
+    """
+    This class defines referral edges between users, one row
+    for every user who signed up with a referral code.
+    """
+    referrer = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        related_name='referrals'
+    )
+    referred = models.OneToOneField(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        related_name='referred_by'
+    )
+
+    objects = ReferralQuerySet.as_manager()
+
+    def __str__(self):
+        return f'{self.referrer_id} => {self.referred_id}'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['referrer', 'created_at']),
+        ]
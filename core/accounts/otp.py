@@ -0,0 +1,107 @@
+"""
+One time passwords stored in Redis hashes.
+
+Every check-and-update is a single Lua script, so concurrent
+verify and resend requests can't race and every key has a TTL.
+"""
+import secrets
+
+from django.conf import settings
+
+from core.redis import LuaScript
+
+# KEYS: otp hash, sends counter, rest lock.
+# ARGV: code, otp ttl, max attempts, max sends, rest ttl.
+ISSUE_SCRIPT = LuaScript("""
+local rest = redis.call('TTL', KEYS[3])
+if rest > 0 then
+    return {0, rest}
+end
+local sends = redis.call('INCR', KEYS[2])
+if sends == 1 then
+    redis.call('EXPIRE', KEYS[2], ARGV[5])
+end
+if sends > tonumber(ARGV[4]) then
+    redis.call('SET', KEYS[3], 1, 'EX', ARGV[5])
+    redis.call('DEL', KEYS[1], KEYS[2])
+    return {0, tonumber(ARGV[5])}
+end
+redis.call('HSET', KEYS[1], 'code', ARGV[1], 'attempts', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return {1, 0}
+""")
+
+# KEYS: otp hash, rest lock.
+# ARGV: code.
+VERIFY_SCRIPT = LuaScript("""
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return -2
+end
+local code = redis.call('HGET', KEYS[1], 'code')
+if not code then
+    return -1
+end
+if code == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+if redis.call('HINCRBY', KEYS[1], 'attempts', -1) <= 0 then
+    redis.call('DEL', KEYS[1])
+    return -3
+end
+return 0
+""")
+
+
+class OtpRestError(Exception):
+    """Raised when too many OTPs were requested for a phone number."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        super().__init__(f'OTP is resting for {seconds} seconds.')
+
+
+class OtpStore:
+    """
+    Issuing and verifying OTPs per phone number.
+
+    Each phone number has an `otp:{phone}` hash (code and remaining
+    attempts) living OTP_EXPIRY_SECONDS, a sends counter, and a rest
+    lock which is set for OTP_REST_SECONDS after OTP_MAX_SENDS sends.
+    """
+    VALID = 1
+    INVALID = 0
+    EXPIRED = -1
+    RESTING = -2
+    EXHAUSTED = -3
+
+    def _keys(self, phone_number):
+        # The hash tag keeps the keys of a phone number in one cluster slot
+        base = f'otp:{{{phone_number}}}'
+        return base, f'{base}:sends', f'{base}:rest'
+
+    def issue(self, phone_number):
+        """Generate and store a new OTP and return it."""
+        code = str(secrets.randbelow(900000) + 100000)
+        otp_key, sends_key, rest_key = self._keys(phone_number)
+        issued, rest = ISSUE_SCRIPT(
+            keys=[otp_key, sends_key, rest_key],
+            args=[
+                code,
+                settings.OTP_EXPIRY_SECONDS,
+                settings.OTP_MAX_ATTEMPTS,
+                settings.OTP_MAX_SENDS,
+                settings.OTP_REST_SECONDS,
+            ]
+        )
+        if not issued:
+            raise OtpRestError(rest)
+        return code
+
+    def verify(self, phone_number, code):
+        """Check the OTP and return one of the result constants."""
+        otp_key, _, rest_key = self._keys(phone_number)
+        return VERIFY_SCRIPT(keys=[otp_key, rest_key], args=[str(code)])
+
+
+otp_store = OtpStore()
@@ -0,0 +1,177 @@
+"""
+Services for Accounts app.
+"""
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import (
+    IntegrityError,
+    transaction
+)
+from django.db.models import (
+    Case,
+    F,
+    Value,
+    When
+)
+from redis.exceptions import RedisError
+
+from core.redis import client_side_cache
+from .models import (
+    User,
+    Profile,
+    Address,
+    Referral,
+    phone_number_cache_key,
+    unique_referral_codes
+)
+
+logger = logging.getLogger(__name__)
+
+
+def get_user_id(phone_number):
+    """
+    Return the id of the user with the phone number (or None),
+    cached until the user changes since ids never do.
+    """
+    key = phone_number_cache_key(phone_number)
+    user_id = client_side_cache.get(key)
+    if user_id is None:
+        user_id = User.objects.filter(
+            phone_number=phone_number
+        ).values_list('id', flat=True).first()
+        if user_id is not None:
+            try:
+                cache.set(key, user_id, settings.USER_ID_CACHE_TTL)
+            except RedisError as e:
+                logger.warning(
+                    "Check the Redis connection...The error %s has occurred.",
+                    e
+                )
+    return user_id
+
+
+def provision_user(phone_number, password, referrer_id=None, **extra_fields):
+    """
+    Creating a user together with its profile, address
+    and referral bookkeeping in one transaction.
+    """
+    return bulk_provision_users([dict(
+        phone_number=phone_number,
+        password=password,
+        referrer_id=referrer_id,
+        **extra_fields
+    )])[0]
+
+
+def bulk_provision_users(users_data, batch_size=None, skip_duplicates=False):
+    """
+    Creating users from dictionaries of User fields (plus the raw
+    `password` and an optional `referrer_id`) with one statement per
+    table: users, profiles, addresses, referrer counters and referrals.
+
+    Field validators run for every user and the phone numbers are
+    checked against the existing users with one query. Taken or
+    repeated phone numbers raise ValidationError before anything is
+    written, or are left out with `skip_duplicates`, so only the
+    created users are returned. No post_save signals are sent.
+    Referral codes taken meanwhile by concurrent registrations are
+    drawn again.
+    """
+    users_data = _without_duplicate_phone_numbers(
+        list(users_data), skip_duplicates
+    )
+    referral_codes = unique_referral_codes(len(users_data))
+
+    users = []
+    referrals = []
+    for data, referral_code in zip(users_data, referral_codes):
+        data = dict(data)
+        password = data.pop('password', None)
+        referrer_id = data.pop('referrer_id', None)
+
+        user = User(referral_code=referral_code, **data)
+        user.set_password(password)
+        user.full_clean(exclude=['referral_code'], validate_unique=False)
+        users.append(user)
+        if referrer_id is not None:
+            referrals.append(Referral(referrer_id=referrer_id, referred=user))
+
+    for attempt in range(User.REFERRAL_CODE_ATTEMPTS):
+        try:
+            _create_users(users, referrals, batch_size)
+            break
+        except IntegrityError:
+            # Drawing new codes when a concurrent registration took some
+            taken = set(User.objects.filter(
+                referral_code__in=[user.referral_code for user in users]
+            ).values_list('referral_code', flat=True))
+            if not taken or attempt == User.REFERRAL_CODE_ATTEMPTS - 1:
+                raise
+            codes = iter(unique_referral_codes(len(taken)))
+            for user in users:
+                # Batches inserted before the failure were rolled back
+                user.pk = None
+                user._state.adding = True
+                if user.referral_code in taken:
+                    user.referral_code = next(codes)
+
+    # Later saves update the dirty fields only, like loaded users
+    for user in users:
+        user.track_loaded_values()
+    return users
+
+
+def _create_users(users, referrals, batch_size):
+    with transaction.atomic():
+        User.objects.bulk_create(users, batch_size=batch_size)
+        Profile.objects.bulk_create(
+            [Profile(user=user) for user in users], batch_size=batch_size
+        )
+        Address.objects.bulk_create(
+            [Address(user=user) for user in users], batch_size=batch_size
+        )
+        if referrals:
+            _increase_referral_counters(
+                Counter(referral.referrer_id for referral in referrals)
+            )
+            Referral.objects.bulk_create(referrals, batch_size=batch_size)
+
+
+def _without_duplicate_phone_numbers(users_data, skip_duplicates):
+    """
+    Return users_data without the users whose phone number is taken
+    or repeated in the batch, or raise ValidationError listing them.
+    """
+    taken = set(User.objects.filter(
+        phone_number__in={data['phone_number'] for data in users_data}
+    ).values_list('phone_number', flat=True))
+    duplicates = []
+    unique_users_data = []
+    for data in users_data:
+        if data['phone_number'] in taken:
+            duplicates.append(data['phone_number'])
+            continue
+        taken.add(data['phone_number'])
+        unique_users_data.append(data)
+    if duplicates and not skip_duplicates:
+        raise ValidationError({'phone_number': [
+            f'A user with phone number {phone_number} already exists.'
+            for phone_number in duplicates
+        ]})
+    return unique_users_data
+
+
+def _increase_referral_counters(counts):
+    """
+    Increasing referral counters of all referrers with one UPDATE,
+    the cached referrers are dropped once it's committed.
+    """
+    User.objects.filter(pk__in=counts).update(
+        referral_counter=F('referral_counter') + Case(
+            *[When(pk=pk, then=Value(count)) for pk, count in counts.items()]
+        )
+    )
@@ -0,0 +1,61 @@
+"""
+SMS gateways for Accounts app.
+"""
+import json
+import logging
+import urllib.request
+from collections import deque
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class BaseSmsGateway:
+    """Interface of the SMS providers."""
+
+    def send(self, phone_number, message):
+        raise NotImplementedError
+
+
+class FakeSmsGateway(BaseSmsGateway):
+    """
+    Keeping the last sent messages in memory, for development and
+    tests. Messages carry OTPs and passwords, so they're never logged.
+    """
+    outbox = deque(maxlen=100)
+
+    def send(self, phone_number, message):
+        self.outbox.append((phone_number, message))
+        logger.info('SMS to %s kept in the outbox.', phone_number)
+
+
+class HttpSmsGateway(BaseSmsGateway):
+    """
+    Sending through the HTTP API of the provider at SMS_GATEWAY_URL.
+    Errors are raised, so the send_sms task retries them.
+    """
+
+    def send(self, phone_number, message):
+        request = urllib.request.Request(
+            settings.SMS_GATEWAY_URL,
+            data=json.dumps({
+                'to': phone_number,
+                'message': message,
+            }).encode(),
+            headers={
+                'Authorization': f'Bearer {settings.SMS_GATEWAY_API_KEY}',
+                'Content-Type': 'application/json',
+            },
+            method='POST'
+        )
+        with urllib.request.urlopen(
+            request, timeout=settings.SMS_GATEWAY_TIMEOUT
+        ):
+            pass
+        logger.info('SMS to %s sent.', phone_number)
+
+
+def get_sms_gateway():
+    return import_string(settings.SMS_GATEWAY)()
@@ -0,0 +1,49 @@
+"""
+Background tasks for Accounts app.
+"""
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext as _
+
+from core.tasks import task
+from .sms import get_sms_gateway
+
+User = get_user_model()
+
+
+@task(max_retries=5)
+def send_sms(phone_number, message):
+    get_sms_gateway().send(phone_number, message)
+
+
+def send_otp(phone_number, otp):
+    """Sending the OTP, at most once per code."""
+    send_sms.delay(
+        phone_number,
+        _('Your verification code is %(otp)s') % {'otp': otp},
+        idempotency_key=f'otp:{phone_number}:{otp}'
+    )
+
+
+def generate_temporary_password():
+    return str(uuid.uuid4()).split('-')[0]
+
+
+@task(max_retries=3)
+def deliver_temporary_password(user_id, temp_pass):
+    """
+    Setting the temporary password for the user and sending it,
+    hashing happens here instead of in the request thread. The
+    password is generated by the caller, so retries set and send
+    the same one.
+    """
+    user = User.objects.get(pk=user_id)
+    user.set_password(temp_pass)
+    user.save(update_fields=['password'])
+    send_sms(
+        user.phone_number,
+        _('Your temporary password is %(password)s') % {
+            'password': temp_pass
+        }
+    )
@@ -0,0 +1,538 @@
+"""
+Tests for accounts app.
+"""
+import json
+import threading
+import urllib.error
+from contextlib import contextmanager
+from http.server import (
+    BaseHTTPRequestHandler,
+    HTTPServer
+)
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.test import (
+    TestCase,
+    override_settings
+)
+from redis.client import Pipeline
+from redis.exceptions import ConnectionError as RedisConnectionError
+from rest_framework.test import APIClient
+
+from core import tasks
+from core.redis import get_connection
+from .otp import (
+    OtpRestError,
+    otp_store
+)
+from .documents import (
+    ADDRESS,
+    PROFILE,
+    TOMBSTONE,
+    add_documents,
+    document_cache_key,
+    get_documents
+)
+from .models import (
+    Referral,
+    User,
+    phone_number_cache_key,
+    user_cache_key
+)
+from .services import (
+    bulk_provision_users,
+    provision_user
+)
+from .sms import (
+    FakeSmsGateway,
+    HttpSmsGateway
+)
+from .tasks import send_sms
+from .tokens import (
+    BLACKLIST_KEY,
+    BLACKLIST_READY_KEY,
+    add_to_blacklist,
+    warm_blacklist
+)
+
+PHONE_NUMBER = '09123456789'
+PASSWORD = 'S3cure-pass!'
+
+
+class AccountsTestCase(TestCase):
+    """Running tasks right away against a clean cache."""
+    base_url = '/auth/api/v1/'
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(
+            tasks, '_backend', tasks.ImmediateBackend()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.user = provision_user(PHONE_NUMBER, PASSWORD)
+        FakeSmsGateway.outbox.clear()
+
+    def post(self, path, data):
+        return self.client.post(f'{self.base_url}{path}', data)
+
+    def login(self):
+        response = self.post(
+            'login/', {'phone_number': PHONE_NUMBER, 'password': PASSWORD}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+
+class AccountsQueryCountTests(AccountsTestCase):
+    """Number of queries of each accounts endpoint."""
+
+    def test_registration(self):
+        data = {
+            'phone_number': '09120000000',
+            'password': PASSWORD,
+            'password1': PASSWORD,
+            'referral': self.user.referral_code
+        }
+        # Phone number and referral code lookups, taken phone numbers,
+        # a free referral code, the savepoint, user, profile, address,
+        # the referrer to invalidate, its counter and referral
+        with self.assertNumQueries(12):
+            response = self.post('registration/', data)
+        self.assertEqual(response.status_code, 200)
+
+    def test_verification(self):
+        code = otp_store.issue(PHONE_NUMBER)
+        # Loading the user and one targeted UPDATE of is_verified
+        with self.assertNumQueries(2):
+            response = self.post(
+                'verification/', {'phone_number': PHONE_NUMBER, 'otp': code}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_verified)
+
+    def test_resend_otp(self):
+        with self.assertNumQueries(1):
+            response = self.post('resend-otp/', {'phone_number': PHONE_NUMBER})
+        self.assertEqual(response.status_code, 200)
+
+    def test_login(self):
+        # Loading the user and the outstanding refresh token
+        with self.assertNumQueries(2):
+            self.login()
+
+    def test_token_refresh(self):
+        refresh = self.login()['refresh']
+        warm_blacklist()
+        # Redis answers the check, then the rotated token is blacklisted
+        with self.assertNumQueries(5):
+            response = self.post('token/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, 200)
+
+    def test_token_verify(self):
+        access = self.login()['access']
+        warm_blacklist()
+        with self.assertNumQueries(0):
+            response = self.post('api/token/verify/', {'token': access})
+        self.assertEqual(response.status_code, 200)
+
+    def test_change_password(self):
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {self.login()["access"]}'
+        )
+        data = {
+            'old_password': PASSWORD,
+            'new_password': 'N3w-pass-word',
+            'new_password1': 'N3w-pass-word'
+        }
+        # Loading the user and one targeted UPDATE of the password
+        with self.assertNumQueries(2):
+            response = self.client.put(
+                f'{self.base_url}change-password/', data
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_reset_password(self):
+        # Looking the user up, then the task loads and updates it
+        with self.assertNumQueries(4), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.post(
+                'reset-password/', {'phone_number': PHONE_NUMBER}
+            )
+        self.assertEqual(response.status_code, 200)
+
+
+class ReferralTests(AccountsTestCase):
+    """Crediting referrers and ranking them."""
+
+    def register(self, phone_number, referral):
+        response = self.post('registration/', {
+            'phone_number': phone_number,
+            'password': PASSWORD,
+            'password1': PASSWORD,
+            'referral': referral
+        })
+        self.assertEqual(response.status_code, 200)
+        return User.objects.get(phone_number=phone_number)
+
+    def test_registration_credits_the_referrer(self):
+        referred = self.register('09120000000', self.user.referral_code)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.referral_counter, 1)
+        self.assertEqual(referred.referred_by.referrer, self.user)
+        self.assertTrue(referred.used_referral_code)
+        self.assertEqual(referred.default_discount, 5)
+
+    def test_cached_referrer_is_invalidated(self):
+        cache.set(user_cache_key(self.user.pk), self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_provision_users([
+                dict(
+                    phone_number=f'0912000000{index}', password=PASSWORD,
+                    referrer_id=self.user.pk
+                ) for index in range(2)
+            ])
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.referral_counter, 2)
+
+    def test_taken_referral_code_is_drawn_again(self):
+        with mock.patch(
+            'accounts.services.unique_referral_codes',
+            side_effect=[[self.user.referral_code], ['FRESHCODE1']]
+        ):
+            user = provision_user(
+                '09120000000', PASSWORD, referrer_id=self.user.pk
+            )
+        self.assertEqual(user.referral_code, 'FRESHCODE1')
+        self.assertTrue(User.objects.filter(pk=user.pk).exists())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.referral_counter, 1)
+
+    def test_leaderboard(self):
+        other = provision_user('09120000009', PASSWORD)
+        self.register('09120000000', self.user.referral_code)
+        self.register('09120000001', self.user.referral_code)
+        self.register('09120000002', other.referral_code)
+        self.assertEqual(
+            [
+                (row['referrer__phone_number'], row['total'])
+                for row in Referral.objects.leaderboard()
+            ],
+            [(PHONE_NUMBER, 2), (other.phone_number, 1)]
+        )
+        self.assertEqual(len(Referral.objects.leaderboard(limit=1)), 1)
+
+
+class SmsTests(AccountsTestCase):
+    """Sending OTPs and temporary passwords."""
+
+    def test_message_bodies_are_not_logged(self):
+        with self.assertLogs('accounts.sms', 'INFO') as logs:
+            self.post('resend-otp/', {'phone_number': PHONE_NUMBER})
+        phone_number, message = FakeSmsGateway.outbox[-1]
+        self.assertNotIn(message, '\n'.join(logs.output))
+
+    def test_retried_reset_password_delivers_the_saved_password(self):
+        send = FakeSmsGateway.send
+        attempts = []
+
+        def flaky_send(gateway, phone_number, message):
+            if 'temporary password' in message:
+                attempts.append(message)
+                if len(attempts) == 1:
+                    raise ConnectionError('The SMS provider is down.')
+            send(gateway, phone_number, message)
+
+        with mock.patch.object(FakeSmsGateway, 'send', flaky_send), \
+                self.assertLogs('core.tasks', 'WARNING'), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.post('reset-password/', {'phone_number': PHONE_NUMBER})
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(attempts[0], attempts[1])
+        temp_pass = attempts[-1].rsplit(' ', 1)[-1]
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password(temp_pass))
+
+    def temporary_passwords(self):
+        return [
+            message for phone_number, message in FakeSmsGateway.outbox
+            if 'temporary password' in message
+        ]
+
+    def test_reset_password_is_delivered_after_the_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.post('reset-password/', {'phone_number': PHONE_NUMBER})
+        self.assertEqual(self.temporary_passwords(), [])
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(len(self.temporary_passwords()), 1)
+
+    def test_rejected_reset_password_delivers_nothing(self):
+        with mock.patch.object(
+            otp_store, 'issue', side_effect=OtpRestError(60)
+        ), self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.post(
+                'reset-password/', {'phone_number': PHONE_NUMBER}
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.temporary_passwords(), [])
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password(PASSWORD))
+
+
+class BlacklistTests(AccountsTestCase):
+    """The Redis blacklist never accepts a revoked token."""
+
+    def test_warming_keeps_jtis_blacklisted_meanwhile(self):
+        # Blacklisted after the rows were read by the warm-up
+        add_to_blacklist('revoked', 2 ** 31)
+        warm_blacklist()
+        connection = get_connection()
+        self.assertIsNotNone(connection.zscore(BLACKLIST_KEY, 'revoked'))
+        self.assertGreater(connection.ttl(BLACKLIST_READY_KEY), 0)
+
+    def test_cold_blacklist_is_warmed_in_the_background(self):
+        refresh = self.login()['refresh']
+        self.post('token/refresh/', {'refresh': refresh})
+        get_connection().delete(BLACKLIST_KEY, BLACKLIST_READY_KEY)
+        with mock.patch.object(tasks.ImmediateBackend, 'enqueue') as enqueue:
+            # The database answers while the set is cold
+            with self.assertNumQueries(1):
+                response = self.post('api/token/verify/', {'token': refresh})
+            self.assertEqual(response.status_code, 400)
+            self.post('api/token/verify/', {'token': refresh})
+        enqueue.assert_called_once()
+        self.assertEqual(
+            enqueue.call_args.args[0]['task'], 'accounts.tokens.warm_blacklist'
+        )
+        self.assertEqual(get_connection().zcard(BLACKLIST_KEY), 0)
+
+        tasks.run_message(enqueue.call_args.args[0])
+        with self.assertNumQueries(0):
+            response = self.post('api/token/verify/', {'token': refresh})
+        self.assertEqual(response.status_code, 400)
+
+    def test_verify_checks_the_database_while_redis_is_down(self):
+        refresh = self.login()['refresh']
+        self.post('token/refresh/', {'refresh': refresh})
+        with mock.patch(
+            'accounts.api.v1.serializers.is_blacklisted',
+            side_effect=RedisConnectionError('Connection refused.')
+        ), self.assertLogs('accounts.api.v1.serializers', 'WARNING'):
+            response = self.post('api/token/verify/', {'token': refresh})
+        self.assertEqual(response.status_code, 400)
+
+
+class CachedJWTAuthenticationTests(AccountsTestCase):
+    """Users are cached without their password hash."""
+
+    def test_cached_user_has_no_password(self):
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {self.login()["access"]}'
+        )
+        self.client.get(f'{self.base_url}me/')
+        values = cache.get(user_cache_key(self.user.pk))
+        self.assertEqual(values['phone_number'], PHONE_NUMBER)
+        self.assertNotIn('password', values)
+
+        # The password is loaded when a view needs it
+        response = self.client.put(f'{self.base_url}change-password/', {
+            'old_password': PASSWORD,
+            'new_password': 'N3w-pass-word',
+            'new_password1': 'N3w-pass-word'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('N3w-pass-word'))
+
+
+class BulkProvisionUsersTests(AccountsTestCase):
+    """Duplicate phone numbers and tracking of the created users."""
+    users_data = [
+        {'phone_number': PHONE_NUMBER, 'password': PASSWORD},
+        {'phone_number': '09120000001', 'password': PASSWORD},
+        {'phone_number': '09120000001', 'password': PASSWORD},
+    ]
+
+    def test_duplicates_are_reported_before_writing(self):
+        with self.assertRaises(ValidationError) as context:
+            bulk_provision_users(self.users_data)
+        self.assertEqual(len(context.exception.message_dict[
+            'phone_number'
+        ]), 2)
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_duplicates_are_skipped(self):
+        users = bulk_provision_users(self.users_data, skip_duplicates=True)
+        self.assertEqual(
+            [user.phone_number for user in users], ['09120000001']
+        )
+        self.assertEqual(User.objects.count(), 2)
+
+    def test_created_users_save_dirty_fields_only(self):
+        user = provision_user('09120000002', PASSWORD)
+        user.is_verified = True
+        with self.assertNumQueries(1):
+            user.save()
+
+
+class AuthenticatedTestCase(AccountsTestCase):
+    """Requesting as the logged in user."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {self.login()["access"]}'
+        )
+
+    def get(self, path):
+        response = self.client.get(f'{self.base_url}{path}')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+
+class AccountsDocumentQueryCountTests(AuthenticatedTestCase):
+    """Number of queries of the cached user, profile and address."""
+
+    def test_me(self):
+        # The user, profile and address, then everything is cached
+        with self.assertNumQueries(3):
+            self.get('me/')
+        with self.assertNumQueries(0):
+            self.get('me/')
+
+    def test_profile(self):
+        self.assert_document_queries('profile/me/', {'first_name': 'Ali'})
+
+    def test_address(self):
+        self.assert_document_queries('address/me/', {'city': 'Tehran'})
+
+    def assert_document_queries(self, path, data):
+        # The user and the document, then both are cached
+        with self.assertNumQueries(2):
+            self.get(path)
+        with self.assertNumQueries(0):
+            self.get(path)
+        # Loading and updating the document
+        with self.assertNumQueries(2):
+            response = self.client.patch(f'{self.base_url}{path}', data)
+        self.assertEqual(response.status_code, 200)
+        # Written through to the cache
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(path).data, response.data)
+
+
+class DocumentCacheTests(AuthenticatedTestCase):
+    """Documents read before an update aren't cached after it."""
+
+    @contextmanager
+    def assert_round_trips(self, commands):
+        """Cache writes are sent as one pipeline of the commands."""
+        execute = Pipeline.execute
+        sent = []
+
+        def counting_execute(pipeline, *args, **kwargs):
+            sent.append(len(pipeline.command_stack))
+            return execute(pipeline, *args, **kwargs)
+
+        with mock.patch.object(Pipeline, 'execute', counting_execute):
+            yield
+        self.assertEqual(sent, [commands])
+
+    def test_stale_document_isnt_cached_after_update(self):
+        stale = dict(self.get('profile/me/').data)
+        cache.clear()
+        response = self.client.patch(
+            f'{self.base_url}profile/me/', {'first_name': 'Ali'}
+        )
+        # A request which loaded the old row before the update
+        add_documents(self.user.pk, **{PROFILE: stale})
+        self.assertEqual(self.get('profile/me/').data, response.data)
+
+    def test_stale_document_isnt_cached_after_invalidation(self):
+        stale = dict(self.get('profile/me/').data)
+        profile = self.user.profile
+        profile.first_name = 'Ali'
+        profile.save()
+        add_documents(self.user.pk, **{PROFILE: stale})
+        self.assertEqual(self.get('profile/me/').data['first_name'], 'Ali')
+
+    def test_documents_are_added_with_one_round_trip(self):
+        documents = {PROFILE: {'first_name': 'Ali'}, ADDRESS: {}}
+        with self.assert_round_trips(2):
+            add_documents(self.user.pk, **documents)
+        self.assertEqual(get_documents(self.user.pk), documents)
+
+    def test_user_changes_invalidate_keys_and_documents(self):
+        self.get('profile/me/')
+        old_key = phone_number_cache_key(PHONE_NUMBER)
+        cache.set(old_key, self.user.pk)
+        self.user.phone_number = '09120000009'
+        # Deleting the keys and two tombstones
+        with self.assert_round_trips(3):
+            self.user.save()
+        self.assertIsNone(cache.get(old_key))
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertEqual(
+            cache.get(document_cache_key(PROFILE, self.user.pk)), TOMBSTONE
+        )
+
+
+class SmsProviderHandler(BaseHTTPRequestHandler):
+    """Answering with the scripted statuses and keeping the requests."""
+    statuses = []
+    requests = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.requests.append((dict(self.headers), json.loads(body)))
+        self.send_response(self.statuses.pop(0))
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpSmsGatewayTests(AccountsTestCase):
+    """Sending through the HTTP API of the provider."""
+
+    def setUp(self):
+        super().setUp()
+        server = HTTPServer(('127.0.0.1', 0), SmsProviderHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        SmsProviderHandler.statuses = []
+        SmsProviderHandler.requests = []
+        settings = override_settings(
+            SMS_GATEWAY_URL=f'http://127.0.0.1:{server.server_port}/sms',
+            SMS_GATEWAY_API_KEY='secret'
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_messages_are_posted_to_the_provider(self):
+        SmsProviderHandler.statuses = [200]
+        HttpSmsGateway().send(PHONE_NUMBER, 'Hello')
+        headers, body = SmsProviderHandler.requests[0]
+        self.assertEqual(headers['Authorization'], 'Bearer secret')
+        self.assertEqual(body, {'to': PHONE_NUMBER, 'message': 'Hello'})
+
+    def test_provider_errors_are_retried_by_the_task(self):
+        SmsProviderHandler.statuses = [503, 200]
+        with override_settings(
+            SMS_GATEWAY='accounts.sms.HttpSmsGateway'
+        ), self.assertLogs('core.tasks', 'WARNING'):
+            send_sms.delay(PHONE_NUMBER, 'Hello')
+        self.assertEqual(len(SmsProviderHandler.requests), 2)
+
+    def test_provider_errors_are_raised(self):
+        SmsProviderHandler.statuses = [400]
+        with self.assertRaises(urllib.error.HTTPError):
+            HttpSmsGateway().send(PHONE_NUMBER, 'Hello')
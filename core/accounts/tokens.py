@@ -0,0 +1,133 @@
+"""
+JWT tokens checked against a blacklist kept in Redis.
+
+Blacklisted jtis live in a sorted set scored by their expiry, the
+database stays the source of truth and the set is rebuilt from it by
+the prune_jwt_tokens command, or by a background task whenever it is
+missing (for example after a Redis restart) or older than
+JWT_BLACKLIST_READY_TTL seconds. Until then requests check the database.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from redis.exceptions import RedisError
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+from core.redis import get_connection
+from core.tasks import task
+
+logger = logging.getLogger(__name__)
+
+BLACKLIST_KEY = 'jwt:blacklist'
+BLACKLIST_READY_KEY = 'jwt:blacklist:ready'
+BLACKLIST_WARMING_KEY = 'jwt:blacklist:warming'
+BLACKLIST_WARMING_TTL = 60
+
+
+@task(max_retries=0)
+def warm_blacklist(batch_size=1000):
+    """
+    Loading the jtis of unexpired blacklisted tokens into Redis.
+    Jtis are only added, the live set is never deleted, so a token
+    blacklisted while the rows are read can't be dropped.
+    """
+    connection = get_connection()
+    rows = BlacklistedToken.objects.filter(
+        token__expires_at__gt=aware_utcnow()
+    ).values_list('token__jti', 'token__expires_at').iterator(
+        chunk_size=batch_size
+    )
+    jtis = {}
+    for jti, expires_at in rows:
+        jtis[jti] = expires_at.timestamp()
+        if len(jtis) >= batch_size:
+            connection.zadd(BLACKLIST_KEY, jtis)
+            jtis = {}
+    if jtis:
+        connection.zadd(BLACKLIST_KEY, jtis)
+    # Expiring, a jti which failed to be added is in the set after the
+    # next warm-up at the latest
+    connection.pipeline().set(
+        BLACKLIST_READY_KEY, 1, ex=settings.JWT_BLACKLIST_READY_TTL
+    ).delete(BLACKLIST_WARMING_KEY).execute()
+
+
+def is_blacklisted(jti):
+    """
+    Return whether the jti is blacklisted, or None when the set isn't
+    ready and the caller has to check the database. A warm-up is then
+    enqueued by the first request only.
+    """
+    connection = get_connection()
+    ready, score = connection.pipeline().exists(
+        BLACKLIST_READY_KEY
+    ).zscore(BLACKLIST_KEY, jti).execute()
+    if score is not None:
+        return True
+    if ready:
+        return False
+    if connection.set(
+        BLACKLIST_WARMING_KEY, 1, nx=True, ex=BLACKLIST_WARMING_TTL
+    ):
+        warm_blacklist.delay()
+    return None
+
+
+def is_blacklisted_in_db(jti):
+    """Checking the database when Redis is unreachable."""
+    return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+def add_to_blacklist(jti, exp):
+    get_connection().zadd(BLACKLIST_KEY, {jti: exp})
+
+
+def prune_blacklist():
+    """Removing expired jtis, expired tokens can't be used anyway."""
+    return get_connection().zremrangebyscore(BLACKLIST_KEY, 0, time.time())
+
+
+class CachedBlacklistMixin:
+    """Checking and extending the Redis blacklist before the database."""
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        try:
+            blacklisted = is_blacklisted(jti)
+        except RedisError as e:
+            logger.warning(
+                "Check the Redis connection...The error %s has occurred.", e
+            )
+            return super().check_blacklist()
+        if blacklisted is None:
+            return super().check_blacklist()
+        if blacklisted:
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        blacklisted_token = super().blacklist()
+        try:
+            add_to_blacklist(
+                self.payload[api_settings.JTI_CLAIM], self.payload['exp']
+            )
+        except RedisError:
+            # The set is rebuilt from the database after the next check,
+            # or once the ready flag expires if this fails as well
+            try:
+                get_connection().delete(BLACKLIST_READY_KEY)
+            except RedisError as e:
+                logger.warning(
+                    "Check the Redis connection...The error %s has occurred.",
+                    e
+                )
+        return blacklisted_token
+
+
+class RefreshToken(CachedBlacklistMixin, tokens.RefreshToken):
+    """Refresh token using the Redis blacklist."""
@@ -0,0 +1,144 @@
+"""
+Filling cached values without stampedes.
+
+`get_or_compute` stores the value with how long it took to compute and
+when it expires. Before expiring, each read may refresh it early with a
+probability which grows as the expiry gets closer and with the compute
+time (XFetch), so a hot key is usually recomputed by one request before
+it expires. Only the worker holding the fill lock recomputes (single
+flight), the others keep serving the previous value (stale while
+revalidate) or, when there is none, wait a moment for the lock holder.
+
+`invalidate` marks the value stale instead of deleting it, so writes
+don't leave every worker without a value to serve.
+
+When Redis fails (or its circuit breaker is open) values are computed
+from the database and served without being cached.
+"""
+import logging
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import QuerySet
+from redis.exceptions import RedisError
+
+from core.resilience import redis_breaker
+
+logger = logging.getLogger(__name__)
+
+WAIT_INTERVAL = 0.05
+
+
+def get_or_compute(key, compute, timeout=None, beta=1.0):
+    """
+    Return the cached value of the key, computing it with `compute()`
+    by a single worker when it's missing, stale or about to expire.
+    """
+    timeout = settings.CACHE_FILL_TIMEOUT if timeout is None else timeout
+    try:
+        cached = cache.get_many([key, _invalid_key(key)])
+        entry = cached.get(key)
+        invalidated_at = cached.get(_invalid_key(key))
+
+        if entry is not None:
+            value, delta, expires_at, computed_at = entry
+            stale = (
+                invalidated_at is not None and invalidated_at >= computed_at
+            )
+            # XFetch: -log(U) is exponentially distributed, U in (0, 1]
+            early = delta * beta * -math.log(1.0 - random.random())
+            if not stale and time.time() + early < expires_at:
+                return value
+            if not _acquire(key):
+                return value
+        elif not _acquire(key):
+            entry = _wait(key)
+            if entry is not None:
+                return entry[0]
+            return compute()
+    except RedisError as e:
+        logger.warning(
+            "Check the Redis connection...The error %s has occurred.", e
+        )
+        return compute()
+
+    try:
+        return _fill(key, compute, timeout)
+    finally:
+        _release(key)
+
+
+def invalidate(key):
+    """
+    Marking the cached value of the key stale, it's served until
+    a single worker has computed the new one.
+    """
+    invalidate_many([key])
+
+
+def invalidate_many(keys):
+    """Marking the cached values of the keys stale with one command."""
+    now = time.time()
+    try:
+        cache.set_many(
+            {_invalid_key(key): now for key in keys},
+            settings.CACHE_FILL_TIMEOUT + settings.CACHE_STALE_TTL
+        )
+    except RedisError as e:
+        logger.warning(
+            "Check the Redis connection...The error %s has occurred.", e
+        )
+
+
+def _fill(key, compute, timeout):
+    computed_at = time.time()
+    value = compute()
+    if isinstance(value, QuerySet):
+        # Querysets are lazy, running them is a part of the compute time
+        len(value)
+    delta = time.time() - computed_at
+    try:
+        cache.set(
+            key, (value, delta, computed_at + timeout, computed_at),
+            timeout + settings.CACHE_STALE_TTL
+        )
+    except RedisError as e:
+        logger.warning(
+            "Check the Redis connection...The error %s has occurred.", e
+        )
+    return value
+
+
+def _wait(key):
+    deadline = time.monotonic() + settings.CACHE_FILL_WAIT
+    # No waiting for a lock holder while Redis is failing
+    while time.monotonic() < deadline and not redis_breaker.is_open:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def _invalid_key(key):
+    return f'{key}:invalidated_at'
+
+
+def _lock_key(key):
+    return f'{key}:fill_lock'
+
+
+def _acquire(key):
+    return cache.add(_lock_key(key), 1, settings.CACHE_FILL_LOCK_TIMEOUT)
+
+
+def _release(key):
+    try:
+        cache.delete(_lock_key(key))
+    except RedisError as e:
+        logger.warning(
+            "Check the Redis connection...The error %s has occurred.", e
+        )
@@ -0,0 +1,172 @@
+"""
+Compact encoding of the values stored in the Redis cache.
+
+Values are stored in a versioned envelope:
+
+    MAGIC | envelope version | serializer id | compressor id | payload
+
+so every value says how it was written and formats can change without
+flushing the cache. The serializer (pickle, msgpack or orjson) and the
+compressor (zlib, zstd or lz4, above a size threshold) are chosen per
+key prefix by CACHE_CODECS, the longest matching prefix wins. Values
+which the chosen serializer can't encode fall back to pickle, and values
+without the envelope (written before it) are read as plain pickles.
+"""
+import pickle
+import threading
+import zlib
+
+import lz4.frame
+import msgpack
+import orjson
+import zstandard
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django_redis.client import DefaultClient
+from django_redis.client.default import CacheKey
+
+MAGIC = b'\xc5'
+VERSION = 1
+HEADER_SIZE = len(MAGIC) + 3
+
+# zstd contexts can't be used by several threads at once
+_zstd = threading.local()
+
+
+def _zstd_compress(data):
+    if not hasattr(_zstd, 'compressor'):
+        _zstd.compressor = zstandard.ZstdCompressor(level=3)
+    return _zstd.compressor.compress(data)
+
+
+def _zstd_decompress(data):
+    if not hasattr(_zstd, 'decompressor'):
+        _zstd.decompressor = zstandard.ZstdDecompressor()
+    return _zstd.decompressor.decompress(data)
+
+
+# name: (id, dumps, loads), ids are stored in the envelopes
+SERIALIZERS = {
+    'pickle': (
+        1,
+        lambda value: pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+        pickle.loads
+    ),
+    'msgpack': (
+        2,
+        lambda value: msgpack.packb(value, use_bin_type=True),
+        lambda data: msgpack.unpackb(data, raw=False, strict_map_key=False)
+    ),
+    'orjson': (3, orjson.dumps, orjson.loads),
+}
+COMPRESSORS = {
+    'none': (0, None, None),
+    'zlib': (1, zlib.compress, zlib.decompress),
+    'zstd': (2, _zstd_compress, _zstd_decompress),
+    'lz4': (3, lz4.frame.compress, lz4.frame.decompress),
+}
+_loads = {
+    serializer_id: loads for serializer_id, _, loads in SERIALIZERS.values()
+}
+_decompress = {
+    compressor_id: decompress
+    for compressor_id, _, decompress in COMPRESSORS.values()
+}
+
+
+class Codec:
+    """Encoding values with a serializer and an optional compressor."""
+
+    def __init__(self, serializer='pickle', compressor='none', threshold=0):
+        if serializer not in SERIALIZERS or compressor not in COMPRESSORS:
+            raise ImproperlyConfigured(
+                f'Unknown cache codec {serializer}/{compressor}.'
+            )
+        self.serializer = serializer
+        self.compressor = compressor
+        self.threshold = threshold
+
+    def encode(self, value):
+        serializer_id, dumps, _ = SERIALIZERS[self.serializer]
+        try:
+            payload = dumps(value)
+        except TypeError:
+            # Not representable by msgpack/orjson (like model instances)
+            serializer_id, dumps, _ = SERIALIZERS['pickle']
+            payload = dumps(value)
+
+        compressor_id, compress, _ = COMPRESSORS[self.compressor]
+        if compress is None or len(payload) < self.threshold:
+            compressor_id = 0
+        else:
+            compressed = compress(payload)
+            if len(compressed) < len(payload):
+                payload = compressed
+            else:
+                compressor_id = 0
+        return MAGIC + bytes((VERSION, serializer_id, compressor_id)) + payload
+
+    def __repr__(self):
+        return f'Codec({self.serializer}/{self.compressor}>{self.threshold})'
+
+
+def decode(data):
+    """Decoding a value written by any codec (or a plain pickle)."""
+    data = bytes(data)
+    if not data.startswith(MAGIC):
+        return pickle.loads(data)
+    version, serializer_id, compressor_id = data[len(MAGIC):HEADER_SIZE]
+    if version != VERSION:
+        raise ValueError(f'Unknown cache envelope version {version}.')
+    payload = data[HEADER_SIZE:]
+    if compressor_id:
+        payload = _decompress[compressor_id](payload)
+    return _loads[serializer_id](payload)
+
+
+class Encoded(bytes):
+    """A value already encoded by the codec of its key."""
+
+
+class CodecClient(DefaultClient):
+    """
+    django-redis client encoding values with the codec of their key's
+    prefix in CACHE_CODECS. Integers are stored as they are, so INCR
+    keeps working.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.codecs = sorted(
+            (
+                (prefix, Codec(**options))
+                for prefix, options in settings.CACHE_CODECS.items()
+            ),
+            key=lambda item: len(item[0]),
+            reverse=True
+        )
+
+    def get_codec(self, key):
+        if isinstance(key, CacheKey):
+            key = key.original_key()
+        key = str(key)
+        for prefix, codec in self.codecs:
+            if key.startswith(prefix):
+                return codec
+        return Codec()
+
+    def set(self, key, value, *args, **kwargs):
+        if isinstance(value, bool) or not isinstance(value, int):
+            value = Encoded(self.get_codec(key).encode(value))
+        return super().set(key, value, *args, **kwargs)
+
+    def encode(self, value):
+        if isinstance(value, Encoded):
+            return bytes(value)
+        return super().encode(value)
+
+    def decode(self, value):
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            return decode(value)
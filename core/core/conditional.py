@@ -0,0 +1,123 @@
+"""
+HTTP conditional requests (ETag/Last-Modified) for API views.
+"""
+import hashlib
+
+from django.db.models import (
+    Count,
+    Max
+)
+from django.utils.cache import get_conditional_response
+from django.utils.http import (
+    http_date,
+    quote_etag
+)
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    """Return a quoted ETag built from the given parts."""
+    digest = hashlib.md5(
+        '/'.join(str(part) for part in parts).encode(),
+        usedforsecurity=False
+    ).hexdigest()
+    return quote_etag(digest)
+
+
+class ConditionalViewSetMixin:
+    """
+    Adding ETag and Last-Modified validators to the list and retrieve
+    actions and answering 304 Not Modified before serializing anything.
+
+    Validators are derived from the `updated_at` timestamp of the objects
+    and of the related objects listed in `conditional_timestamp_fields`,
+    so fields that aren't stamped (like counters) don't change them.
+    """
+    conditional_timestamp_fields = ('updated_at',)
+
+    def get_extra_timestamps(self):
+        """
+        Timestamps of shown data which isn't in the rows (like stock
+        kept in Redis), a part of every validator.
+        """
+        return []
+
+    def get_list_validators(self, queryset):
+        """
+        Computing validators for a list with one aggregate query
+        (count and the latest timestamps) over the filtered queryset.
+        """
+        aggregates = queryset.order_by().aggregate(
+            count=Count('pk'),
+            **{
+                field: Max(field)
+                for field in self.conditional_timestamp_fields
+            }
+        )
+        count = aggregates.pop('count')
+        values = [*aggregates.values(), *self.get_extra_timestamps()]
+        timestamps = [value for value in values if value]
+        last_modified = max(timestamps) if timestamps else None
+        etag = make_etag(
+            self.request.get_full_path(),
+            self.request.accepted_renderer.format,
+            count,
+            *[value and value.timestamp() for value in values]
+        )
+        return etag, last_modified
+
+    def get_object_validators(self, instance):
+        """Computing validators for a single object."""
+        timestamps = []
+        for field in self.conditional_timestamp_fields:
+            value = instance
+            for attr in field.split('__'):
+                value = getattr(value, attr, None)
+            timestamps.append(value)
+        timestamps += self.get_extra_timestamps()
+        last_modified = max(
+            (value for value in timestamps if value), default=None
+        )
+        etag = make_etag(
+            self.request.get_full_path(),
+            self.request.accepted_renderer.format,
+            instance.pk,
+            *[value and value.timestamp() for value in timestamps]
+        )
+        return etag, last_modified
+
+    def get_conditional_response(self, etag, last_modified):
+        """Return 304 (or 412) response if the client validators match."""
+        return get_conditional_response(
+            self.request,
+            etag=etag,
+            last_modified=(
+                int(last_modified.timestamp()) if last_modified else None
+            )
+        )
+
+    def set_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        etag, last_modified = self.get_list_validators(queryset)
+        response = self.get_conditional_response(etag, last_modified)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return self.set_validators(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_object_response(self.get_object())
+
+    def conditional_object_response(self, instance):
+        """Serializing the instance unless the client copy is fresh."""
+        etag, last_modified = self.get_object_validators(instance)
+        response = self.get_conditional_response(etag, last_modified)
+        if response is None:
+            serializer = self.get_serializer(instance)
+            response = Response(serializer.data)
+        return self.set_validators(response, etag, last_modified)
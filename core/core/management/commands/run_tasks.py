@@ -0,0 +1,42 @@
+"""
+Django command to run the background task workers.
+"""
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.tasks import (
+    RedisBackend,
+    get_backend
+)
+
+
+class Command(BaseCommand):
+    """Consuming the Redis task queue with a pool of worker threads."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        if not isinstance(backend, RedisBackend):
+            raise CommandError('TASK_BACKEND must be core.tasks.RedisBackend.')
+
+        stop_event = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *args: stop_event.set())
+        workers = [
+            threading.Thread(target=backend.work, args=(stop_event,))
+            for _ in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(
+            self.style.SUCCESS(f"{options['workers']} task workers started.")
+        )
+        try:
+            while any(worker.is_alive() for worker in workers):
+                for worker in workers:
+                    worker.join(timeout=1)
+        except KeyboardInterrupt:
+            stop_event.set()
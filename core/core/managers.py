@@ -0,0 +1,121 @@
+"""
+Querysets and managers invalidating cached data on set-based writes.
+
+A model whose `objects` is a CacheInvalidatingManager (of a queryset
+declaring `cache_keys`) gets its cached keys marked stale after every
+update, bulk_update, bulk_create, delete and many to many change. The
+keys of a statement are invalidated with one command once the
+transaction commits, so readers can't cache the old rows again before
+the new ones are visible. update and bulk_update stamp updated_at,
+which they bypass otherwise (auto_now only applies to save).
+"""
+from django.db import transaction
+from django.db.models import (
+    Manager,
+    QuerySet
+)
+from django.db.models.signals import m2m_changed
+from django.dispatch import (
+    Signal,
+    receiver
+)
+from django.utils import timezone
+
+from .cache import invalidate_many
+
+# Sent with the model by set-based writes, which don't send post_save
+# or post_delete. The reference caches of the model listen to it.
+rows_changed = Signal()
+
+
+class CacheInvalidatingQuerySet(QuerySet):
+    """QuerySet invalidating `cache_keys` after each write."""
+    cache_keys = ()
+
+    def update(self, **kwargs):
+        """Updating the rows, return their number."""
+        if self._has_updated_at() and 'updated_at' not in kwargs:
+            kwargs['updated_at'] = timezone.now()
+        rows = super().update(**kwargs)
+        if rows:
+            self.invalidate_cache()
+        return rows
+
+    update.alters_data = True
+
+    def update_untracked(self, **kwargs):
+        """
+        UPDATE without stamping updated_at or invalidating the cache,
+        for counters and columns the cached data doesn't show.
+        """
+        return super().update(**kwargs)
+
+    update_untracked.alters_data = True
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        objs = list(objs)
+        fields = list(fields)
+        if self._has_updated_at() and 'updated_at' not in fields:
+            now = timezone.now()
+            for obj in objs:
+                obj.updated_at = now
+            fields.append('updated_at')
+        rows = super().bulk_update(objs, fields, batch_size=batch_size)
+        if rows:
+            self.invalidate_cache()
+        return rows
+
+    bulk_update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        if objs:
+            self.invalidate_cache()
+        return objs
+
+    bulk_create.alters_data = True
+
+    def delete(self):
+        deleted, rows_count = super().delete()
+        if deleted:
+            self.invalidate_cache()
+        return deleted, rows_count
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def invalidate_cache(self):
+        """
+        Marking `cache_keys` stale once the transaction commits and
+        sending rows_changed.
+        """
+        rows_changed.send(sender=self.model)
+        if self.cache_keys:
+            keys = list(self.cache_keys)
+            transaction.on_commit(lambda: invalidate_many(keys), self.db)
+
+    def _has_updated_at(self):
+        return any(
+            field.name == 'updated_at'
+            for field in self.model._meta.concrete_fields
+        )
+
+
+class CacheInvalidatingManager(
+    Manager.from_queryset(CacheInvalidatingQuerySet)
+):
+    """Manager exposing the CacheInvalidatingQuerySet methods."""
+
+
+@receiver(m2m_changed)
+def invalidate_m2m_changes(sender, instance, action, model, **kwargs):
+    """
+    Invalidating the cached keys of both sides of many to many
+    changes (add, remove, clear and set) of cache invalidating models.
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    for changed_model in (type(instance), model):
+        queryset = changed_model._default_manager.all()
+        if isinstance(queryset, CacheInvalidatingQuerySet):
+            queryset.invalidate_cache()
@@ -0,0 +1,224 @@
+"""
+Direct Redis access next to the Django cache API.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis import (
+    ConnectionPool,
+    Redis
+)
+from redis.exceptions import (
+    RedisError,
+    ResponseError
+)
+
+logger = logging.getLogger(__name__)
+
+_blocking_connections = {}
+
+
+def get_connection(alias='default'):
+    """Return the raw redis client of the given cache alias."""
+    return get_redis_connection(alias)
+
+
+def get_blocking_connection(alias='default'):
+    """
+    Return a client of the cache alias without the socket timeout (and
+    with its own pool), for blocking commands and subscriptions.
+    """
+    key = (alias, os.getpid())
+    if key not in _blocking_connections:
+        pool = get_connection(alias).connection_pool
+        _blocking_connections[key] = Redis(connection_pool=ConnectionPool(
+            connection_class=pool.connection_class,
+            **dict(pool.connection_kwargs, socket_timeout=None)
+        ))
+    return _blocking_connections[key]
+
+
+@contextmanager
+def cache_pipeline(pipeline=None, alias='default'):
+    """
+    Pipeline of the cache alias, sent as one round trip on exit.
+    Cache calls given `client=pipeline` (add, set, delete, delete_many)
+    and LuaScript calls are queued on it. Given a pipeline, commands
+    are queued on it and sent by its owner instead.
+    """
+    if pipeline is not None:
+        yield pipeline
+        return
+    pipeline = get_connection(alias).pipeline(transaction=False)
+    yield pipeline
+    pipeline.execute()
+
+
+class LuaScript:
+    """
+    Lua script which is registered on first call and then
+    executed with EVALSHA, so each call is one round-trip.
+    Given a pipeline as `client`, the call is queued on it.
+    """
+
+    def __init__(self, source, alias='default'):
+        self.source = source
+        self.alias = alias
+        self._script = None
+
+    def __call__(self, keys=(), args=(), client=None):
+        if self._script is None:
+            self._script = get_connection(self.alias).register_script(
+                self.source
+            )
+        return self._script(keys=list(keys), args=list(args), client=client)
+
+
+class ClientSideCache:
+    """
+    Client-side cache of read-mostly keys of the Django cache, kept in
+    the worker and invalidated by Redis server-assisted tracking.
+
+    A listener thread opens two dedicated connections: one subscribed
+    to `__redis__:invalidate` and one with `CLIENT TRACKING ON REDIRECT
+    BCAST` for the prefixes, so Redis pushes the names of changed keys
+    and their local copies are dropped. While tracking isn't set up
+    (Redis down, or a Redis without tracking like the fake one) every
+    lookup goes to Redis.
+    """
+    CHANNEL = '__redis__:invalidate'
+    HEALTH_CHECK_SECONDS = 5
+    RETRY_SECONDS = 5
+
+    def __init__(self, prefixes, maxsize=1024, ttl=60, alias='default'):
+        self.prefixes = prefixes
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.alias = alias
+        self.tracking = False
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        # Increased by every invalidation, a value read from Redis isn't
+        # kept if an invalidation arrived while it was read
+        self._invalidations = 0
+        self._listener_pid = None
+
+    def get(self, key):
+        """Return the value of the Django cache key, like cache.get."""
+        self._start_listener()
+        cache_key = cache.make_key(key)
+        with self._lock:
+            entry = self._local.get(cache_key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._local.move_to_end(cache_key)
+                return entry[1]
+            invalidations = self._invalidations
+        try:
+            value = cache.get(key)
+        except RedisError as e:
+            logger.warning(
+                "Check the Redis connection...The error %s has occurred.", e
+            )
+            return None
+        if value is not None and self.tracking:
+            with self._lock:
+                if invalidations == self._invalidations:
+                    self._local[cache_key] = (
+                        time.monotonic() + self.ttl, value
+                    )
+                    while len(self._local) > self.maxsize:
+                        self._local.popitem(last=False)
+        return value
+
+    def invalidate(self, keys=None):
+        """Dropping the local copies of the keys (all of them for None)."""
+        with self._lock:
+            self._invalidations += 1
+            if keys is None:
+                self._local.clear()
+            else:
+                for key in keys:
+                    self._local.pop(
+                        key.decode() if isinstance(key, bytes) else key, None
+                    )
+
+    def _start_listener(self):
+        if self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            self.tracking = False
+            self._local.clear()
+        threading.Thread(
+            target=self._listen, name='redis-tracking', daemon=True
+        ).start()
+
+    def _listen(self):
+        while True:
+            try:
+                self._track()
+            except ResponseError as e:
+                logger.info("Redis doesn't support client tracking: %s", e)
+                self.tracking = False
+                return
+            except RedisError as e:
+                logger.warning(
+                    "Check the Redis connection...The error %s has occurred.",
+                    e
+                )
+            self.tracking = False
+            self.invalidate()
+            time.sleep(self.RETRY_SECONDS)
+
+    def _connect(self):
+        pool = get_connection(self.alias).connection_pool
+        connection = pool.connection_class(**pool.connection_kwargs)
+        connection.connect()
+        return connection
+
+    def _track(self):
+        subscriber = self._connect()
+        tracker = self._connect()
+        try:
+            subscriber.send_command('CLIENT', 'ID')
+            client_id = subscriber.read_response()
+            subscriber.send_command('SUBSCRIBE', self.CHANNEL)
+            subscriber.read_response()
+            prefixes = []
+            for prefix in self.prefixes:
+                prefixes += ['PREFIX', cache.make_key(prefix)]
+            tracker.send_command(
+                'CLIENT', 'TRACKING', 'ON', 'REDIRECT', client_id,
+                'BCAST', *prefixes
+            )
+            tracker.read_response()
+            self.invalidate()
+            self.tracking = True
+            while True:
+                if subscriber.can_read(timeout=self.HEALTH_CHECK_SECONDS):
+                    _, _, keys = subscriber.read_response()
+                    # None after FLUSHDB/FLUSHALL
+                    self.invalidate(keys)
+                else:
+                    # Tracking is gone with the tracker connection
+                    tracker.send_command('PING')
+                    tracker.read_response()
+        finally:
+            subscriber.disconnect()
+            tracker.disconnect()
+
+
+client_side_cache = ClientSideCache(
+    settings.REDIS_TRACKING_PREFIXES,
+    settings.REDIS_TRACKING_SIZE,
+    settings.REDIS_TRACKING_TTL
+)
@@ -0,0 +1,295 @@
+"""
+Two-tier cache for reference data (brands, product types, attributes).
+
+Lookups hit a small LRU dictionary inside the worker first, then Redis,
+then the database. Reference data changes rarely, so a change of any
+row of a watched model (saved, deleted or written by a cache
+invalidating queryset) drops the whole cache: the generation counter
+of the cache, which is part of its Redis keys, is increased and the
+name of the cache is published on a Redis channel, which every worker
+listens to for dropping its local entries. Values loaded before the
+change are written under the old generation, where nobody reads them.
+Local entries (and the generation) also expire after REFCACHE_LOCAL_TTL,
+which bounds staleness if a message is missed.
+
+Hits of each tier are counted per worker and added to a Redis hash in
+batches, `manage.py refcache_stats` shows the hit rates.
+"""
+import logging
+import os
+import threading
+import time
+from collections import (
+    Counter,
+    OrderedDict
+)
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_save
+)
+from redis.exceptions import RedisError
+
+from .managers import rows_changed
+from .redis import (
+    get_blocking_connection,
+    get_connection
+)
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'refcache:invalidate'
+STATS_FLUSH_EVERY = 100
+LISTENER_RETRY_SECONDS = 5
+
+registry = {}
+
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+class ReferenceCache:
+    """
+    Cache of `loader(keys) -> {key: value}` results, dropped after
+    any change of the `models`. Missing keys aren't cached.
+    """
+
+    def __init__(self, name, loader, models=()):
+        self.name = name
+        self.loader = loader
+        self.prefix = f'refcache:{name}:'
+        self.maxsize = settings.REFCACHE_LOCAL_SIZE
+        self.local_ttl = settings.REFCACHE_LOCAL_TTL
+        self.ttl = settings.REFCACHE_TTL
+        self._local = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+        # Increased by every invalidation, values read meanwhile
+        # aren't kept locally
+        self._invalidations = 0
+        self._stats = Counter()
+        registry[name] = self
+        for model in models:
+            post_save.connect(
+                self._changed, sender=model, weak=False,
+                dispatch_uid=f'refcache:{name}:{model.__name__}:save'
+            )
+            post_delete.connect(
+                self._changed, sender=model, weak=False,
+                dispatch_uid=f'refcache:{name}:{model.__name__}:delete'
+            )
+            rows_changed.connect(
+                self._changed, sender=model, weak=False,
+                dispatch_uid=f'refcache:{name}:{model.__name__}:rows'
+            )
+
+    def get(self, key):
+        """Return the value of the key, or None if there isn't any."""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """Return a dictionary of the keys which have a value."""
+        start_listener()
+        keys = list(dict.fromkeys(keys))
+        found = self._get_local(keys)
+        missing = [key for key in keys if key not in found]
+        self._count('local', len(found))
+
+        if missing:
+            with self._lock:
+                invalidations = self._invalidations
+            try:
+                prefix = self._generation_prefix(invalidations)
+                cached = cache.get_many([prefix + key for key in missing])
+            except RedisError as e:
+                logger.warning(
+                    "Check the Redis connection...The error %s has occurred.",
+                    e
+                )
+                prefix = None
+                cached = {}
+            cached = {
+                key[len(prefix):]: value
+                for key, value in cached.items()
+            }
+            self._count('redis', len(cached))
+            missing = [key for key in missing if key not in cached]
+
+            loaded = self.loader(missing) if missing else {}
+            self._count('miss', len(missing))
+            if loaded and prefix is not None:
+                try:
+                    cache.set_many(
+                        {
+                            prefix + key: value
+                            for key, value in loaded.items()
+                        },
+                        self.ttl
+                    )
+                except RedisError as e:
+                    logger.warning(
+                        "Check the Redis connection..."
+                        "The error %s has occurred.", e
+                    )
+            cached.update(loaded)
+            self._set_local(cached, invalidations)
+            found.update(cached)
+        return found
+
+    def invalidate(self):
+        """Dropping the cache in Redis and in every worker."""
+        self.clear_local()
+        connection = get_connection()
+        try:
+            connection.incr(self.generation_key)
+        except RedisError as e:
+            logger.warning(
+                "Check the Redis connection...The error %s has occurred.", e
+            )
+        # Published even if the increment failed, the other workers
+        # still drop their local entries
+        try:
+            connection.publish(CHANNEL, self.name)
+        except RedisError as e:
+            logger.warning(
+                "Check the Redis connection...The error %s has occurred.", e
+            )
+
+    def clear_local(self):
+        with self._lock:
+            self._invalidations += 1
+            self._local.clear()
+            self._generation = None
+
+    def stats(self):
+        """Return hits of each tier of all workers, and the hit rate."""
+        self.flush_stats()
+        counts = get_connection().hgetall(self.stats_key)
+        counts = {
+            field.decode(): int(value) for field, value in counts.items()
+        }
+        total = sum(counts.values())
+        counts['hit_rate'] = (
+            (total - counts.get('miss', 0)) / total if total else None
+        )
+        return counts
+
+    def reset_stats(self):
+        get_connection().delete(self.stats_key)
+
+    @property
+    def stats_key(self):
+        return f'refcache:stats:{self.name}'
+
+    @property
+    def generation_key(self):
+        return f'refcache:generation:{self.name}'
+
+    def flush_stats(self):
+        """Adding the counters of this worker to the Redis hash."""
+        with self._lock:
+            stats, self._stats = self._stats, Counter()
+        if not stats:
+            return
+        try:
+            pipe = get_connection().pipeline(transaction=False)
+            for field, count in stats.items():
+                pipe.hincrby(self.stats_key, field, count)
+            pipe.execute()
+        except RedisError as e:
+            logger.warning(
+                "Check the Redis connection...The error %s has occurred.", e
+            )
+
+    def _get_local(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._local.get(key)
+                if entry is None:
+                    continue
+                expires_at, value = entry
+                if expires_at < now:
+                    del self._local[key]
+                    continue
+                self._local.move_to_end(key)
+                found[key] = value
+        return found
+
+    def _generation_prefix(self, invalidations):
+        """Return the prefix of the Redis keys of the current generation."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._generation
+        if entry is None or entry[0] < now:
+            generation = int(get_connection().get(self.generation_key) or 0)
+            entry = (now + self.local_ttl, generation)
+            with self._lock:
+                if invalidations == self._invalidations:
+                    self._generation = entry
+        return f'{self.prefix}{entry[1]}:'
+
+    def _set_local(self, values, invalidations):
+        expires_at = time.monotonic() + self.local_ttl
+        with self._lock:
+            if invalidations != self._invalidations:
+                return
+            for key, value in values.items():
+                self._local[key] = (expires_at, value)
+                self._local.move_to_end(key)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    def _count(self, tier, count):
+        if not count:
+            return
+        with self._lock:
+            self._stats[tier] += count
+            flush = sum(self._stats.values()) >= STATS_FLUSH_EVERY
+        if flush:
+            self.flush_stats()
+
+    def _changed(self, sender, **kwargs):
+        transaction.on_commit(self.invalidate)
+
+
+def start_listener():
+    """
+    Starting the invalidation listener thread of this worker process,
+    once per process (workers are forked after imports).
+    """
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        _listener_pid = os.getpid()
+        threading.Thread(
+            target=_listen, name='refcache-listener', daemon=True
+        ).start()
+
+
+def _listen():
+    while True:
+        try:
+            pubsub = get_blocking_connection().pubsub(
+                ignore_subscribe_messages=True
+            )
+            pubsub.subscribe(CHANNEL)
+            for message in pubsub.listen():
+                reference_cache = registry.get(message['data'].decode())
+                if reference_cache is not None:
+                    reference_cache.clear_local()
+        except RedisError as e:
+            logger.warning(
+                "Check the Redis connection...The error %s has occurred.", e
+            )
+        # Messages may have been missed while disconnected
+        for reference_cache in registry.values():
+            reference_cache.clear_local()
+        time.sleep(LISTENER_RETRY_SECONDS)
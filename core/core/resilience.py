@@ -0,0 +1,203 @@
+"""
+Circuit breakers for the backing services (Redis).
+
+Each worker keeps a breaker per service. After `failure_threshold`
+consecutive connection errors or timeouts the breaker opens and calls
+fail immediately with CircuitOpenError, so callers take their database
+fallback without waiting for timeouts. After `recovery_timeout` seconds
+the breaker is half-open: calls go through again, the first success
+closes it and a failure opens it again.
+
+The Redis breaker sits in the connection class of the pools, so every
+Redis client (cache, raw connections, subscriptions) goes through it.
+States and counters are exposed by the metrics view.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from redis.connection import (
+    Connection,
+    ConnectionPool
+)
+from redis.exceptions import (
+    ConnectionError,
+    RedisError,
+    TimeoutError
+)
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+STATES = (CLOSED, HALF_OPEN, OPEN)
+
+breakers = {}
+
+
+class CircuitOpenError(RedisError):
+    """
+    Raised instead of calling a service whose breaker is open.
+    Not a ConnectionError, so redis-py doesn't retry it.
+    """
+
+
+class CircuitBreaker:
+    """Breaker of one service in this worker process."""
+
+    def __init__(self, name, failure_threshold, recovery_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self.counters = dict.fromkeys(
+            ('failures', 'rejections', 'opened'), 0
+        )
+        self._lock = threading.Lock()
+        breakers[name] = self
+
+    def allow(self):
+        """Return whether a call may go to the service now."""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.recovery_timeout:
+                    self.counters['rejections'] += 1
+                    return False
+                self.state = HALF_OPEN
+            return True
+
+    def check(self):
+        if not self.allow():
+            raise CircuitOpenError(f'Circuit breaker {self.name} is open.')
+
+    def record_success(self):
+        if self.state == CLOSED and not self.failures:
+            return
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.counters['failures'] += 1
+            self.failures += 1
+            if self.state == HALF_OPEN or (
+                self.state == CLOSED
+                and self.failures >= self.failure_threshold
+            ):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.counters['opened'] += 1
+
+    @property
+    def is_open(self):
+        return self.state == OPEN
+
+
+redis_breaker = CircuitBreaker(
+    'redis',
+    settings.REDIS_BREAKER_FAILURE_THRESHOLD,
+    settings.REDIS_BREAKER_RECOVERY_TIMEOUT
+)
+
+
+class BreakerConnectionMixin:
+    """
+    Redis connection failing fast while the Redis breaker is open and
+    reporting connection errors and timeouts to it.
+    """
+    breaker = redis_breaker
+
+    def connect(self):
+        if getattr(self, '_sock', None) is not None:
+            return
+        self.breaker.check()
+        try:
+            return super().connect()
+        except (ConnectionError, TimeoutError):
+            self.breaker.record_failure()
+            raise
+
+    def send_command(self, *args, **kwargs):
+        self.breaker.check()
+        try:
+            return super().send_command(*args, **kwargs)
+        except (ConnectionError, TimeoutError):
+            self.breaker.record_failure()
+            raise
+
+    def read_response(self, *args, **kwargs):
+        try:
+            response = super().read_response(*args, **kwargs)
+        except (ConnectionError, TimeoutError):
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return response
+
+
+_breaker_connection_classes = {}
+
+
+def with_breaker(connection_class):
+    """Return the connection class guarded by the Redis breaker."""
+    if issubclass(connection_class, BreakerConnectionMixin):
+        return connection_class
+    if connection_class not in _breaker_connection_classes:
+        _breaker_connection_classes[connection_class] = type(
+            f'Breaker{connection_class.__name__}',
+            (BreakerConnectionMixin, connection_class),
+            {}
+        )
+    return _breaker_connection_classes[connection_class]
+
+
+class BreakerConnectionPool(ConnectionPool):
+    """Connection pool whose connections go through the Redis breaker."""
+
+    def __init__(self, connection_class=Connection, **kwargs):
+        super().__init__(
+            connection_class=with_breaker(connection_class), **kwargs
+        )
+
+
+def metrics(request):
+    """
+    Breaker states and counters of this worker in the Prometheus
+    text format, for staff users and METRICS_ALLOWED_IPS only.
+    """
+    if not (
+        request.user.is_staff
+        or request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    ):
+        raise PermissionDenied
+    lines = [
+        '# HELP circuit_breaker_state Current state of the breaker.',
+        '# TYPE circuit_breaker_state gauge',
+    ]
+    for name, breaker in sorted(breakers.items()):
+        for state in STATES:
+            lines.append(
+                f'circuit_breaker_state{{name="{name}",state="{state}"}} '
+                f'{int(breaker.state == state)}'
+            )
+    for counter, help_text in (
+        ('failures', 'Connection errors and timeouts.'),
+        ('rejections', 'Calls failed fast while the breaker was open.'),
+        ('opened', 'Times the breaker opened.'),
+    ):
+        lines += [
+            f'# HELP circuit_breaker_{counter}_total {help_text}',
+            f'# TYPE circuit_breaker_{counter}_total counter',
+        ] + [
+            f'circuit_breaker_{counter}_total{{name="{name}"}} '
+            f'{breaker.counters[counter]}'
+            for name, breaker in sorted(breakers.items())
+        ]
+    return HttpResponse(
+        '\n'.join(lines) + '\n',
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -1,7 +1,11 @@
 import os
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
 from pathlib import Path
 from datetime import timedelta
+from redis import exceptions as redis_exceptions
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -29,11 +33,14 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'debug_toolbar',
+    'core',
     'ticketing',
     'django_filters',
     'accounts',
     'product',
+    'payment',
     'rest_framework',
     'drf_spectacular',
     'rest_framework_simplejwt',
@@ -89,6 +96,14 @@ DATABASES = {
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
+PASSWORD_HASHERS = [
+    'accounts.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = int(
+    os.environ.get('PASSWORD_HASH_ITERATIONS', 600000)
+)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -130,6 +145,17 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static')
 ]
 
+# Static and media files are served by the proxy in production, hashed
+# names and precompressed copies let it cache and send them as they are.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'core.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -142,22 +168,120 @@ AUTH_USER_MODEL = "accounts.User"
 # DRF configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_THROTTLE_RATES': {
+        'otp_ip': os.environ.get('OTP_IP_THROTTLE_RATE', '20/min'),
+        'otp_phone': os.environ.get('OTP_PHONE_THROTTLE_RATE', '5/min'),
+    },
 }
 
+# OTP config
+OTP_EXPIRY_SECONDS = int(os.environ.get('OTP_EXPIRY_SECONDS', 120))
+OTP_MAX_ATTEMPTS = int(os.environ.get('OTP_MAX_ATTEMPTS', 5))
+OTP_MAX_SENDS = int(os.environ.get('OTP_MAX_SENDS', 19))
+OTP_REST_SECONDS = int(os.environ.get('OTP_REST_SECONDS', 2 * 60 * 60))
+
 # Validators config
 MAX_PROFILE_IMAG_SIZE_MB = os.environ.get('MAX_PROFILE_IMAG_SIZE_MB', 5)
 
+# Background tasks config
+TASK_BACKEND = os.environ.get('TASK_BACKEND', 'core.tasks.InProcessBackend')
+TASK_WORKERS = int(os.environ.get('TASK_WORKERS', 4))
+TASK_IDEMPOTENCY_TTL = 24 * 60 * 60
+
+# Ticketing config
+# Claimed tickets without response return to the queue after this timeout
+TICKET_CLAIM_TIMEOUT = int(os.environ.get('TICKET_CLAIM_TIMEOUT', 30 * 60))
+
+# Ticket attachments config
+# Private files, served by nginx through X-Accel-Redirect
+ATTACHMENTS_ROOT = os.environ.get(
+    'ATTACHMENTS_ROOT', '/vol/web/private/attachments'
+)
+ATTACHMENTS_X_ACCEL = not DEBUG
+ATTACHMENTS_X_ACCEL_LOCATION = '/protected/attachments/'
+ATTACHMENT_MAX_SIZE = int(
+    os.environ.get('ATTACHMENT_MAX_SIZE', 50 * 1024 * 1024)
+)
+ATTACHMENT_TICKET_QUOTA = int(
+    os.environ.get('ATTACHMENT_TICKET_QUOTA', 200 * 1024 * 1024)
+)
+
+# Payment config
+ORDER_RESERVATION_SECONDS = int(
+    os.environ.get('ORDER_RESERVATION_SECONDS', 15 * 60)
+)
+# The fake gateway approves every charge, without DEBUG the HTTP
+# gateway is used and needs the URL and API key of the provider
+PAYMENT_GATEWAY = os.environ.get('PAYMENT_GATEWAY') or (
+    'payment.gateways.FakePaymentGateway' if DEBUG
+    else 'payment.gateways.HttpPaymentGateway'
+)
+PAYMENT_GATEWAY_URL = os.environ.get('PAYMENT_GATEWAY_URL')
+PAYMENT_GATEWAY_API_KEY = os.environ.get('PAYMENT_GATEWAY_API_KEY')
+PAYMENT_GATEWAY_TIMEOUT = int(os.environ.get('PAYMENT_GATEWAY_TIMEOUT', 10))
+if PAYMENT_GATEWAY == 'payment.gateways.HttpPaymentGateway' and not (
+    PAYMENT_GATEWAY_URL and PAYMENT_GATEWAY_API_KEY
+):
+    raise ImproperlyConfigured(
+        'PAYMENT_GATEWAY_URL and PAYMENT_GATEWAY_API_KEY must be set '
+        'for the HTTP payment gateway.'
+    )
+# Pending payment attempts older than this are charged again (with the
+# same idempotency key) by the release_expired_orders sweeper
+PAYMENT_ATTEMPT_TIMEOUT = int(os.environ.get('PAYMENT_ATTEMPT_TIMEOUT', 60))
+
+# Reference data cache config (brands, product types, attributes)
+REFCACHE_LOCAL_SIZE = int(os.environ.get('REFCACHE_LOCAL_SIZE', 1024))
+REFCACHE_LOCAL_TTL = int(os.environ.get('REFCACHE_LOCAL_TTL', 60))
+REFCACHE_TTL = int(os.environ.get('REFCACHE_TTL', 24 * 60 * 60))
+
+# SMS config
+# The fake gateway sends nothing, without DEBUG the HTTP gateway is
+# used and needs the URL and API key of the provider
+SMS_GATEWAY = os.environ.get('SMS_GATEWAY') or (
+    'accounts.sms.FakeSmsGateway' if DEBUG
+    else 'accounts.sms.HttpSmsGateway'
+)
+SMS_GATEWAY_URL = os.environ.get('SMS_GATEWAY_URL')
+SMS_GATEWAY_API_KEY = os.environ.get('SMS_GATEWAY_API_KEY')
+SMS_GATEWAY_TIMEOUT = int(os.environ.get('SMS_GATEWAY_TIMEOUT', 10))
+if SMS_GATEWAY == 'accounts.sms.HttpSmsGateway' and not (
+    SMS_GATEWAY_URL and SMS_GATEWAY_API_KEY
+):
+    raise ImproperlyConfigured(
+        'SMS_GATEWAY_URL and SMS_GATEWAY_API_KEY must be set for the '
+        'HTTP SMS gateway.'
+    )
+
 # Simple_JWT config
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=5),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=90),
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
+    "TOKEN_REFRESH_SERIALIZER":
+        "accounts.api.v1.serializers.TokenRefreshSerializer",
+    "TOKEN_VERIFY_SERIALIZER":
+        "accounts.api.v1.serializers.TokenVerifySerializer",
 }
+AUTH_USER_CACHE_TTL = int(os.environ.get('AUTH_USER_CACHE_TTL', 60))
+USER_ID_CACHE_TTL = int(os.environ.get('USER_ID_CACHE_TTL', 24 * 60 * 60))
+ACCOUNT_DOCUMENT_CACHE_TTL = int(
+    os.environ.get('ACCOUNT_DOCUMENT_CACHE_TTL', 24 * 60 * 60)
+)
+# Invalidated documents can't be cached by readers for this long
+ACCOUNT_DOCUMENT_TOMBSTONE_TTL = int(
+    os.environ.get('ACCOUNT_DOCUMENT_TOMBSTONE_TTL', 10)
+)
+# A revoked refresh token missing from the Redis blacklist (because
+# Redis failed while it was revoked) is accepted for at most this long
+JWT_BLACKLIST_READY_TTL = int(
+    os.environ.get('JWT_BLACKLIST_READY_TTL', 5 * 60)
+)
 
 # Django debug toolbar config
 if DEBUG:
@@ -166,15 +290,78 @@ if DEBUG:
     INTERNAL_IPS = [ip[: ip.rfind(".")] + ".1" for ip in ips] + ["127.0.0.1", "10.0.2.2"]
 
 # Cache config
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://redis:6379/1')
+# Connections of the shared pool of each worker
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 50))
+# A dead Redis fails requests after these (seconds), not the OS timeout
+REDIS_CONNECT_TIMEOUT = float(os.environ.get('REDIS_CONNECT_TIMEOUT', 0.5))
+REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', 0.5))
+REDIS_RETRIES = int(os.environ.get('REDIS_RETRIES', 1))
+REDIS_CONNECTION_POOL_KWARGS = {
+    'max_connections': REDIS_MAX_CONNECTIONS,
+    # Retrying broken connections (like after a Redis restart) only,
+    # timed out commands may have been executed
+    'retry': Retry(
+        ExponentialBackoff(cap=0.1, base=0.01), REDIS_RETRIES
+    ),
+    'retry_on_error': [redis_exceptions.ConnectionError],
+    'health_check_interval': 30,
+}
+# In-process fake Redis for tests and local runs (fakeredis, from
+# requirements.dev.txt)
+if os.environ.get('REDIS_FAKE'):
+    import fakeredis
+    REDIS_CONNECTION_POOL_KWARGS['connection_class'] = (
+        fakeredis.FakeRedisConnection
+    )
+# Redis calls fail fast after this many consecutive connection errors
+# or timeouts, for this many seconds, see core/resilience.py
+REDIS_BREAKER_FAILURE_THRESHOLD = int(
+    os.environ.get('REDIS_BREAKER_FAILURE_THRESHOLD', 5)
+)
+REDIS_BREAKER_RECOVERY_TIMEOUT = float(
+    os.environ.get('REDIS_BREAKER_RECOVERY_TIMEOUT', 10)
+)
+# Addresses scraping /metrics/ without a staff session (space separated)
+METRICS_ALLOWED_IPS = os.environ.get(
+    'METRICS_ALLOWED_IPS', '127.0.0.1'
+).split()
+
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
-        "LOCATION": "redis://redis:6379/1",
+        "LOCATION": REDIS_URL,
         "OPTIONS": {
-            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "CLIENT_CLASS": "core.codecs.CodecClient",
+            "CONNECTION_POOL_CLASS": "core.resilience.BreakerConnectionPool",
+            "SOCKET_CONNECT_TIMEOUT": REDIS_CONNECT_TIMEOUT,
+            "SOCKET_TIMEOUT": REDIS_SOCKET_TIMEOUT,
+            "CONNECTION_POOL_KWARGS": REDIS_CONNECTION_POOL_KWARGS,
         }
     }
 }
+# Keys read from the client-side cache of the workers (Redis tracking)
+REDIS_TRACKING_PREFIXES = ['user:', 'user_id:']
+REDIS_TRACKING_SIZE = int(os.environ.get('REDIS_TRACKING_SIZE', 10000))
+REDIS_TRACKING_TTL = int(os.environ.get('REDIS_TRACKING_TTL', 5 * 60))
+# Serializer and compressor of cached values by key prefix, the longest
+# matching prefix wins. Values msgpack can't encode are pickled.
+CACHE_CODECS = {
+    '': {'serializer': 'pickle', 'compressor': 'zstd', 'threshold': 1024},
+    'profile:doc:': {
+        'serializer': 'msgpack', 'compressor': 'zstd', 'threshold': 1024
+    },
+    'address:doc:': {
+        'serializer': 'msgpack', 'compressor': 'zstd', 'threshold': 1024
+    },
+}
+
+# Cached querysets config, see core/cache.py
+CACHE_FILL_TIMEOUT = int(os.environ.get('CACHE_FILL_TIMEOUT', 5 * 60))
+# Stale values are served while a single worker recomputes them
+CACHE_STALE_TTL = int(os.environ.get('CACHE_STALE_TTL', 5 * 60))
+CACHE_FILL_LOCK_TIMEOUT = int(os.environ.get('CACHE_FILL_LOCK_TIMEOUT', 10))
+CACHE_FILL_WAIT = float(os.environ.get('CACHE_FILL_WAIT', 1))
 
 # Logging config
 LOGGING = {
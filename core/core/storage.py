@@ -0,0 +1,52 @@
+"""
+Storage backends.
+"""
+import gzip
+
+import brotli
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage which also writes gzip and brotli versions
+    of the hashed files, so that the proxy can serve them
+    (gzip_static, brotli_static) without compressing on every
+    request.
+    """
+    compressible_extensions = (
+        '.css', '.js', '.json', '.map', '.svg', '.txt', '.xml', '.html'
+    )
+    min_compress_size = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = set()
+        for name, hashed_name, processed in super().post_process(
+            paths, dry_run, **options
+        ):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names.add(hashed_name)
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+        for hashed_name in hashed_names:
+            if hashed_name.endswith(self.compressible_extensions):
+                self._precompress(hashed_name)
+
+    def _precompress(self, name):
+        """Write .gz and .br siblings when they are worth it."""
+        path = self.path(name)
+        with open(path, 'rb') as file:
+            content = file.read()
+        if len(content) < self.min_compress_size:
+            return
+
+        variants = (
+            ('.gz', gzip.compress(content, compresslevel=9, mtime=0)),
+            ('.br', brotli.compress(content, quality=11)),
+        )
+        for suffix, compressed in variants:
+            if len(compressed) < len(content):
+                with open(f'{path}{suffix}', 'wb') as file:
+                    file.write(compressed)
@@ -0,0 +1,187 @@
+"""
+Background tasks executed by a pool of workers.
+
+Tasks are enqueued to the backend of TASK_BACKEND: a thread pool inside
+the web process, a Redis queue consumed by `manage.py run_tasks`, or an
+immediate backend for tests. Failed tasks are retried with exponential
+backoff, and a task enqueued with an idempotency key runs at most once
+per key.
+"""
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+from .redis import (
+    get_blocking_connection,
+    get_connection
+)
+
+logger = logging.getLogger(__name__)
+
+_backend = None
+
+
+class Task:
+    """A function which can be executed by the task workers."""
+
+    def __init__(self, func, name, max_retries, retry_backoff):
+        self.func = func
+        self.name = name
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, idempotency_key=None, **kwargs):
+        """Enqueue the task to the configured backend."""
+        get_backend().enqueue({
+            'task': self.name,
+            'args': list(args),
+            'kwargs': kwargs,
+            'idempotency_key': idempotency_key,
+            'attempt': 0,
+        })
+
+
+def task(max_retries=3, retry_backoff=2):
+    """
+    Decorator for turning a module level function into a task,
+    messages refer to it by its dotted path.
+    """
+    def decorator(func):
+        return Task(
+            func, f'{func.__module__}.{func.__name__}',
+            max_retries, retry_backoff
+        )
+    return decorator
+
+
+def run_message(message):
+    """
+    Executing an enqueued message.
+    Return (message, countdown) when it must be retried, otherwise None.
+    """
+    try:
+        current_task = import_string(message['task'])
+        key = message['idempotency_key']
+    except (ImportError, KeyError, TypeError):
+        logger.exception('Dropping the malformed task %s.', message)
+        return None
+    lock_key = f'task:{current_task.name}:{key}'
+    if key and message['attempt'] == 0 and not cache.add(
+        lock_key, 'running', settings.TASK_IDEMPOTENCY_TTL
+    ):
+        logger.info('Skipping duplicate task %s (%s).', current_task.name, key)
+        return None
+
+    try:
+        current_task.func(*message['args'], **message['kwargs'])
+    except Exception:
+        if message['attempt'] < current_task.max_retries:
+            countdown = current_task.retry_backoff ** message['attempt']
+            logger.warning(
+                'Task %s failed, retrying in %s seconds.',
+                current_task.name, countdown, exc_info=True
+            )
+            return dict(message, attempt=message['attempt'] + 1), countdown
+        logger.exception('Task %s failed permanently.', current_task.name)
+        if key:
+            cache.delete(lock_key)
+    else:
+        if key:
+            cache.set(lock_key, 'done', settings.TASK_IDEMPOTENCY_TTL)
+    return None
+
+
+class ImmediateBackend:
+    """Running tasks and their retries right away, for tests."""
+
+    def enqueue(self, message):
+        retry = run_message(message)
+        while retry is not None:
+            retry = run_message(retry[0])
+
+
+class InProcessBackend:
+    """Running tasks in a thread pool of the current process."""
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.TASK_WORKERS, thread_name_prefix='tasks'
+        )
+
+    def enqueue(self, message, countdown=0):
+        if countdown:
+            timer = threading.Timer(countdown, self.enqueue, args=(message,))
+            timer.daemon = True
+            timer.start()
+        else:
+            self.executor.submit(self._run, message)
+
+    def _run(self, message):
+        close_old_connections()
+        try:
+            retry = run_message(message)
+        finally:
+            close_old_connections()
+        if retry is not None:
+            self.enqueue(*retry)
+
+
+class RedisBackend:
+    """
+    Pushing tasks to a Redis list consumed by `manage.py run_tasks`,
+    retries wait in a sorted set until they are due.
+    """
+    queue_key = 'tasks:queue'
+    delayed_key = 'tasks:delayed'
+
+    def enqueue(self, message, countdown=0):
+        payload = json.dumps(message)
+        if countdown:
+            get_connection().zadd(
+                self.delayed_key, {payload: time.time() + countdown}
+            )
+        else:
+            get_connection().lpush(self.queue_key, payload)
+
+    def work(self, stop_event, timeout=1):
+        """Consuming the queue until stop_event is set."""
+        connection = get_blocking_connection()
+        while not stop_event.is_set():
+            self._enqueue_due(connection)
+            item = connection.brpop(self.queue_key, timeout=timeout)
+            if item is None:
+                continue
+            close_old_connections()
+            try:
+                message = json.loads(item[1])
+            except ValueError:
+                logger.exception('Dropping the malformed task %s.', item[1])
+                continue
+            retry = run_message(message)
+            if retry is not None:
+                self.enqueue(*retry)
+
+    def _enqueue_due(self, connection):
+        for payload in connection.zrangebyscore(
+            self.delayed_key, 0, time.time()
+        ):
+            # Only the worker which removes the retry enqueues it
+            if connection.zrem(self.delayed_key, payload):
+                connection.lpush(self.queue_key, payload)
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(settings.TASK_BACKEND)()
+    return _backend
@@ -0,0 +1,452 @@
+"""
+Tests for the project level configuration.
+"""
+import gzip
+import os
+import pickle
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from unittest import mock
+
+import brotli
+import yaml
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import (
+    ImproperlyConfigured,
+    PermissionDenied
+)
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    override_settings
+)
+from django.urls import (
+    Resolver404,
+    resolve
+)
+from redis.exceptions import ConnectionError
+
+from . import tasks
+from .codecs import (
+    COMPRESSORS,
+    HEADER_SIZE,
+    MAGIC,
+    SERIALIZERS,
+    Codec,
+    decode
+)
+from .redis import get_connection
+from .resilience import metrics
+from .storage import CompressedManifestStaticFilesStorage
+from .refcache import (
+    CHANNEL,
+    ReferenceCache
+)
+from .throttling import SlidingWindowRateThrottle
+
+PROXY_CONF = os.path.join(
+    settings.BASE_DIR.parent, 'proxy', 'default.conf.tpl'
+)
+PROXY_DOCKERFILE = os.path.join(
+    settings.BASE_DIR.parent, 'proxy', 'Dockerfile'
+)
+DEPLOY_COMPOSE = os.path.join(
+    settings.BASE_DIR.parent, 'docker-compose-deploy.yml'
+)
+GATEWAY_ENV = {
+    'PAYMENT_GATEWAY_URL': 'https://payments.example.com/charges',
+    'PAYMENT_GATEWAY_API_KEY': 'secret',
+    'SMS_GATEWAY_URL': 'https://sms.example.com/messages',
+    'SMS_GATEWAY_API_KEY': 'secret',
+}
+
+worked = []
+
+
+@tasks.task(max_retries=0)
+def record(value):
+    worked.append(value)
+
+
+@override_settings(DEBUG=False)
+class StaticAndMediaDeliveryTests(SimpleTestCase):
+    """Static and media files are served by nginx, never by Python."""
+
+    def test_static_and_media_urls_are_not_routed_to_django(self):
+        for url in (
+            f'{settings.STATIC_URL}styles/styles.css',
+            f'{settings.MEDIA_URL}uploads/product/image.jpg',
+        ):
+            with self.subTest(url=url), self.assertRaises(Resolver404):
+                resolve(url)
+
+    def test_static_and_media_requests_dont_reach_the_views(self):
+        for url in (
+            f'{settings.STATIC_URL}styles/styles.css',
+            f'{settings.MEDIA_URL}uploads/product/image.jpg',
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_proxy_serves_static_and_media_from_disk(self):
+        if not os.path.exists(PROXY_CONF):
+            self.skipTest('The proxy config is not in this image.')
+        with open(PROXY_CONF) as file:
+            conf = file.read()
+        for url in (settings.STATIC_URL, settings.MEDIA_URL):
+            with self.subTest(url=url):
+                location = re.search(
+                    r'location\s+' + re.escape(url) + r'\s*\{([^}]*)\}', conf
+                )
+                self.assertIsNotNone(location)
+                self.assertIn('alias', location.group(1))
+                self.assertNotIn('uwsgi_pass', location.group(1))
+
+
+class PrecompressedStaticFilesTests(SimpleTestCase):
+    """Hashed static files get .gz and .br siblings for the proxy."""
+
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source)
+        self.addCleanup(shutil.rmtree, self.root)
+        self.storage = CompressedManifestStaticFilesStorage(
+            location=self.root, base_url='/static/'
+        )
+
+    def collect(self, files):
+        paths = {}
+        for name, content in files.items():
+            with open(os.path.join(self.source, name), 'wb') as file:
+                file.write(content)
+            with open(os.path.join(self.source, name), 'rb') as file:
+                self.storage.save(name, file)
+            paths[name] = (self.storage, name)
+        processed = list(self.storage.post_process(paths))
+        return {
+            name: self.storage.path(hashed)
+            for name, hashed, _ in processed
+        }
+
+    def test_compressible_files_get_gzip_and_brotli_siblings(self):
+        content = b'body { color: red; }\n' * 100
+        path = self.collect({'styles.css': content})['styles.css']
+
+        with open(f'{path}.gz', 'rb') as file:
+            self.assertEqual(gzip.decompress(file.read()), content)
+        with open(f'{path}.br', 'rb') as file:
+            self.assertEqual(brotli.decompress(file.read()), content)
+
+    def test_small_and_binary_files_are_left_alone(self):
+        paths = self.collect({
+            'small.css': b'body { color: red; }',
+            'image.png': b'\x89PNG' * 1000,
+        })
+        for path in paths.values():
+            with self.subTest(path=path):
+                self.assertFalse(os.path.exists(f'{path}.gz'))
+                self.assertFalse(os.path.exists(f'{path}.br'))
+
+    def test_proxy_serves_the_precompressed_files(self):
+        if not os.path.exists(PROXY_CONF):
+            self.skipTest('The proxy config is not in this image.')
+        with open(PROXY_CONF) as file:
+            conf = file.read()
+        with open(PROXY_DOCKERFILE) as file:
+            dockerfile = file.read()
+        location = re.search(
+            r'location\s+' + re.escape(settings.STATIC_URL)
+            + r'\s*\{([^}]*)\}',
+            conf
+        ).group(1)
+        for directive in ('brotli_static', 'gzip_static', 'gzip_vary'):
+            with self.subTest(directive=directive):
+                self.assertRegex(location, rf'{directive}\s+on;')
+        self.assertIn(
+            'load_module modules/ngx_http_brotli_static_module.so;',
+            dockerfile
+        )
+
+
+class SlidingWindowRateThrottleTests(SimpleTestCase):
+    """The throttles follow their policy when Redis is unreachable."""
+
+    def throttle(self, fail_open):
+        class Throttle(SlidingWindowRateThrottle):
+            rate = '5/min'
+
+            def get_cache_key(self, request, view):
+                return 'throttle_test'
+
+        Throttle.fail_open = fail_open
+        return Throttle()
+
+    def allow_request(self, throttle):
+        request = RequestFactory().post('/')
+        with mock.patch(
+            'core.throttling.SLIDING_WINDOW_SCRIPT',
+            side_effect=ConnectionError('Connection refused.')
+        ), self.assertLogs('core.throttling', 'WARNING'):
+            return throttle.allow_request(request, None)
+
+    def test_fail_open_allows_requests_while_redis_is_down(self):
+        self.assertTrue(self.allow_request(self.throttle(fail_open=True)))
+
+    def test_fail_closed_refuses_requests_while_redis_is_down(self):
+        throttle = self.throttle(fail_open=False)
+        self.assertFalse(self.allow_request(throttle))
+        self.assertEqual(
+            throttle.wait(), settings.REDIS_BREAKER_RECOVERY_TIMEOUT
+        )
+
+
+class ReferenceCacheTests(SimpleTestCase):
+    """Values loaded before an invalidation are never served after it."""
+
+    def setUp(self):
+        cache.clear()
+        self.rows = {'acme': 1}
+        self.reference_cache = ReferenceCache('test', self.load)
+        self.changed_while_loading = False
+
+    def tearDown(self):
+        cache.delete_pattern(f'{self.reference_cache.prefix}*')
+        get_connection().delete(
+            self.reference_cache.generation_key,
+            self.reference_cache.stats_key
+        )
+
+    def load(self, keys):
+        values = {key: self.rows[key] for key in keys if key in self.rows}
+        if self.changed_while_loading:
+            self.changed_while_loading = False
+            self.rows['acme'] = 2
+            self.reference_cache.invalidate()
+        return values
+
+    def test_invalidation_drops_cached_values(self):
+        self.assertEqual(self.reference_cache.get('acme'), 1)
+        self.rows['acme'] = 2
+        self.reference_cache.invalidate()
+        self.assertEqual(self.reference_cache.get('acme'), 2)
+
+    def test_values_loaded_before_a_change_are_not_cached(self):
+        self.changed_while_loading = True
+        self.assertEqual(self.reference_cache.get('acme'), 1)
+        self.reference_cache.clear_local()
+        self.assertEqual(self.reference_cache.get('acme'), 2)
+
+    def test_invalidation_is_published_when_redis_fails(self):
+        connection = mock.Mock()
+        connection.incr.side_effect = ConnectionError('Connection reset.')
+        with mock.patch(
+            'core.refcache.get_connection', return_value=connection
+        ), self.assertLogs('core.refcache', 'WARNING'):
+            self.reference_cache.invalidate()
+        connection.publish.assert_called_once_with(CHANNEL, 'test')
+
+
+class DeploySettingsTests(SimpleTestCase):
+    """The settings load without DEBUG when the gateways are set."""
+
+    def load_settings(self, **env):
+        env = {
+            **{
+                key: value for key, value in os.environ.items()
+                if 'GATEWAY' not in key
+            },
+            'DEBUG': '0',
+            **env,
+        }
+        return subprocess.run(
+            [
+                sys.executable, '-c',
+                'import core.settings as s;'
+                'print(s.PAYMENT_GATEWAY, s.SMS_GATEWAY)'
+            ],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True
+        )
+
+    def test_http_gateways_are_used_without_debug(self):
+        result = self.load_settings(**GATEWAY_ENV)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(
+            result.stdout.split(),
+            ['payment.gateways.HttpPaymentGateway',
+             'accounts.sms.HttpSmsGateway']
+        )
+
+    def test_missing_gateway_env_is_reported(self):
+        for key in GATEWAY_ENV:
+            with self.subTest(key=key):
+                env = {**GATEWAY_ENV}
+                del env[key]
+                result = self.load_settings(**env)
+                self.assertNotEqual(result.returncode, 0)
+                self.assertIn('ImproperlyConfigured', result.stderr)
+                self.assertIn(key, result.stderr)
+
+    def test_deploy_compose_passes_the_gateway_env(self):
+        if not os.path.exists(DEPLOY_COMPOSE):
+            self.skipTest('The compose file is not in this image.')
+        with open(DEPLOY_COMPOSE) as file:
+            compose = yaml.safe_load(file)
+        environment = compose['services']['backend']['environment']
+        self.assertIn('DEBUG=0', environment)
+        for key in GATEWAY_ENV:
+            with self.subTest(key=key):
+                self.assertTrue(any(
+                    variable.startswith(f'{key}=${{{key}:?')
+                    for variable in environment
+                ))
+
+
+@override_settings(METRICS_ALLOWED_IPS=['10.0.0.5'])
+class MetricsTests(SimpleTestCase):
+    """Breaker metrics are served to scrapers and staff only."""
+
+    def get(self, remote_addr, is_staff=False):
+        request = RequestFactory().get('/metrics/', REMOTE_ADDR=remote_addr)
+        request.user = mock.Mock(is_staff=is_staff)
+        return metrics(request)
+
+    def test_allowed_addresses_can_scrape(self):
+        response = self.get('10.0.0.5')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'circuit_breaker_state', response.content)
+
+    def test_staff_users_can_read(self):
+        response = self.get('203.0.113.7', is_staff=True)
+        self.assertEqual(response.status_code, 200)
+
+    def test_other_requests_are_forbidden(self):
+        with self.assertRaises(PermissionDenied):
+            self.get('203.0.113.7')
+        response = self.client.get('/metrics/', REMOTE_ADDR='203.0.113.7')
+        self.assertEqual(response.status_code, 403)
+
+    def test_proxy_allows_private_networks_only(self):
+        if not os.path.exists(PROXY_CONF):
+            self.skipTest('The proxy config is not in this image.')
+        with open(PROXY_CONF) as file:
+            conf = file.read()
+        location = re.search(
+            r'location\s+=\s+/metrics/\s*\{([^}]*)\}', conf
+        )
+        self.assertIsNotNone(location)
+        self.assertRegex(location.group(1), r'deny\s+all;')
+
+
+class RedisBackendTests(SimpleTestCase):
+    """The Redis task worker survives messages it can't run."""
+
+    def setUp(self):
+        self.backend = tasks.RedisBackend()
+        self.connection = get_connection()
+        self.connection.delete(self.backend.queue_key)
+        self.addCleanup(self.connection.delete, self.backend.queue_key)
+        worked.clear()
+
+    def message(self, name, *args):
+        return {
+            'task': name, 'args': list(args), 'kwargs': {},
+            'idempotency_key': None, 'attempt': 0,
+        }
+
+    def test_malformed_messages_are_dropped(self):
+        self.connection.lpush(self.backend.queue_key, 'not json')
+        self.backend.enqueue(self.message('core.tests.missing'))
+        self.backend.enqueue({'args': []})
+        self.backend.enqueue(self.message('core.tests.record', 'done'))
+
+        stop_event = threading.Event()
+        worker = threading.Thread(
+            target=self.backend.work, args=(stop_event, 0.1)
+        )
+        with self.assertLogs('core.tasks', 'ERROR') as logs:
+            worker.start()
+            for _ in range(50):
+                if worked:
+                    break
+                stop_event.wait(0.1)
+            stop_event.set()
+            worker.join()
+        self.assertEqual(worked, ['done'])
+        self.assertEqual(len(logs.records), 3)
+        self.assertEqual(self.connection.llen(self.backend.queue_key), 0)
+
+
+class CacheCodecTests(SimpleTestCase):
+    """Cached values in the versioned envelope of their key's codec."""
+    value = {'name': 'Phone', 'price': '100.000', 'tags': ['new'] * 500}
+
+    def setUp(self):
+        self.keys = ['codec:test:value', 'codec:test:counter', 'profile:doc:0']
+        self.addCleanup(cache.delete_many, self.keys)
+
+    def header(self, data):
+        self.assertTrue(data.startswith(MAGIC))
+        return tuple(data[len(MAGIC):HEADER_SIZE])
+
+    def test_every_codec_round_trips(self):
+        for serializer in SERIALIZERS:
+            for compressor in COMPRESSORS:
+                codec = Codec(serializer, compressor, threshold=100)
+                with self.subTest(codec=codec):
+                    data = codec.encode(self.value)
+                    self.assertEqual(decode(data), self.value)
+                    self.assertEqual(
+                        self.header(data)[1], SERIALIZERS[serializer][0]
+                    )
+
+    def test_values_are_compressed_above_the_threshold(self):
+        codec = Codec('msgpack', 'zstd', threshold=1024)
+        small = codec.encode({'name': 'Phone'})
+        self.assertEqual(self.header(small)[2], 0)
+        large = codec.encode(self.value)
+        self.assertEqual(self.header(large)[2], COMPRESSORS['zstd'][0])
+        self.assertLess(len(large), len(SERIALIZERS['msgpack'][1](
+            self.value
+        )))
+
+    def test_unsupported_values_fall_back_to_pickle(self):
+        data = Codec('orjson').encode({1, 2})
+        self.assertEqual(self.header(data)[1], SERIALIZERS['pickle'][0])
+        self.assertEqual(decode(data), {1, 2})
+
+    def test_plain_pickles_and_unknown_versions(self):
+        self.assertEqual(decode(pickle.dumps(self.value)), self.value)
+        with self.assertRaises(ValueError):
+            decode(MAGIC + bytes((99, 1, 0)) + pickle.dumps(1))
+        with self.assertRaises(ImproperlyConfigured):
+            Codec('yaml')
+
+    def stored(self, key):
+        return get_connection().get(cache.client.make_key(key))
+
+    def test_keys_use_the_codec_of_their_prefix(self):
+        cache.set('profile:doc:0', self.value)
+        cache.set('codec:test:value', self.value)
+        self.assertEqual(
+            self.header(self.stored('profile:doc:0'))[1],
+            SERIALIZERS['msgpack'][0]
+        )
+        self.assertEqual(
+            self.header(self.stored('codec:test:value'))[1],
+            SERIALIZERS['pickle'][0]
+        )
+        self.assertEqual(cache.get('profile:doc:0'), self.value)
+        self.assertEqual(cache.get('codec:test:value'), self.value)
+
+    def test_integers_are_stored_as_they_are(self):
+        cache.set('codec:test:counter', 1)
+        self.assertEqual(self.stored('codec:test:counter'), b'1')
+        self.assertEqual(cache.incr('codec:test:counter'), 2)
+        self.assertEqual(cache.get('codec:test:counter'), 2)
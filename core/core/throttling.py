@@ -0,0 +1,72 @@
+"""
+Throttles backed by Redis.
+"""
+import logging
+import uuid
+
+from django.conf import settings
+from redis.exceptions import RedisError
+from rest_framework.throttling import SimpleRateThrottle
+
+from .redis import LuaScript
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1]: sorted set of the request timestamps in the window.
+# ARGV: max requests, window in milliseconds, unique member.
+SLIDING_WINDOW_SCRIPT = LuaScript("""
+local now = redis.call('TIME')
+local now_ms = now[1] * 1000 + math.floor(now[2] / 1000)
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now_ms - window)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return {0, tonumber(oldest[2]) + window - now_ms}
+end
+redis.call('ZADD', KEYS[1], now_ms, ARGV[3])
+redis.call('PEXPIRE', KEYS[1], window)
+return {1, 0}
+""")
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    """
+    Sliding window rate throttle which checks and records
+    the request atomically with one Lua script call.
+    Subclasses define `scope` and `get_cache_key`.
+
+    When Redis is unreachable (or its circuit is open) the request
+    can't be counted, `fail_open` decides what happens then: allowed
+    (the default, the endpoint keeps working unthrottled) or refused
+    until the circuit breaker probes Redis again, for endpoints whose
+    abuse costs more than their downtime.
+    """
+    fail_open = True
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        try:
+            allowed, self.retry_after_ms = SLIDING_WINDOW_SCRIPT(
+                keys=[self.key],
+                args=[
+                    self.num_requests, self.duration * 1000, uuid.uuid4().hex
+                ]
+            )
+        except RedisError as e:
+            logger.warning(
+                "Check the Redis connection...The error %s has occurred.", e
+            )
+            self.retry_after_ms = (
+                settings.REDIS_BREAKER_RECOVERY_TIMEOUT * 1000
+            )
+            return self.fail_open
+        return bool(allowed)
+
+    def wait(self):
+        return self.retry_after_ms / 1000
@@ -10,6 +10,8 @@ from drf_spectacular.views import (
     SpectacularSwaggerView
 )
 
+from core.resilience import metrics
+
 # Health Check for CICD automation
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -25,6 +27,8 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     # ============ CICD Health Check ============ #
     path('health-check/', HealthCheck.as_view()),
+    # ============ Circuit breaker metrics (Prometheus) ============ #
+    path('metrics/', metrics),
     # ============ Accounts app ============ #
     path('auth/api/v1/', include('accounts.api.v1.urls')),
 
@@ -34,6 +38,9 @@ urlpatterns = [
     # ============ Ticketing app ============ #
     path('ticketing/api/v1/', include('ticketing.api.v1.urls')),
 
+    # ============ Payment app ============ #
+    path('payment/api/v1/', include('payment.api.v1.urls')),
+
     # ============ Django debug toolbar URL ============ #
     path("__debug__/", include("debug_toolbar.urls")),
 
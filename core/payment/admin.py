@@ -1,3 +1,44 @@
-from django.contrib import admin # noqa
+"""
+Admin panel for Payment app.
+"""
+from django.contrib import admin
 
-# Register your models here.
+from .models import (
+    CartItem,
+    Order,
+    OrderItem,
+    Payment
+)
+
+
+class OrderItemInline(admin.TabularInline):
+    """
+    Inline admin panel for using in OrderAdmin.
+    """
+    model = OrderItem
+    raw_id_fields = ['product']
+    extra = 0
+
+
+class PaymentInline(admin.TabularInline):
+    """
+    Inline admin panel for using in OrderAdmin.
+    """
+    model = Payment
+    extra = 0
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    """Admin panel config for orders."""
+    list_display = ['id', 'customer', 'status', 'total_price', 'created_at']
+    list_filter = ['status']
+    list_select_related = ['customer']
+    raw_id_fields = ['customer']
+    inlines = [OrderItemInline, PaymentInline]
+
+
+@admin.register(CartItem)
+class CartItemAdmin(admin.ModelAdmin):
+    """Admin panel config for cart items."""
+    raw_id_fields = ['customer', 'product']
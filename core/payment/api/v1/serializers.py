@@ -0,0 +1,76 @@
+"""
+Serializers for the Payment app.
+"""
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+
+from ...models import (
+    CartItem,
+    Order,
+    OrderItem,
+    Payment
+)
+
+
+class CartItemSerializer(serializers.ModelSerializer):
+    """Serializing products in the cart."""
+    product_name = serializers.CharField(
+        source='product.name', read_only=True
+    )
+
+    class Meta:
+        model = CartItem
+        fields = ['id', 'product', 'product_name', 'quantity']
+
+    def validate_quantity(self, value):
+        if value < 1:
+            raise serializers.ValidationError(
+                _('Quantity must be at least 1.')
+            )
+        return value
+
+    def validate_product(self, value):
+        request = self.context['request']
+        if self.instance is None and CartItem.objects.filter(
+            customer=request.user, product=value
+        ).exists():
+            raise serializers.ValidationError(
+                _('The product is in the cart, update its quantity.')
+            )
+        return value
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    """Serializing items of orders."""
+
+    class Meta:
+        model = OrderItem
+        fields = ['product', 'quantity', 'unit_price']
+        read_only_fields = ['unit_price']
+
+
+class PaymentSerializer(serializers.ModelSerializer):
+    """Serializing payments of orders."""
+
+    class Meta:
+        model = Payment
+        fields = ['amount', 'gateway', 'reference', 'status', 'created_at']
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    """
+    Serializing orders, created from `items` or from the
+    cart of the customer when they aren't sent.
+    """
+    items = OrderItemSerializer(many=True, required=False)
+    payments = PaymentSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'status', 'total_price', 'reserved_until',
+            'created_at', 'items', 'payments'
+        ]
+        read_only_fields = [
+            'status', 'total_price', 'reserved_until', 'created_at'
+        ]
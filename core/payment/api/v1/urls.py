@@ -0,0 +1,15 @@
+"""
+URL's of the Payment app.
+"""
+from rest_framework.routers import DefaultRouter
+
+from . import views
+
+router = DefaultRouter()
+
+router.register('cart', views.CartItemApiViewSet, basename='cart')
+router.register('orders', views.OrderApiViewSet, basename='order')
+
+urlpatterns = [
+]
+urlpatterns += router.urls
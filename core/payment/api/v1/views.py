@@ -0,0 +1,121 @@
+"""
+Endpoints of the Payment app.
+"""
+from django.db.models import Prefetch
+from django.utils.translation import gettext_lazy as _
+from rest_framework import (
+    mixins,
+    status,
+    viewsets
+)
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from product.inventory import InventoryUnavailable
+from .serializers import (
+    CartItemSerializer,
+    OrderSerializer
+)
+from ...models import (
+    CartItem,
+    Order,
+    OrderItem
+)
+from ...services import (
+    EmptyOrder,
+    OrderNotPayable,
+    OutOfStock,
+    pay_order,
+    place_order
+)
+
+
+class CartItemApiViewSet(viewsets.ModelViewSet):
+    """Endpoints for the cart of the authenticated user."""
+    serializer_class = CartItemSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return CartItem.objects.filter(
+            customer=self.request.user
+        ).select_related('product').order_by('created_at')
+
+    def perform_create(self, serializer):
+        serializer.save(customer=self.request.user)
+
+
+class OrderApiViewSet(
+    mixins.CreateModelMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet
+):
+    """
+    Endpoints for orders of the authenticated user, creating orders
+    requires an `Idempotency-Key` header.
+    """
+    serializer_class = OrderSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Order.objects.filter(
+            customer=self.request.user
+        ).prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.order_by('id')),
+            'payments'
+        ).order_by('-created_at')
+
+    def create(self, request, *args, **kwargs):
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if not idempotency_key or len(idempotency_key) > 64:
+            return Response(
+                {'detail': _('A valid Idempotency-Key header is required.')},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data.get('items')
+        if items is not None:
+            items = [(item['product'].pk, item['quantity']) for item in items]
+        try:
+            order, created = place_order(
+                request.user, idempotency_key, items
+            )
+        except EmptyOrder:
+            return Response(
+                {'detail': _('The order has no items.')},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except InventoryUnavailable as e:
+            return Response(
+                {'detail': _('Product is not available right now...Try again later.'), # noqa
+                 'product': e.product_id},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        except OutOfStock as e:
+            return Response(
+                {'detail': _('Product is out of stock.'),
+                 'product': e.product_id},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response(
+            self.get_serializer(self.get_queryset().get(pk=order.pk)).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+    @action(methods=['POST'], detail=True)
+    def pay(self, request, pk=None, *args, **kwargs):
+        """Paying the order through the payment gateway."""
+        order = self.get_object()
+        try:
+            pay_order(order.pk)
+        except OrderNotPayable:
+            return Response(
+                {'detail': _('The order is expired.')},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response(
+            self.get_serializer(self.get_queryset().get(pk=order.pk)).data,
+            status=status.HTTP_200_OK
+        )
@@ -0,0 +1,99 @@
+"""
+Payment gateways for Payment app.
+"""
+import json
+import logging
+import urllib.error
+import urllib.request
+import uuid
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class ChargeResult:
+    """Result of charging a customer by a gateway."""
+
+    def __init__(self, succeeded, reference=None, message=''):
+        self.succeeded = succeeded
+        self.reference = reference
+        self.message = message
+
+
+class BasePaymentGateway:
+    """Interface of the payment providers."""
+    name = None
+
+    def charge(self, order, amount, idempotency_key):
+        """
+        Charging the customer, providers must return the result of the
+        first charge for retries with the same idempotency key.
+        """
+        raise NotImplementedError
+
+
+class FakePaymentGateway(BasePaymentGateway):
+    """Accepting every charge in memory, for development and tests."""
+    name = 'fake'
+    charges = {}
+
+    def charge(self, order, amount, idempotency_key):
+        if idempotency_key not in self.charges:
+            self.charges[idempotency_key] = ChargeResult(
+                succeeded=True, reference=uuid.uuid4().hex
+            )
+            logger.info('Charged %s for order %s', amount, order.pk)
+        return self.charges[idempotency_key]
+
+
+class HttpPaymentGateway(BasePaymentGateway):
+    """
+    Charging through the HTTP API of the provider at
+    PAYMENT_GATEWAY_URL. The idempotency key is sent as the
+    Idempotency-Key header, so the provider returns the first result
+    for retried charges. Declined charges (4xx) are failed results,
+    network and 5xx errors are raised so the payment stays pending and
+    is charged again by reconcile_payments.
+    """
+    name = 'http'
+
+    def charge(self, order, amount, idempotency_key):
+        request = urllib.request.Request(
+            settings.PAYMENT_GATEWAY_URL,
+            data=json.dumps({
+                'order': str(order.pk),
+                'amount': str(amount),
+            }).encode(),
+            headers={
+                'Authorization': f'Bearer {settings.PAYMENT_GATEWAY_API_KEY}',
+                'Content-Type': 'application/json',
+                'Idempotency-Key': idempotency_key,
+            },
+            method='POST'
+        )
+        try:
+            with urllib.request.urlopen(
+                request, timeout=settings.PAYMENT_GATEWAY_TIMEOUT
+            ) as response:
+                body = json.load(response)
+        except urllib.error.HTTPError as e:
+            if e.code >= 500:
+                raise
+            body = json.load(e)
+            logger.info('Charge for order %s declined.', order.pk)
+            return ChargeResult(
+                succeeded=False,
+                reference=body.get('reference'),
+                message=body.get('message', '')
+            )
+        return ChargeResult(
+            succeeded=body.get('status') == 'succeeded',
+            reference=body.get('reference'),
+            message=body.get('message', '')
+        )
+
+
+def get_payment_gateway():
+    return import_string(settings.PAYMENT_GATEWAY)()
@@ -0,0 +1,115 @@
+"""
+Django command to benchmark concurrent orders of one product.
+"""
+import random
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from accounts.services import bulk_provision_users
+from product.models import (
+    Brand,
+    Product,
+    ProductType
+)
+from ...models import Order
+from ...services import (
+    OutOfStock,
+    place_order
+)
+
+
+class Command(BaseCommand):
+    """
+    Creating a product with `--stock` items and `--buyers` users who
+    order it at the same time from `--threads` connections, then
+    checking that stock isn't oversold. Run it against a database
+    which can be filled with test rows.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stock', type=int, default=100)
+        parser.add_argument('--buyers', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=50)
+        parser.add_argument('--quantity', type=int, default=1)
+
+    def handle(self, *args, **options):
+        run = uuid.uuid4().hex[:8]
+        brand = Brand.objects.create(name=f'flash-sale-{run}')
+        product_type = ProductType.objects.create(name=f'flash-sale-{run}')
+        product = Product.objects.create(
+            name=f'flash-sale-{run}', price=Decimal('10'),
+            stock=options['stock'], brand=brand, product_type=product_type
+        )
+        first = random.randrange(10 ** 9 - options['buyers'])
+        buyers = bulk_provision_users([
+            {'phone_number': f'09{number:09d}', 'password': None}
+            for number in range(first, first + options['buyers'])
+        ], skip_duplicates=True)
+
+        results = {'placed': 0, 'out_of_stock': 0, 'errors': 0}
+        latencies = []
+        lock = threading.Lock()
+        queue = list(buyers)
+
+        def buy():
+            try:
+                while True:
+                    with lock:
+                        if not queue:
+                            return
+                        buyer = queue.pop()
+                    started = time.perf_counter()
+                    try:
+                        place_order(
+                            buyer, uuid.uuid4().hex,
+                            [(product.pk, options['quantity'])]
+                        )
+                        outcome = 'placed'
+                    except OutOfStock:
+                        outcome = 'out_of_stock'
+                    except Exception:
+                        outcome = 'errors'
+                    with lock:
+                        results[outcome] += 1
+                        latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=buy) for _ in range(options['threads'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        product.refresh_from_db()
+        reserved = Order.objects.filter(
+            items__product=product
+        ).count() * options['quantity']
+        latencies.sort()
+        self.stdout.write(
+            f"{options['buyers']} buyers in {elapsed:.2f}s "
+            f"({options['buyers'] / elapsed:.0f} orders/s), "
+            f"p50 {latencies[len(latencies) // 2] * 1000:.1f}ms, "
+            f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms"
+        )
+        self.stdout.write(str(results))
+        oversold = product.stock < 0 or (
+            reserved + product.stock != options['stock']
+        )
+        if oversold:
+            self.stdout.write(self.style.ERROR(
+                f'Stock mismatch: {reserved} reserved, {product.stock} left.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'{reserved} reserved, {product.stock} left, no overselling.'
+            ))
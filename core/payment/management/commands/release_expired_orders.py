@@ -0,0 +1,42 @@
+"""
+Django command to release the stock of expired orders.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...services import (
+    reconcile_payments,
+    release_expired_orders
+)
+
+
+class Command(BaseCommand):
+    """
+    Reconciling stale payment attempts and expiring pending orders
+    whose reservation is over in batches, once or every `--interval`
+    seconds.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Keep sweeping every interval seconds.'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            reconciled = reconcile_payments()
+            if reconciled:
+                self.stdout.write(f'{reconciled} payments reconciled.')
+            total = 0
+            while True:
+                expired = release_expired_orders(options['batch_size'])
+                total += expired
+                if expired < options['batch_size']:
+                    break
+            self.stdout.write(f'{total} orders expired.')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -1,3 +1,136 @@
-from django.db import models # noqa
+"""
+Payment models.
+"""
+from django.contrib.auth import get_user_model
+from django.db import models
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
 
-# Create your models here.
+from core.timestamp import TimeStamp
+from product.models import Product
+
+User = get_user_model()
+
+
+class CartItem(TimeStamp):
+    """
+    Products which customers are going to buy.
+    """
+    customer = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='cart_items'
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='cart_items'
+    )
+    quantity = models.PositiveIntegerField(_('quantity'), default=1)
+
+    def __str__(self):
+        return f'{self.customer_id} => {self.product_id} x {self.quantity}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['customer', 'product'],
+                name='unique_cart_item'
+            ),
+        ]
+
+
+class Order(TimeStamp):
+    """
+    Orders of the customers, stock of the items is reserved
+    until `reserved_until` unless the order is paid.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', _('pending')
+        PAID = 'paid', _('paid')
+        EXPIRED = 'expired', _('expired')
+
+    customer = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='orders'
+    )
+    # Sent by the client, retrying a request returns the same order
+    idempotency_key = models.CharField(_('idempotency key'), max_length=64)
+    status = models.CharField(
+        _('status'), max_length=10,
+        choices=Status.choices, default=Status.PENDING
+    )
+    total_price = models.DecimalField(
+        _('total price'), max_digits=20, decimal_places=3, default=0
+    )
+    reserved_until = models.DateTimeField(_('reserved until'))
+
+    def __str__(self):
+        return f'{self.customer_id} => Order: {self.id} ({self.status})'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['customer', 'idempotency_key'],
+                name='unique_order_idempotency_key'
+            ),
+        ]
+        indexes = [
+            # Pending orders for the expired reservations sweeper
+            models.Index(
+                fields=['reserved_until'],
+                condition=Q(status='pending'),
+                name='payment_order_pending_idx'
+            ),
+        ]
+
+
+class OrderItem(TimeStamp):
+    """
+    Products of the orders with their price at the order time.
+    """
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name='items'
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.PROTECT, related_name='order_items'
+    )
+    quantity = models.PositiveIntegerField(_('quantity'))
+    unit_price = models.DecimalField(
+        _('unit price'), max_digits=20, decimal_places=3
+    )
+
+    def __str__(self):
+        return f'Order: {self.order_id} => {self.product_id} x {self.quantity}'
+
+
+class Payment(TimeStamp):
+    """
+    Payment attempts of the orders.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', _('pending')
+        SUCCEEDED = 'succeeded', _('succeeded')
+        FAILED = 'failed', _('failed')
+
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name='payments'
+    )
+    amount = models.DecimalField(
+        _('amount'), max_digits=20, decimal_places=3
+    )
+    gateway = models.CharField(_('gateway'), max_length=50)
+    reference = models.CharField(
+        _('reference'), max_length=100, null=True, blank=True, unique=True
+    )
+    status = models.CharField(
+        _('status'), max_length=10, choices=Status.choices
+    )
+
+    def __str__(self):
+        return f'Order: {self.order_id} => {self.amount} ({self.status})'
+
+    class Meta:
+        indexes = [
+            # Attempts waiting for the result of the gateway
+            models.Index(
+                fields=['created_at'],
+                condition=Q(status='pending'),
+                name='payment_payment_pending_idx'
+            ),
+        ]
@@ -0,0 +1,231 @@
+"""
+Services for Payment app.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import (
+    IntegrityError,
+    transaction
+)
+from django.db.models import Sum
+from django.utils import timezone
+
+from product.inventory import (
+    OutOfStock,
+    cancel_reservation,
+    release_stock,
+    reserve_stock
+)
+from product.models import Product
+from .gateways import get_payment_gateway
+from .models import (
+    CartItem,
+    Order,
+    OrderItem,
+    Payment
+)
+
+PRICE_PRECISION = Decimal('0.001')
+
+
+class OrderNotPayable(Exception):
+    """The order is expired or already failed."""
+
+
+class EmptyOrder(Exception):
+    """The order has no items."""
+
+
+def unit_price(product):
+    """Price of the product after its discount (percent)."""
+    price = product.price * (100 - min(product.discount, 100)) / 100
+    return price.quantize(PRICE_PRECISION)
+
+
+def place_order(customer, idempotency_key, items=None):
+    """
+    Creating an order from (product_id, quantity) items, or from the
+    cart of the customer, and reserving their stock.
+
+    Stock is reserved by product.inventory (in Redis for hot products,
+    otherwise with conditional UPDATEs in product id order so concurrent
+    orders can't deadlock), the whole order is rolled back if any of
+    the items is out of stock.
+    Orders are unique per (customer, idempotency_key), retries return
+    the existing order. Raise EmptyOrder without any item.
+    Return (order, created).
+    """
+    order = Order.objects.filter(
+        customer=customer, idempotency_key=idempotency_key
+    ).first()
+    if order is not None:
+        return order, False
+
+    from_cart = items is None
+    if from_cart:
+        items = CartItem.objects.filter(
+            customer=customer
+        ).values_list('product_id', 'quantity')
+    quantities = {}
+    for product_id, quantity in items:
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    if not quantities:
+        raise EmptyOrder
+
+    hot_reserved = {}
+    try:
+        with transaction.atomic():
+            # Inserting first, concurrent retries wait on the unique index
+            order = Order.objects.create(
+                customer=customer,
+                idempotency_key=idempotency_key,
+                reserved_until=timezone.now() + timedelta(
+                    seconds=settings.ORDER_RESERVATION_SECONDS
+                )
+            )
+            products = Product.objects.filter(
+                pk__in=quantities
+            ).only('price', 'discount').in_bulk()
+            for product_id in quantities:
+                if product_id not in products:
+                    raise OutOfStock(product_id)
+            hot_reserved = reserve_stock(quantities)
+            order_items = [
+                OrderItem(
+                    order=order,
+                    product_id=product_id,
+                    quantity=quantity,
+                    unit_price=unit_price(products[product_id])
+                )
+                for product_id, quantity in sorted(quantities.items())
+            ]
+            OrderItem.objects.bulk_create(order_items)
+            order.total_price = sum(
+                item.unit_price * item.quantity for item in order_items
+            )
+            order.save(update_fields=['total_price', 'updated_at'])
+            if from_cart:
+                CartItem.objects.filter(customer=customer).delete()
+    except IntegrityError:
+        cancel_reservation(hot_reserved)
+        order = Order.objects.filter(
+            customer=customer, idempotency_key=idempotency_key
+        ).first()
+        if order is None:
+            raise
+        return order, False
+    except BaseException:
+        cancel_reservation(hot_reserved)
+        raise
+    return order, True
+
+
+def pay_order(order_id, gateway=None):
+    """
+    Charging the order through the payment gateway. Return the order.
+
+    The attempt is recorded as a pending payment first (with the order
+    row locked, so the sweeper can't expire it in the middle), then
+    the gateway is called outside of any transaction and the result is
+    recorded. While an attempt is pending the order isn't expired and
+    paying again retries that attempt, whose idempotency key makes the
+    gateway charge once. Every attempt has its own key, so a declined
+    charge can be retried.
+    """
+    gateway = gateway or get_payment_gateway()
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order_id)
+        if order.status == Order.Status.PAID:
+            return order
+        payment = order.payments.filter(status=Payment.Status.PENDING).first()
+        if payment is None:
+            if order.status != Order.Status.PENDING or (
+                order.reserved_until < timezone.now()
+            ):
+                raise OrderNotPayable
+            payment = Payment.objects.create(
+                order=order,
+                amount=order.total_price,
+                gateway=gateway.name,
+                status=Payment.Status.PENDING
+            )
+    return charge_payment(payment, gateway)
+
+
+def charge_payment(payment, gateway=None):
+    """
+    Charging a pending payment with its idempotency key and recording
+    the result, the order is paid when the charge succeeded.
+    """
+    gateway = gateway or get_payment_gateway()
+    result = gateway.charge(
+        payment.order, payment.amount,
+        idempotency_key=f'payment:{payment.pk}'
+    )
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=payment.order_id)
+        recorded = Payment.objects.filter(
+            pk=payment.pk, status=Payment.Status.PENDING
+        ).update(
+            reference=result.reference,
+            status=(
+                Payment.Status.SUCCEEDED if result.succeeded
+                else Payment.Status.FAILED
+            ),
+            updated_at=timezone.now()
+        )
+        if recorded and result.succeeded:
+            order.status = Order.Status.PAID
+            order.save(update_fields=['status', 'updated_at'])
+    return order
+
+
+def reconcile_payments(batch_size=100):
+    """
+    Charging again (with their idempotency key, so nothing is charged
+    twice) payments left pending for PAYMENT_ATTEMPT_TIMEOUT seconds,
+    like when the process died while calling the gateway.
+    Return the number of reconciled payments.
+    """
+    payments = list(Payment.objects.filter(
+        status=Payment.Status.PENDING,
+        created_at__lt=timezone.now() - timedelta(
+            seconds=settings.PAYMENT_ATTEMPT_TIMEOUT
+        )
+    ).select_related('order').order_by('created_at')[:batch_size])
+    for payment in payments:
+        charge_payment(payment)
+    return len(payments)
+
+
+def release_expired_orders(batch_size=500):
+    """
+    Expiring a batch of pending orders whose reservation is over and
+    returning their stock. Orders locked by payments or with a pending
+    payment attempt are skipped. Return the number of expired orders.
+    """
+    with transaction.atomic():
+        order_ids = list(Order.objects.filter(
+            status=Order.Status.PENDING,
+            reserved_until__lt=timezone.now()
+        ).exclude(
+            payments__status=Payment.Status.PENDING
+        ).order_by('reserved_until').select_for_update(
+            skip_locked=True
+        ).values_list('id', flat=True)[:batch_size])
+        if not order_ids:
+            return 0
+        reserved = OrderItem.objects.filter(
+            order_id__in=order_ids
+        ).values('product_id').annotate(
+            quantity=Sum('quantity')
+        ).order_by('product_id')
+        release_stock({
+            item['product_id']: item['quantity'] for item in reserved
+        })
+        Order.objects.filter(pk__in=order_ids).update(
+            status=Order.Status.EXPIRED, updated_at=timezone.now()
+        )
+    return len(order_ids)
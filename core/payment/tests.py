@@ -0,0 +1,230 @@
+"""
+Tests for payment app.
+"""
+import json
+import threading
+import urllib.error
+from http.server import (
+    BaseHTTPRequestHandler,
+    HTTPServer
+)
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import (
+    TestCase,
+    override_settings
+)
+from rest_framework.test import APIClient
+
+from accounts.services import provision_user
+from product.models import (
+    Brand,
+    Product,
+    ProductType
+)
+from .gateways import (
+    BasePaymentGateway,
+    ChargeResult,
+    HttpPaymentGateway
+)
+from .models import (
+    Order,
+    Payment
+)
+from .services import (
+    EmptyOrder,
+    pay_order,
+    place_order,
+    reconcile_payments
+)
+
+
+class ScriptedPaymentGateway(BasePaymentGateway):
+    """Answering charges with the given results, one per new key."""
+    name = 'scripted'
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.charges = {}
+        self.atomic_blocks = []
+
+    def charge(self, order, amount, idempotency_key):
+        self.atomic_blocks.append(len(connection.atomic_blocks))
+        if idempotency_key not in self.charges:
+            self.charges[idempotency_key] = ChargeResult(
+                succeeded=self.results.pop(0),
+                reference=f'{idempotency_key}:reference'
+            )
+        return self.charges[idempotency_key]
+
+
+class PaymentTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.customer = provision_user('09123456789', None)
+        self.product = Product.objects.create(
+            name='Phone', price=100, stock=10,
+            brand=Brand.objects.create(name='Acme'),
+            product_type=ProductType.objects.create(name='Mobile')
+        )
+
+    def place_order(self, key='order'):
+        return place_order(self.customer, key, [(self.product.pk, 1)])[0]
+
+
+class PlaceOrderTests(PaymentTestCase):
+
+    def test_empty_orders_are_rejected(self):
+        with self.assertRaises(EmptyOrder):
+            place_order(self.customer, 'order', [])
+        # From the empty cart
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        response = client.post(
+            '/payment/api/v1/orders/', {}, format='json',
+            HTTP_IDEMPOTENCY_KEY='cart'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class PayOrderTests(PaymentTestCase):
+
+    def test_declined_charge_can_be_retried(self):
+        order = self.place_order()
+        gateway = ScriptedPaymentGateway(False, True)
+        self.assertEqual(
+            pay_order(order.pk, gateway).status, Order.Status.PENDING
+        )
+        self.assertEqual(
+            pay_order(order.pk, gateway).status, Order.Status.PAID
+        )
+        self.assertEqual(
+            list(order.payments.order_by('id').values_list(
+                'status', flat=True
+            )),
+            [Payment.Status.FAILED, Payment.Status.SUCCEEDED]
+        )
+
+    def test_gateway_is_called_outside_transactions(self):
+        order = self.place_order()
+        gateway = ScriptedPaymentGateway(True)
+        atomic_blocks = len(connection.atomic_blocks)
+        pay_order(order.pk, gateway)
+        self.assertEqual(gateway.atomic_blocks, [atomic_blocks])
+
+    def test_pending_attempt_is_retried_with_its_key(self):
+        order = self.place_order()
+        payment = Payment.objects.create(
+            order=order, amount=order.total_price, gateway='scripted',
+            status=Payment.Status.PENDING
+        )
+        gateway = ScriptedPaymentGateway(True)
+        gateway.charges[f'payment:{payment.pk}'] = ChargeResult(
+            succeeded=True, reference='first'
+        )
+        self.assertEqual(
+            pay_order(order.pk, gateway).status, Order.Status.PAID
+        )
+        payment.refresh_from_db()
+        self.assertEqual(payment.reference, 'first')
+        self.assertEqual(order.payments.count(), 1)
+
+
+class ProviderHandler(BaseHTTPRequestHandler):
+    """Answering charges with the scripted (status, body) responses."""
+    responses = []
+    requests = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.requests.append((dict(self.headers), json.loads(body)))
+        status, response = self.responses.pop(0)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(response).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpPaymentGatewayTests(PaymentTestCase):
+    """Charging through the HTTP API of the provider."""
+
+    def setUp(self):
+        super().setUp()
+        server = HTTPServer(('127.0.0.1', 0), ProviderHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        ProviderHandler.responses = []
+        ProviderHandler.requests = []
+        settings = override_settings(
+            PAYMENT_GATEWAY='payment.gateways.HttpPaymentGateway',
+            PAYMENT_GATEWAY_URL=(
+                f'http://127.0.0.1:{server.server_port}/charges'
+            ),
+            PAYMENT_GATEWAY_API_KEY='secret'
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_successful_charge_pays_the_order(self):
+        ProviderHandler.responses = [
+            (200, {'status': 'succeeded', 'reference': 'ch_1'})
+        ]
+        order = self.place_order()
+        self.assertEqual(pay_order(order.pk).status, Order.Status.PAID)
+        self.assertEqual(order.payments.get().reference, 'ch_1')
+        headers, body = ProviderHandler.requests[0]
+        payment = order.payments.get()
+        self.assertEqual(headers['Authorization'], 'Bearer secret')
+        self.assertEqual(headers['Idempotency-Key'], f'payment:{payment.pk}')
+        self.assertEqual(body, {
+            'order': str(order.pk), 'amount': str(payment.amount)
+        })
+
+    def test_declined_charge_fails_the_payment(self):
+        ProviderHandler.responses = [
+            (402, {'reference': 'ch_1', 'message': 'Insufficient funds.'})
+        ]
+        order = self.place_order()
+        self.assertEqual(pay_order(order.pk).status, Order.Status.PENDING)
+        self.assertEqual(
+            order.payments.get().status, Payment.Status.FAILED
+        )
+
+    def test_provider_errors_leave_the_payment_pending(self):
+        ProviderHandler.responses = [
+            (503, {}),
+            (200, {'status': 'succeeded', 'reference': 'ch_1'}),
+        ]
+        order = self.place_order()
+        with self.assertRaises(urllib.error.HTTPError):
+            pay_order(order.pk)
+        payment = order.payments.get()
+        self.assertEqual(payment.status, Payment.Status.PENDING)
+
+        Payment.objects.filter(pk=payment.pk).update(
+            created_at=payment.created_at.replace(year=2000)
+        )
+        self.assertEqual(reconcile_payments(), 1)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.Status.PAID)
+        self.assertEqual(
+            [headers['Idempotency-Key'] for headers, _ in (
+                ProviderHandler.requests
+            )],
+            [f'payment:{payment.pk}'] * 2
+        )
+
+    def test_gateway_name_is_recorded(self):
+        ProviderHandler.responses = [(200, {'status': 'succeeded'})]
+        order = self.place_order()
+        pay_order(order.pk)
+        self.assertEqual(
+            order.payments.get().gateway, HttpPaymentGateway.name
+        )
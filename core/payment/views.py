@@ -1,3 +0,0 @@
-from django.shortcuts import render # noqa
-
-# Create your views here.
@@ -15,21 +15,66 @@ from .models import (
 )
 
 
+class ActivationAdminMixin:
+    """
+    Bulk activate/deactivate actions with a single UPDATE, which
+    invalidates the cached products and reference caches itself.
+    """
+    actions = ['activate', 'deactivate']
+
+    @admin.action(description='Activate selected %(verbose_name_plural)s')
+    def activate(self, request, queryset):
+        self._set_active(request, queryset, True)
+
+    @admin.action(description='Deactivate selected %(verbose_name_plural)s')
+    def deactivate(self, request, queryset):
+        self._set_active(request, queryset, False)
+
+    def _set_active(self, request, queryset, is_active):
+        count = queryset.update(is_active=is_active)
+        self.message_user(
+            request,
+            f'{count} {self.model._meta.verbose_name_plural} '
+            f'{"activated" if is_active else "deactivated"}.'
+        )
+
+
 class ProductImageAdmin(admin.TabularInline):
     model = ProductImage
 
+    def get_queryset(self, request):
+        # Rows are shown with their __str__, which reads the product
+        return super().get_queryset(request).select_related('product')
+
 
 @admin.register(ProductAttributeValue)
 class ProductAttributeValueAdmin(admin.ModelAdmin):
     model = ProductAttributeValue
+    list_display = ('product', 'attribute_value')
+    list_select_related = ('product', 'attribute_value__attribute')
+    autocomplete_fields = ('product', 'attribute_value')
+    search_fields = ('product__name', 'product__sku')
+    ordering = ('product', 'attribute')
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(ActivationAdminMixin, admin.ModelAdmin):
     inlines = [
         # ProductAttributeValueInline,
         ProductImageAdmin
     ]
+    list_display = (
+        'name', 'sku', 'brand', 'product_type',
+        'price', 'stock', 'is_active', 'updated_at'
+    )
+    list_select_related = ('brand', 'product_type')
+    list_filter = ('is_active',)
+    search_fields = ('name', 'sku')
+    ordering = ('name',)
+    autocomplete_fields = ('owner', 'brand', 'product_type')
+    list_per_page = 50
+    # No COUNT(*) of the whole catalog on every changelist page
+    show_full_result_count = False
 
 
 class AttributeValueInline(admin.TabularInline):
@@ -39,10 +84,42 @@ class AttributeValueInline(admin.TabularInline):
 @admin.register(Attribute)
 class AttributeAdmin(admin.ModelAdmin):
     inlines = [AttributeValueInline]
+    search_fields = ('name',)
+    ordering = ('name',)
+
+
+@admin.register(AttributeValue)
+class AttributeValueAdmin(admin.ModelAdmin):
+    list_display = ('value', 'attribute')
+    list_select_related = ('attribute',)
+    search_fields = ('value', 'attribute__name')
+    ordering = ('attribute__name', 'value')
+    autocomplete_fields = ('attribute',)
+
+
+@admin.register(Brand)
+class BrandAdmin(ActivationAdminMixin, admin.ModelAdmin):
+    list_display = ('name', 'owner', 'discount', 'is_active')
+    list_select_related = ('owner',)
+    list_filter = ('is_active',)
+    search_fields = ('name',)
+    ordering = ('name',)
+    autocomplete_fields = ('owner',)
+
 
+@admin.register(ProductType)
+class ProductTypeAdmin(ActivationAdminMixin, admin.ModelAdmin):
+    list_display = ('name', 'owner', 'discount', 'is_active')
+    list_select_related = ('owner',)
+    list_filter = ('is_active',)
+    search_fields = ('name',)
+    ordering = ('name',)
+    autocomplete_fields = ('owner',)
 
-admin.site.register(Brand)
 
-admin.site.register(AttributeValue)
-admin.site.register(ProductType)
-admin.site.register(ProductTypeAttribute)
+@admin.register(ProductTypeAttribute)
+class ProductTypeAttributeAdmin(admin.ModelAdmin):
+    list_display = ('product_type', 'attribute')
+    list_select_related = ('product_type', 'attribute')
+    autocomplete_fields = ('product_type', 'attribute')
+    ordering = ('product_type', 'attribute')
@@ -1,9 +1,70 @@
 """
 Custom filters for product app.
 """
+from django.db.models import (
+    Count,
+    Exists,
+    OuterRef,
+    Q
+)
 from django_filters import rest_framework as filters
 
-from ...models import Product
+from ...models import (
+    Product,
+    ProductAttributeValue
+)
+
+
+def parse_attributes(values):
+    """
+    Grouping `name:value` pairs by attribute name,
+    pairs without a value are ignored.
+    """
+    attributes = {}
+    for pair in values:
+        name, _, value = pair.partition(':')
+        if name and value:
+            attributes.setdefault(name, set()).add(value)
+    return attributes
+
+
+def attribute_condition(attribute, values):
+    return Q(
+        attribute_value__attribute__name=attribute,
+        attribute_value__value__in=values
+    )
+
+
+def facet_counts(products, attributes):
+    """
+    Return the number of products per attribute value in one grouped
+    query. Values of an attribute are counted over the products matching
+    the selections of the other attributes only (disjunctive faceting),
+    so selecting a value doesn't hide the alternatives of its attribute.
+    """
+    rows = ProductAttributeValue.objects.filter(
+        product__in=products.order_by().values('pk')
+    )
+    condition = Q()
+    for index, (attribute, values) in enumerate(attributes.items()):
+        flag = f'matches_{index}'
+        rows = rows.annotate(**{flag: Exists(
+            ProductAttributeValue.objects.filter(
+                attribute_condition(attribute, values),
+                product_id=OuterRef('product_id')
+            )
+        )})
+        condition &= Q(attribute_value__attribute__name=attribute) | Q(
+            **{flag: True}
+        )
+    return rows.filter(condition).values(
+        'attribute_value__attribute__name', 'attribute_value__value'
+    ).annotate(
+        count=Count('product_id')
+    ).order_by(
+        'attribute_value__attribute__name', '-count',
+        'attribute_value__value'
+    )
 
 
 class ProductFilter(filters.FilterSet):
@@ -18,7 +79,33 @@ class ProductFilter(filters.FilterSet):
     product_type = filters.CharFilter(
         field_name='product_type__slug', lookup_expr='icontains'
     )
+    attr = filters.CharFilter(
+        method='filter_attributes',
+        help_text=(
+            'Repeatable `name:value`, values of the same attribute '
+            'are ORed and different attributes are ANDed.'
+        )
+    )
 
     class Meta:
         model = Product
         fields = ['brand', 'product_type']
+
+    def filter_attributes(self, queryset, name, value):
+        """
+        Filtering with one subquery: products having any of the values
+        of every requested attribute, which means the number of distinct
+        matched attributes equals the number of requested ones.
+        """
+        attributes = parse_attributes(self.data.getlist('attr'))
+        if not attributes:
+            return queryset
+        condition = Q()
+        for attribute, values in attributes.items():
+            condition |= attribute_condition(attribute, values)
+        matching = ProductAttributeValue.objects.filter(
+            condition
+        ).values('product_id').annotate(
+            matched=Count('attribute_value__attribute_id', distinct=True)
+        ).filter(matched=len(attributes)).values('product_id')
+        return queryset.filter(pk__in=matching)
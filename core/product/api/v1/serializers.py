@@ -2,8 +2,11 @@
 Serializers for Product app.
 """
 from rest_framework import serializers
+from django.db import models
 from django.urls import reverse
+from django.utils.translation import gettext_lazy as _
 
+from ...inventory import get_stocks
 from ...models import (
     Brand,
     ProductImage,
@@ -12,6 +15,13 @@ from ...models import (
     ProductType,
     Product,
 )
+from ...services import (
+    brands,
+    product_types,
+    get_or_create_brand,
+    get_or_create_product_type,
+    set_attribute_values
+)
 
 
 class BrandSerializer(serializers.ModelSerializer):
@@ -25,7 +35,7 @@ class BrandSerializer(serializers.ModelSerializer):
         model = Brand
         fields = [
             'owner', 'name', 'discount', 'description',
-            'description_snippet',
+            'description_snippet', 'is_active',
         ]
 
     def to_representation(self, instance):
@@ -53,7 +63,7 @@ class ProductTypeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ProductType
-        fields = ['owner', 'name', 'discount', 'attribute']
+        fields = ['owner', 'name', 'discount', 'attribute', 'is_active']
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
@@ -103,6 +113,17 @@ class AttributeValueSerializer(serializers.ModelSerializer):
         fields = ['attribute', 'value']
 
 
+class ProductListSerializer(serializers.ListSerializer):
+    """Reading the live stock of the listed hot products at once."""
+
+    def to_representation(self, data):
+        products = list(
+            data.all() if isinstance(data, models.Manager) else data
+        )
+        self.stocks = get_stocks([product.pk for product in products])
+        return super().to_representation(products)
+
+
 class ProductSerializer(serializers.ModelSerializer):
     """Serializing the Product model
     and some nested serializers."""
@@ -142,6 +163,7 @@ class ProductSerializer(serializers.ModelSerializer):
             'product_type', 'product_type_url', 'attribute_value',
             'images', 'absolute_url', 'uploaded_images'
         ]
+        list_serializer_class = ProductListSerializer
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
@@ -158,8 +180,37 @@ class ProductSerializer(serializers.ModelSerializer):
                 {attribute_value['attribute']: attribute_value['value']}
             )
         data.update({'specifications': attr_values})
+
+        # Stock of hot products is kept in Redis, see product/inventory.py
+        stocks = getattr(self.parent, 'stocks', None)
+        if stocks is None:
+            stocks = get_stocks([instance.pk])
+        data['stock'] = stocks.get(instance.pk, data['stock'])
         return data
 
+    def validate_attribute_value(self, value):
+        """Preventing from entering two values of an attribute."""
+        names = [attr['attribute']['name'] for attr in value]
+        if len(names) != len(set(names)):
+            raise serializers.ValidationError(
+                _('Duplicate attribute exists.')
+            )
+        return value
+
+    def validate(self, attrs):
+        """Products can't be added to archived brands or product types."""
+        errors = {}
+        for field, reference_cache in (
+            ('brand', brands), ('product_type', product_types)
+        ):
+            name = attrs.get(field, {}).get('name')
+            obj = reference_cache.get(name) if name else None
+            if obj is not None and not obj.is_active:
+                errors[field] = _('%(name)s is archived.') % {'name': name}
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
     def get_absolute_url(self, obj):
         request = self.context.get("request")
         return request.build_absolute_uri(
@@ -167,20 +218,16 @@ class ProductSerializer(serializers.ModelSerializer):
         )
 
     def _get_or_create_brand(self, brand):
-        return Brand.objects.get_or_create(name=brand)
+        return get_or_create_brand(brand)
 
     def _get_or_create_product_type(self, product_type):
-        return ProductType.objects.get_or_create(name=product_type)
+        return get_or_create_product_type(product_type)
 
     def _get_or_create_attribute_value(self, attribute_values, product_obj):
-        for attr in attribute_values:
-            attribute_obj = Attribute.objects.get_or_create(
-                name=attr['attribute']['name']
-            )
-            attribute_value_obj = AttributeValue.objects.get_or_create(
-                attribute_id=attribute_obj[0].id, value=attr['value']
-            )
-            product_obj.attribute_value.add(attribute_value_obj[0])
+        set_attribute_values(product_obj, [
+            (attr['attribute']['name'], attr['value'])
+            for attr in attribute_values
+        ])
 
     def _get_or_create_images(self, images, product_obj):
         for image in images:
@@ -201,8 +248,8 @@ class ProductSerializer(serializers.ModelSerializer):
         )
 
         product_obj = Product.objects.create(
-            brand=brand_obj[0],
-            product_type=product_type_obj[0],
+            brand=brand_obj,
+            product_type=product_type_obj,
             **validated_data
         )
 
@@ -224,27 +271,14 @@ class ProductSerializer(serializers.ModelSerializer):
             instance, validated_data
         )
         if brand_name:
-            try:
-                brand_obj = Brand.objects.get(name=brand_name)
-                instance.brand = brand_obj
-            except Brand.DoesNotExist:
-                brand_obj = self._get_or_create_brand(brand_name['name'])
-                instance.brand = brand_obj[0]
+            instance.brand = self._get_or_create_brand(brand_name['name'])
 
         if product_type_name:
-            try:
-                product_type_obj = ProductType.objects.get(
-                    name=product_type_name
-                )
-                instance.product_type = product_type_obj
-            except ProductType.DoesNotExist:
-                product_type_obj = self._get_or_create_product_type(
-                    product_type_name['name']
-                )
-                instance.product_type = product_type_obj[0]
+            instance.product_type = self._get_or_create_product_type(
+                product_type_name['name']
+            )
 
         if attribute_values:
-            instance.attribute_value.clear()
             self._get_or_create_attribute_value(attribute_values, instance)
 
         if product_images:
@@ -2,20 +2,31 @@
 Views for Product app.
 """
 from rest_framework import viewsets
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.decorators import action
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.response import Response
 from rest_framework import status
-from django.core.cache import cache
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
+from django_filters import utils
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .filters import ProductFilter
+from accounts.authentication import SafeMethodsStatelessJWTAuthentication
+from core.cache import get_or_compute
+from core.conditional import ConditionalViewSetMixin
+from .filters import (
+    ProductFilter,
+    facet_counts,
+    parse_attributes
+)
 from .pagination import DefaultPagination
 from .serializers import (
     BrandSerializer,
     ProductTypeSerializer,
     ProductSerializer
 )
+from ...inventory import stock_changed_at
 from ...models import (
     Brand,
     ProductType,
@@ -23,26 +34,59 @@ from ...models import (
 )
 
 
-class BrandApiViewSet(viewsets.ModelViewSet):
+class OwnerArchivedMixin:
+    """
+    Reading active rows only, while writes also reach the archived
+    rows of the requesting user, so owners can update and reactivate
+    them.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if self.request.method in SAFE_METHODS or not user.is_authenticated:
+            return queryset
+        return queryset.model.all_objects.filter(
+            Q(is_active=True) | Q(owner=user)
+        )
+
+
+class BrandApiViewSet(
+    OwnerArchivedMixin, ConditionalViewSetMixin, viewsets.ModelViewSet
+):
     serializer_class = BrandSerializer
+    authentication_classes = [
+        SafeMethodsStatelessJWTAuthentication, SessionAuthentication
+    ]
     pagination_class = DefaultPagination
-    queryset = Brand.objects.active()
+    queryset = Brand.objects.all()
     lookup_field = 'slug'
 
 
-class ProductTypeApiViewSet(viewsets.ModelViewSet):
+class ProductTypeApiViewSet(
+    OwnerArchivedMixin, ConditionalViewSetMixin, viewsets.ModelViewSet
+):
     serializer_class = ProductTypeSerializer
+    authentication_classes = [
+        SafeMethodsStatelessJWTAuthentication, SessionAuthentication
+    ]
     pagination_class = DefaultPagination
-    queryset = ProductType.objects.active()
+    queryset = ProductType.objects.all()
     lookup_field = 'slug'
 
 
-class ProductApiViewSet(viewsets.ModelViewSet):
+class ProductApiViewSet(ConditionalViewSetMixin, viewsets.ModelViewSet):
     serializer_class = ProductSerializer
+    authentication_classes = [
+        SafeMethodsStatelessJWTAuthentication, SessionAuthentication
+    ]
     pagination_class = DefaultPagination
     filter_backends = (DjangoFilterBackend, )
     filterset_class = ProductFilter
     lookup_field = 'sku'
+    conditional_timestamp_fields = (
+        'updated_at', 'brand__updated_at', 'product_type__updated_at'
+    )
 
     def list(self, request, *args, **kwargs):
         """
@@ -51,6 +95,7 @@ class ProductApiViewSet(viewsets.ModelViewSet):
         1-Brand-slug => icontains
         2-Product_type_slug => icontains
         3-Specific price range with min_price and max_price
+        4-Attributes => ?attr=color:red&attr=color:blue&attr=size:L
         """
         return super().list(request, *args, **kwargs)
 
@@ -58,34 +103,34 @@ class ProductApiViewSet(viewsets.ModelViewSet):
         """
         Retrieve a specific product with assigned
         sku and increasing views after each request.
+        Views are counted with a single UPDATE which doesn't
+        touch updated_at, so the ETag stays the same.
         """
         obj = get_object_or_404(self.get_queryset(), sku=sku)
+        Product.all_objects.filter(pk=obj.pk).increase_views()
         obj.views += 1
-        obj.save()
-        serializer = self.serializer_class(
-            obj, many=False, context={'request': request}
-        )
-        return Response(serializer.data)
+        return self.conditional_object_response(obj)
+
+    def get_extra_timestamps(self):
+        # Stock of hot products is sold in Redis
+        return [stock_changed_at()]
 
     def get_queryset(self):
         """Returning queryset based on cached data."""
-        queryset = cache.get('product_objects')
-        if queryset is None:
-            queryset = Product.objects.filter(
-                is_active=True
-            ).select_related(
-                'brand'
-            ).select_related(
-                'product_type'
-            ).prefetch_related(
-                'attribute_value'
-            ).prefetch_related(
-                'images'
-            ).prefetch_related(
-                'attribute_value__attribute'
-            )
-            cache.set('product_objects', queryset)
-        return queryset
+        return get_or_compute('product_objects', self._product_queryset)
+
+    def _product_queryset(self):
+        return Product.objects.select_related(
+            'brand'
+        ).select_related(
+            'product_type'
+        ).prefetch_related(
+            'attribute_value'
+        ).prefetch_related(
+            'images'
+        ).prefetch_related(
+            'attribute_value__attribute'
+        )
 
     @action(
         methods=['GET'],
@@ -161,3 +206,33 @@ class ProductApiViewSet(viewsets.ModelViewSet):
             queryset, many=True, context={'request': request}
         )
         return Response(serializer.data)
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        url_path=r'facets'
+    )
+    def facets(self, request, *args, **kwargs):
+        """
+        Return number of products per attribute value for the filtered
+        products (same filters as the list), in one grouped query.
+        The values of an attribute are counted without its own `attr`
+        filters, so they stay selectable alongside the chosen ones.
+        """
+        params = request.query_params.copy()
+        attributes = parse_attributes(params.pop('attr', []))
+        filterset = self.filterset_class(
+            params, queryset=self.get_queryset(), request=request
+        )
+        if not filterset.is_valid():
+            raise utils.translate_validation(filterset.errors)
+        counts = facet_counts(filterset.qs, attributes)
+        facets = {}
+        for row in counts:
+            facets.setdefault(
+                row['attribute_value__attribute__name'], []
+            ).append({
+                'value': row['attribute_value__value'],
+                'count': row['count']
+            })
+        return Response(facets, status=status.HTTP_200_OK)
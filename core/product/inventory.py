@@ -0,0 +1,404 @@
+"""
+Stock of hot products (flash sales) kept in Redis.
+
+Every hot product has a hash with its available `stock` and the
+`delta` which isn't written to Product.stock yet. Reservations change
+both with one Lua script, so the product row isn't touched on every
+order, and `sync_inventory` writes the deltas behind to the database.
+
+`stock - delta` is what Redis believes the database holds. When it
+doesn't match (stock changed in the admin) the hash is rebased on the
+database value. Products which aren't hot are reserved in the database.
+Product.is_hot marks the products warmed in Redis, they can't be
+reserved while Redis is down since Product.stock lacks their delta.
+"""
+import logging
+import time
+from datetime import (
+    datetime,
+    timezone
+)
+
+from django.db import (
+    IntegrityError,
+    transaction
+)
+from redis.exceptions import RedisError
+
+from core.redis import (
+    LuaScript,
+    cache_pipeline,
+    get_connection
+)
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+HOT_KEY = 'inventory:hot'
+CHANGED_KEY = 'inventory:changed_at'
+SYNC_LOCK_KEY = 'inventory:sync:lock'
+SYNC_LOCK_TIMEOUT = 60
+
+# Increments are negated as 0 - n, -n of 0 is -0 which HINCRBY refuses.
+# The scripts changing the stock of a hot product set CHANGED_KEY (the
+# last key) to the time (the last argument), it's a part of the HTTP
+# validators of the products.
+
+# KEYS: inventory hashes, changed. ARGV: quantities, time.
+# Return {0, indexes of the products which aren't hot} after reserving
+# the hot ones, or {index} of the first product which is out of stock.
+RESERVE_SCRIPT = LuaScript("""
+local hot = {}
+local cold = {}
+for i = 1, #KEYS - 1 do
+    local stock = redis.call('HGET', KEYS[i], 'stock')
+    if stock then
+        if tonumber(stock) < tonumber(ARGV[i]) then
+            return {i}
+        end
+        hot[i] = true
+    else
+        table.insert(cold, i)
+    end
+end
+for i = 1, #KEYS - 1 do
+    if hot[i] then
+        redis.call('HINCRBY', KEYS[i], 'stock', 0 - tonumber(ARGV[i]))
+        redis.call('HINCRBY', KEYS[i], 'delta', 0 - tonumber(ARGV[i]))
+    end
+end
+if #cold < #KEYS - 1 then
+    redis.call('SET', KEYS[#KEYS], ARGV[#ARGV])
+end
+return {0, unpack(cold)}
+""")
+
+# KEYS: inventory hashes, changed. ARGV: quantities, time.
+# Return indexes of the products which aren't hot.
+RELEASE_SCRIPT = LuaScript("""
+local cold = {}
+for i = 1, #KEYS - 1 do
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        redis.call('HINCRBY', KEYS[i], 'stock', ARGV[i])
+        redis.call('HINCRBY', KEYS[i], 'delta', ARGV[i])
+    else
+        table.insert(cold, i)
+    end
+end
+if #cold < #KEYS - 1 then
+    redis.call('SET', KEYS[#KEYS], ARGV[#ARGV])
+end
+return cold
+""")
+
+# KEYS: inventory hash, hot set, changed. ARGV: product id, database
+# stock, time.
+WARM_SCRIPT = LuaScript("""
+redis.call('HSETNX', KEYS[1], 'stock', ARGV[2])
+redis.call('HSETNX', KEYS[1], 'delta', 0)
+redis.call('SADD', KEYS[2], ARGV[1])
+redis.call('SET', KEYS[3], ARGV[3])
+return 1
+""")
+
+# KEYS: inventory hash, changed. ARGV: written delta, database stock
+# after it, time.
+# Return the drift which was found and fixed.
+SETTLE_SCRIPT = LuaScript("""
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local delta = redis.call('HINCRBY', KEYS[1], 'delta', 0 - tonumber(ARGV[1]))
+local stock = tonumber(redis.call('HGET', KEYS[1], 'stock'))
+local drift = stock - delta - tonumber(ARGV[2])
+if drift ~= 0 then
+    redis.call('HSET', KEYS[1], 'stock', tonumber(ARGV[2]) + delta)
+    redis.call('SET', KEYS[2], ARGV[3])
+end
+return drift
+""")
+
+# KEYS: inventory hash, hot set, changed. ARGV: product id, time.
+# Removing the hash if nothing is left to write behind.
+COOL_SCRIPT = LuaScript("""
+local delta = tonumber(redis.call('HGET', KEYS[1], 'delta') or 0)
+if delta ~= 0 then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('SREM', KEYS[2], ARGV[1])
+redis.call('SET', KEYS[3], ARGV[2])
+return 1
+""")
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_id):
+        self.product_id = product_id
+        super().__init__(f'Product {product_id} is out of stock.')
+
+
+class InventoryUnavailable(Exception):
+    """The stock of a hot product can't be reserved while Redis is down."""
+
+    def __init__(self, product_id):
+        self.product_id = product_id
+        super().__init__(f'Inventory of product {product_id} is unavailable.')
+
+
+def inventory_key(product_id):
+    return f'inventory:{product_id}'
+
+
+def _reserve_in_db(quantities):
+    with transaction.atomic():
+        for product_id in sorted(quantities):
+            if not Product.all_objects.filter(pk=product_id).reserve_stock(
+                quantities[product_id]
+            ):
+                raise OutOfStock(product_id)
+
+
+def _release_in_db(quantities):
+    for product_id in sorted(quantities):
+        Product.all_objects.filter(pk=product_id).release_stock(
+            quantities[product_id]
+        )
+
+
+def reserve_stock(quantities):
+    """
+    Reserving {product_id: quantity}, hot products in Redis and the
+    others with conditional UPDATEs of the product rows. Raise
+    OutOfStock if any of them isn't available, or InventoryUnavailable
+    for hot products while Redis is down, nothing is reserved then.
+
+    Return the quantities reserved in Redis, the caller has to give
+    them back with cancel_reservation if its transaction rolls back.
+    """
+    product_ids = sorted(quantities)
+    try:
+        result = RESERVE_SCRIPT(
+            keys=[
+                *[inventory_key(product_id) for product_id in product_ids],
+                CHANGED_KEY
+            ],
+            args=[
+                *[quantities[product_id] for product_id in product_ids],
+                time.time()
+            ]
+        )
+    except RedisError as e:
+        logger.warning(
+            "Check the Redis connection...The error %s has occurred.", e
+        )
+        hot_id = Product.all_objects.filter(
+            pk__in=product_ids, is_hot=True
+        ).values_list('pk', flat=True).first()
+        if hot_id is not None:
+            raise InventoryUnavailable(hot_id)
+        _reserve_in_db(quantities)
+        return {}
+
+    if result[0]:
+        raise OutOfStock(product_ids[result[0] - 1])
+    cold = {product_ids[index - 1] for index in result[1:]}
+    hot = {
+        product_id: quantity for product_id, quantity in quantities.items()
+        if product_id not in cold
+    }
+    try:
+        _reserve_in_db({
+            product_id: quantities[product_id] for product_id in cold
+        })
+    except BaseException:
+        cancel_reservation(hot)
+        raise
+    return hot
+
+
+def cancel_reservation(hot_quantities):
+    """Giving back quantities which were reserved in Redis."""
+    if hot_quantities:
+        release_stock(hot_quantities, on_commit=False)
+
+
+def release_stock(quantities, on_commit=True):
+    """
+    Returning reserved {product_id: quantity}. Products which aren't hot
+    are released in the current transaction and hot ones after it's
+    committed, since Redis can't be rolled back.
+    """
+    product_ids = sorted(quantities)
+    try:
+        hot_ids = get_connection().smismember(HOT_KEY, product_ids)
+    except RedisError:
+        hot_ids = [False] * len(product_ids)
+    hot = {
+        product_id: quantities[product_id]
+        for product_id, is_hot in zip(product_ids, hot_ids) if is_hot
+    }
+    _release_in_db({
+        product_id: quantity for product_id, quantity in quantities.items()
+        if product_id not in hot
+    })
+    if not hot:
+        return
+
+    def release_hot():
+        product_ids = sorted(hot)
+        try:
+            cold = RELEASE_SCRIPT(
+                keys=[
+                    *[inventory_key(product_id) for product_id in product_ids],
+                    CHANGED_KEY
+                ],
+                args=[
+                    *[hot[product_id] for product_id in product_ids],
+                    time.time()
+                ]
+            )
+        except RedisError as e:
+            logger.warning(
+                "Check the Redis connection...The error %s has occurred.", e
+            )
+            cold = range(1, len(product_ids) + 1)
+        # Cooled down in the meantime (or Redis is down)
+        _release_in_db({
+            product_ids[index - 1]: hot[product_ids[index - 1]]
+            for index in cold
+        })
+
+    if on_commit:
+        transaction.on_commit(release_hot)
+    else:
+        release_hot()
+
+
+def warm(product_ids):
+    """Moving stock of the products to Redis."""
+    # Marked first, a product in Redis is never reserved in the database
+    Product.all_objects.filter(pk__in=product_ids).update_untracked(
+        is_hot=True
+    )
+    stocks = Product.all_objects.filter(
+        pk__in=product_ids
+    ).values_list('pk', 'stock')
+    with cache_pipeline() as pipeline:
+        for product_id, stock in stocks:
+            WARM_SCRIPT(
+                keys=[inventory_key(product_id), HOT_KEY, CHANGED_KEY],
+                args=[product_id, stock, time.time()],
+                client=pipeline
+            )
+
+
+def stock_changed_at():
+    """
+    Return when the stock of a hot product last changed in Redis,
+    None if it never did or while Redis is down.
+    """
+    try:
+        changed_at = get_connection().get(CHANGED_KEY)
+    except RedisError as e:
+        logger.warning(
+            "Check the Redis connection...The error %s has occurred.", e
+        )
+        return None
+    if changed_at is None:
+        return None
+    return datetime.fromtimestamp(float(changed_at), tz=timezone.utc)
+
+
+def get_stocks(product_ids):
+    """
+    Return {product_id: available stock} of the hot products among the
+    ids, read with one round trip. Empty while Redis is down, callers
+    fall back to Product.stock.
+    """
+    product_ids = list(product_ids)
+    try:
+        pipeline = get_connection().pipeline(transaction=False)
+        for product_id in product_ids:
+            pipeline.hget(inventory_key(product_id), 'stock')
+        stocks = pipeline.execute()
+    except RedisError as e:
+        logger.warning(
+            "Check the Redis connection...The error %s has occurred.", e
+        )
+        return {}
+    return {
+        product_id: int(stock)
+        for product_id, stock in zip(product_ids, stocks)
+        if stock is not None
+    }
+
+
+def sync_product(product_id):
+    """
+    Writing the pending delta of a hot product behind to the database
+    and rebasing Redis if it drifted. Return the drift.
+    """
+    connection = get_connection()
+    key = inventory_key(product_id)
+    delta = int(connection.hget(key, 'delta') or 0)
+    try:
+        with transaction.atomic():
+            if delta:
+                Product.all_objects.filter(pk=product_id).release_stock(delta)
+            stock = Product.all_objects.filter(
+                pk=product_id
+            ).values_list('stock', flat=True).first()
+    except IntegrityError:
+        # The stock was lowered (in the admin) below what Redis sold
+        logger.error(
+            'Product %s is oversold, its delta %s would make the stock '
+            'negative.', product_id, delta
+        )
+        return 0
+    if stock is None:
+        connection.delete(key)
+        connection.srem(HOT_KEY, product_id)
+        return 0
+    drift = SETTLE_SCRIPT(
+        keys=[key, CHANGED_KEY], args=[delta, stock, time.time()]
+    )
+    if drift:
+        logger.warning(
+            'Inventory of product %s drifted by %s, rebased on the '
+            'database.', product_id, drift
+        )
+    return drift
+
+
+def sync():
+    """
+    Syncing every hot product, one syncer runs at a time.
+    Return {product_id: drift} of the synced products.
+    """
+    connection = get_connection()
+    if not connection.set(SYNC_LOCK_KEY, 1, nx=True, ex=SYNC_LOCK_TIMEOUT):
+        return {}
+    try:
+        return {
+            int(product_id): sync_product(int(product_id))
+            for product_id in connection.smembers(HOT_KEY)
+        }
+    finally:
+        connection.delete(SYNC_LOCK_KEY)
+
+
+def cool(product_ids):
+    """Moving stock of the products back to the database only."""
+    for product_id in product_ids:
+        sync_product(product_id)
+        if COOL_SCRIPT(
+            keys=[inventory_key(product_id), HOT_KEY, CHANGED_KEY],
+            args=[product_id, time.time()]
+        ):
+            Product.all_objects.filter(pk=product_id).update_untracked(
+                is_hot=False
+            )
+        else:
+            # Reserved meanwhile, written behind by the next sync
+            logger.info('Product %s is still hot.', product_id)
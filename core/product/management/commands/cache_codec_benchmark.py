@@ -0,0 +1,98 @@
+"""
+Django command to benchmark the cache codecs with product pages.
+"""
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from redis.connection import Connection
+from redis.exceptions import ResponseError
+
+from core.codecs import (
+    COMPRESSORS,
+    MAGIC,
+    SERIALIZERS,
+    Codec,
+    decode
+)
+from core.redis import get_connection
+from ...api.v1.views import ProductApiViewSet
+
+
+class Command(BaseCommand):
+    """
+    Encoding a product list page (the response data) and the cached
+    product queryset with every serializer and compressor, and showing
+    the stored bytes, encode/decode times and the bytes sent to and
+    received from Redis by a SET and a GET. Products of the database
+    are used, create some with `fake_products` first.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--threshold', type=int, default=1024)
+        parser.add_argument('--page-size', type=int, default=20)
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get(
+            '/product/api/v1/product/', {'page_size': options['page_size']}
+        )
+        view = ProductApiViewSet.as_view({'get': 'list'})
+        values = {
+            'product page': view(request).data,
+            'product queryset': list(
+                ProductApiViewSet()._product_queryset()[
+                    :options['page_size']
+                ]
+            ),
+        }
+        for label, value in values.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            for serializer in SERIALIZERS:
+                for compressor in COMPRESSORS:
+                    codec = Codec(
+                        serializer, compressor, options['threshold']
+                    )
+                    self.stdout.write(
+                        f'  {serializer}/{compressor}: '
+                        + self.measure(codec, value, options['iterations'])
+                    )
+
+    def measure(self, codec, value, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            data = codec.encode(value)
+        encode_time = (time.perf_counter() - started) / iterations
+        started = time.perf_counter()
+        for _ in range(iterations):
+            decode(data)
+        decode_time = (time.perf_counter() - started) / iterations
+        serializer_id = data[len(MAGIC) + 1]
+        fallback = (
+            ' (pickled)'
+            if serializer_id != SERIALIZERS[codec.serializer][0] else ''
+        )
+        return (
+            f'{len(data)} bytes{fallback}, encode {encode_time * 1e6:.0f}us,'
+            f' decode {decode_time * 1e6:.0f}us, '
+            f'{self.network_bytes(data)}'
+        )
+
+    def network_bytes(self, data):
+        """
+        RESP bytes of a SET to Redis and of the reply to a GET,
+        and the memory Redis uses for the key.
+        """
+        key = f'cache_codec_benchmark:{uuid.uuid4().hex}'
+        sent = sum(map(len, Connection().pack_command('SET', key, data)))
+        received = len(f'${len(data)}\r\n'.encode()) + len(data) + 2
+        connection = get_connection()
+        try:
+            connection.set(key, data, ex=60)
+            memory = f'{connection.memory_usage(key)} bytes'
+        except ResponseError:
+            memory = 'not reported'
+        finally:
+            connection.delete(key)
+        return f'SET {sent}B, GET reply {received}B, redis memory {memory}'
@@ -0,0 +1,110 @@
+"""
+Django command to benchmark cached queryset fills under invalidations.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.cache import (
+    get_or_compute,
+    invalidate
+)
+from ...models import Product
+
+KEY = 'cache_stampede_benchmark'
+
+
+def product_queryset():
+    """The cached queryset of the product list."""
+    return Product.objects.select_related(
+        'brand', 'product_type'
+    ).prefetch_related(
+        'attribute_value__attribute', 'images'
+    )
+
+
+def plain_fill():
+    """The former get, compute and set of the viewsets."""
+    queryset = cache.get(KEY)
+    if queryset is None:
+        queryset = product_queryset()
+        cache.set(KEY, queryset)
+    return queryset
+
+
+class Command(BaseCommand):
+    """
+    Reading the cached product list from `--clients` threads while the
+    key is invalidated every `--interval` seconds, first with plain
+    get/set and delete, then with get_or_compute and invalidate, and
+    counting the database queries of both. Products of the database
+    are used, create some with `fake_products` first.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=50)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--interval', type=float, default=0.5)
+
+    def handle(self, *args, **options):
+        modes = (
+            ('plain', plain_fill, lambda: cache.delete(KEY)),
+            (
+                'get_or_compute',
+                lambda: get_or_compute(KEY, product_queryset),
+                lambda: invalidate(KEY)
+            ),
+        )
+        for label, fill, invalidate_key in modes:
+            cache.delete_many([KEY, f'{KEY}:invalidated_at'])
+            reads, queries, invalidations = self.run(
+                fill, invalidate_key, options
+            )
+            seconds = options['seconds']
+            self.stdout.write(
+                f'{label}: {reads} reads, {invalidations} invalidations, '
+                f'{queries} queries ({queries / seconds:.1f} queries/s, '
+                f'{queries / max(invalidations, 1):.1f} per invalidation).'
+            )
+
+    def run(self, fill, invalidate_key, options):
+        reads = []
+        queries = []
+        stop = threading.Event()
+
+        def client():
+            count = [0, 0]
+
+            def count_query(execute, *args):
+                count[1] += 1
+                return execute(*args)
+
+            try:
+                with connection.execute_wrapper(count_query):
+                    while not stop.is_set():
+                        fill()
+                        count[0] += 1
+            finally:
+                reads.append(count[0])
+                queries.append(count[1])
+                connection.close()
+
+        workers = [
+            threading.Thread(target=client)
+            for _ in range(options['clients'])
+        ]
+        for worker in workers:
+            worker.start()
+        invalidations = 0
+        deadline = time.monotonic() + options['seconds']
+        while time.monotonic() < deadline:
+            time.sleep(options['interval'])
+            invalidate_key()
+            invalidations += 1
+        stop.set()
+        for worker in workers:
+            worker.join()
+        return sum(reads), sum(queries), invalidations
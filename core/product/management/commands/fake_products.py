@@ -3,19 +3,16 @@ Custom command for creating fake products with Faker module.
 """
 from django.core.management.base import BaseCommand
 from django.db import IntegrityError
-from django.contrib.auth import get_user_model
 from faker import Faker
 
+from accounts.services import bulk_provision_users
 from ...models import (
     Product,
     ProductImage,
     Brand,
-    ProductType,
-    Attribute,
-    AttributeValue
+    ProductType
 )
-
-User = get_user_model()
+from ...services import set_attribute_values
 
 
 class Command(BaseCommand):
@@ -28,15 +25,23 @@ class Command(BaseCommand):
         self.fake = Faker()
 
     def handle(self, *args, **options):
+        phone_numbers = {
+            str(self.fake.pyint(min_value=11111111111, max_value=99999999999))
+            for _ in range(50)
+        }
+        # Phone numbers which are already taken are skipped
+        users = bulk_provision_users([
+            dict(
+                phone_number=phone_number,
+                password='M13431344',
+                is_staff=True,
+                is_superuser=True,
+                is_verified=True
+            ) for phone_number in phone_numbers
+        ], skip_duplicates=True)
 
-        for _ in range(50):
+        for user in users:
             try:
-                user = User.objects.create_superuser(
-                    phone_number=self.fake.pyint(
-                        min_value=11111111111, max_value=99999999999
-                    ),
-                    password='M13431344'
-                )
                 brand_name = self.fake.first_name()
                 brand_obj = Brand.objects.create(
                     owner=user,
@@ -49,22 +54,6 @@ class Command(BaseCommand):
                     name=product_type_name
                 )
 
-                attribute_one = Attribute.objects.create(
-                    name=self.fake.first_name()
-                )
-                attr_value_one = AttributeValue.objects.create(
-                    attribute=attribute_one,
-                    value=self.fake.color_name()
-                )
-
-                attribute_two = Attribute.objects.create(
-                    name=self.fake.first_name()
-                )
-                attr_value_two = AttributeValue.objects.create(
-                    attribute=attribute_two,
-                    value=self.fake.color_name()
-                )
-
                 sample_product = Product.objects.create(
                     owner=user,
                     name=self.fake.first_name(),
@@ -78,9 +67,10 @@ class Command(BaseCommand):
                     product_type=product_type_obj,
                 )
 
-                sample_product.attribute_value.add(
-                    attr_value_one, attr_value_two
-                )
+                set_attribute_values(sample_product, [
+                    (self.fake.first_name(), self.fake.color_name()),
+                    (self.fake.last_name(), self.fake.color_name())
+                ])
 
                 ProductImage.objects.create(
                     product=sample_product,
@@ -0,0 +1,155 @@
+"""
+Django command to benchmark the product endpoints while Redis fails.
+"""
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError
+)
+from django.test import override_settings
+from redis.exceptions import (
+    ConnectionError,
+    TimeoutError
+)
+from rest_framework.test import APIClient
+
+from core.redis import get_connection
+from core.resilience import (
+    BreakerConnectionMixin,
+    redis_breaker
+)
+from ...models import Product
+
+
+class FaultConnectionMixin:
+    """Redis connection failing like the network of the current phase."""
+    fault = None
+
+    def connect(self):
+        if self.fault == 'down':
+            raise ConnectionError('Connection refused (injected).')
+        return super().connect()
+
+    def send_command(self, *args, **kwargs):
+        if self.fault == 'slow':
+            # Redis answers later than the socket timeout
+            time.sleep(settings.REDIS_SOCKET_TIMEOUT)
+            raise TimeoutError('Timeout reading from socket (injected).')
+        if self.fault == 'down':
+            raise ConnectionError('Connection reset by peer (injected).')
+        return super().send_command(*args, **kwargs)
+
+
+@contextmanager
+def inject_faults():
+    """
+    Making every Redis connection of this process (the open ones and
+    the blocking pools too) fail like FaultConnectionMixin, yields the
+    class whose `fault` sets the current fault. Restores the connection
+    class and the Redis breaker on exit.
+    """
+    connection_class = get_connection().connection_pool.connection_class
+    bases = connection_class.__bases__
+    base = [
+        cls for cls in bases if not issubclass(cls, BreakerConnectionMixin)
+    ][0]
+    fault_class = type(
+        f'Fault{base.__name__}', (FaultConnectionMixin, base), {}
+    )
+    connection_class.__bases__ = tuple(
+        fault_class if cls is base else cls for cls in bases
+    )
+    threshold = redis_breaker.failure_threshold
+    try:
+        yield fault_class
+    finally:
+        connection_class.__bases__ = bases
+        set_fault(fault_class, None)
+        redis_breaker.failure_threshold = threshold
+
+
+def set_fault(fault_class, fault):
+    """Starting a phase of the fault with new cache connections."""
+    fault_class.fault = fault
+    pool = get_connection().connection_pool
+    pool.disconnect()
+    pool.reset()
+    redis_breaker.record_success()
+
+
+class Command(BaseCommand):
+    """
+    Requesting the product list and a product page while Redis is
+    healthy, slow (every command times out) and down (connections are
+    refused), and showing the p50/p99 latencies of each phase. With
+    `--without-breaker` the faulty phases are repeated with the circuit
+    breaker disabled, these are slow. Faults are injected into the
+    connections of the cache pool of this process. Fails when the p99
+    of a phase with the breaker on is above `--max-p99` milliseconds.
+    Products of the database are used, create some with
+    `fake_products` first.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--max-p99', type=float, default=250)
+        parser.add_argument('--without-breaker', action='store_true')
+
+    def handle(self, *args, **options):
+        sku = Product.objects.values_list('sku', flat=True).first()
+        if sku is None:
+            raise CommandError(
+                'There is no active product, run fake_products first.'
+            )
+        urls = ('/product/api/v1/product/', f'/product/api/v1/product/{sku}/')
+
+        failed = []
+        with inject_faults() as fault_class, override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+        ):
+            threshold = redis_breaker.failure_threshold
+            client = APIClient()
+            for fault in (None, 'slow', 'down'):
+                for breaker in (True, False):
+                    if not breaker and (
+                        fault is None or not options['without_breaker']
+                    ):
+                        continue
+                    set_fault(fault_class, fault)
+                    redis_breaker.failure_threshold = (
+                        threshold if breaker else float('inf')
+                    )
+                    p50, p99 = self.run(client, urls, options['requests'])
+                    label = (
+                        f'{fault or "healthy"}, breaker '
+                        f'{"on" if breaker else "off"}'
+                    )
+                    self.stdout.write(
+                        f'{label}: p50 {p50:.1f}ms, p99 {p99:.1f}ms, '
+                        f'breaker {redis_breaker.state}.'
+                    )
+                    if breaker and p99 > options['max_p99']:
+                        failed.append(label)
+
+        if failed:
+            raise CommandError(
+                f'p99 above {options["max_p99"]}ms: {", ".join(failed)}.'
+            )
+
+    def run(self, client, urls, requests):
+        timings = []
+        for index in range(requests):
+            started = time.perf_counter()
+            response = client.get(urls[index % len(urls)])
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(
+                    f'{urls[index % len(urls)]} answered '
+                    f'{response.status_code}.'
+                )
+        percentiles = statistics.quantiles(timings, n=100)
+        return percentiles[49], percentiles[98]
@@ -0,0 +1,79 @@
+"""
+Django command to benchmark stock reservations of one product.
+"""
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from ... import inventory
+from ...models import (
+    Brand,
+    Product,
+    ProductType
+)
+
+
+class Command(BaseCommand):
+    """
+    Reserving one product from `--threads` threads until it's sold
+    out, with the database path and then with the Redis path, and
+    checking that the stock isn't oversold. Run it against a database
+    and a Redis which can be filled with test data.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stock', type=int, default=5000)
+        parser.add_argument('--threads', type=int, default=50)
+
+    def handle(self, *args, **options):
+        run = uuid.uuid4().hex[:8]
+        brand = Brand.objects.create(name=f'inventory-{run}')
+        product_type = ProductType.objects.create(name=f'inventory-{run}')
+        for hot in (False, True):
+            product = Product.objects.create(
+                name=f'inventory-{run}-{hot}', price=Decimal('10'),
+                stock=options['stock'], brand=brand,
+                product_type=product_type
+            )
+            if hot:
+                inventory.warm([product.pk])
+            sold, elapsed = self.run(product.pk, options['threads'])
+            if hot:
+                inventory.cool([product.pk])
+            product.refresh_from_db()
+            label = 'redis' if hot else 'database'
+            self.stdout.write(
+                f'{label}: {sold} reserved in {elapsed:.2f}s '
+                f'({sold / elapsed:.0f} reservations/s), '
+                f'{product.stock} left in the database.'
+            )
+            if sold != options['stock'] or product.stock != 0:
+                self.stdout.write(self.style.ERROR('Stock mismatch.'))
+
+    def run(self, product_id, threads):
+        sold = []
+
+        def reserve():
+            count = 0
+            try:
+                while True:
+                    try:
+                        inventory.reserve_stock({product_id: 1})
+                    except inventory.OutOfStock:
+                        break
+                    count += 1
+            finally:
+                sold.append(count)
+                connection.close()
+
+        workers = [threading.Thread(target=reserve) for _ in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return sum(sold), time.perf_counter() - started
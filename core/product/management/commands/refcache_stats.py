@@ -0,0 +1,31 @@
+"""
+Django command to show the hit rates of the reference data caches.
+"""
+from django.core.management.base import BaseCommand
+
+from core.refcache import registry
+from ... import services  # noqa: F401 (registering the caches)
+
+
+class Command(BaseCommand):
+    """
+    Showing the local, Redis and database (miss) lookups of every
+    reference cache, summed over all workers.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Reset the counters after showing them.'
+        )
+
+    def handle(self, *args, **options):
+        for name, reference_cache in sorted(registry.items()):
+            stats = reference_cache.stats()
+            hit_rate = stats.pop('hit_rate')
+            self.stdout.write(
+                f'{name}: {stats}, hit rate: '
+                f'{"-" if hit_rate is None else f"{hit_rate:.1%}"}'
+            )
+            if options['reset']:
+                reference_cache.reset_stats()
@@ -0,0 +1,41 @@
+"""
+Django command to write the Redis inventory behind to the database.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from ... import inventory
+
+
+class Command(BaseCommand):
+    """
+    Syncing the stock of hot products once or every `--interval`
+    seconds, products are made hot or cold with `--warm`/`--cool`.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--warm', type=int, nargs='+', default=[])
+        parser.add_argument('--cool', type=int, nargs='+', default=[])
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Keep syncing every interval seconds.'
+        )
+
+    def handle(self, *args, **options):
+        if options['warm']:
+            inventory.warm(options['warm'])
+        if options['cool']:
+            inventory.cool(options['cool'])
+        while True:
+            drifts = inventory.sync()
+            drifted = {
+                product_id: drift
+                for product_id, drift in drifts.items() if drift
+            }
+            self.stdout.write(
+                f'{len(drifts)} hot products synced, drifted: {drifted}'
+            )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -1,33 +1,86 @@
 """
 Managers and custom query set for product app.
 """
-from django.utils import timezone
-from django.db import models
-from django.core.cache import cache
 from django.db.models import (
-    QuerySet,
+    F,
     Manager
 )
 
+from core.managers import (
+    CacheInvalidatingManager,
+    CacheInvalidatingQuerySet
+)
+
 
-class Active(models.QuerySet):
-    """Queryset for filtering verified
-    users in Profile and Address models."""
+class Active(CacheInvalidatingQuerySet):
+    """
+    Queryset of brands and product types, they're shown
+    within the cached products.
+    """
+    cache_keys = ('product_objects',)
 
     def active(self):
         queryset = self.filter(is_active=True)
         return queryset
 
 
-class CustomQuerySet(QuerySet):
-    """Overriding update method for cleaning cached data."""
-    def update(self, **kwargs):
-        cache.delete('product_objects')
-        super(CustomQuerySet, self).update(
-            updated=timezone.now(), **kwargs
+class ActiveManager(CacheInvalidatingManager.from_queryset(Active)):
+    """Manager of the active rows only."""
+
+    def get_queryset(self):
+        return super().get_queryset().active()
+
+
+class CustomQuerySet(CacheInvalidatingQuerySet):
+    """Products queryset, writes invalidate the cached products."""
+    cache_keys = ('product_objects',)
+
+    def visible(self):
+        """Active products of an active brand and product type."""
+        return self.filter(
+            is_active=True,
+            brand__is_active=True,
+            product_type__is_active=True
         )
 
+    def increase_views(self):
+        """
+        Increasing views counter without stamping updated_at
+        or cleaning cached data, views are just a counter.
+        """
+        return self.update_untracked(views=F('views') + 1)
+
+    def reserve_stock(self, quantity):
+        """
+        Decrementing stock only if enough of it is left, with one
+        conditional UPDATE instead of reading and writing it back.
+        Stock is shown, so the UPDATE stamps updated_at and
+        invalidates the cached products.
+        Return the number of reserved rows, 0 means out of stock.
+        """
+        queryset = self.filter(stock__gte=quantity)
+        return queryset.update(stock=F('stock') - quantity)
+
+    def release_stock(self, quantity):
+        """Returning reserved stock."""
+        return self.update(stock=F('stock') + quantity)
+
+
+class CustomManager(CacheInvalidatingManager.from_queryset(CustomQuerySet)):
+    """Manager exposing the CustomQuerySet methods."""
+
+
+class VisibleManager(CustomManager):
+    """Manager of the products shown to customers only."""
+
+    def get_queryset(self):
+        return super().get_queryset().visible()
+
 
-class CustomManager(Manager):
+class AttributeValueManager(Manager):
+    """
+    Loading the attribute with the values, they're always shown
+    together (also through product.attribute_value).
+    """
     def get_queryset(self):
-        return CustomQuerySet(self.model, using=self._db)
+        return super().get_queryset().select_related('attribute')
@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-19 11:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0001_initial'),
+    ]
+
+    operations = [
+        # Creating the composite index before dropping the FK index
+        migrations.AddIndex(
+            model_name='productattributevalue',
+            index=models.Index(fields=['attribute_value', 'product'], name='product_pro_attribu_3f205f_idx'),
+        ),
+        migrations.AlterField(
+            model_name='productattributevalue',
+            name='attribute_value',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='attr_value_product_attribute_value', to='product.attributevalue'),
+        ),
+    ]
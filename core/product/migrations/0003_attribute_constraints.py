@@ -0,0 +1,148 @@
+# Generated by Django 4.2 on 2026-10-19 11:46
+
+from django.db import migrations, models
+from django.db.models import (
+    Count,
+    Min,
+    OuterRef,
+    Subquery
+)
+import django.db.models.deletion
+
+
+def check_constraints(schema_editor):
+    """
+    Checking the deferred foreign keys now, PostgreSQL doesn't
+    alter tables with pending trigger events in the transaction.
+    """
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Merging attributes with the same name and values with the same
+    attribute and value into the oldest row, before adding constraints.
+    """
+    Attribute = apps.get_model('product', 'Attribute')
+    AttributeValue = apps.get_model('product', 'AttributeValue')
+    ProductTypeAttribute = apps.get_model('product', 'ProductTypeAttribute')
+    ProductAttributeValue = apps.get_model('product', 'ProductAttributeValue')
+
+    duplicates = Attribute.objects.values('name').annotate(
+        keep=Min('id'), count=Count('id')
+    ).filter(count__gt=1)
+    for duplicate in duplicates:
+        others = Attribute.objects.filter(
+            name=duplicate['name']
+        ).exclude(id=duplicate['keep'])
+        AttributeValue.objects.filter(attribute__in=others).update(
+            attribute_id=duplicate['keep']
+        )
+        for link in ProductTypeAttribute.objects.filter(attribute__in=others):
+            if ProductTypeAttribute.objects.filter(
+                product_type_id=link.product_type_id,
+                attribute_id=duplicate['keep']
+            ).exists():
+                link.delete()
+            else:
+                link.attribute_id = duplicate['keep']
+                link.save(update_fields=['attribute'])
+        others.delete()
+
+    duplicates = AttributeValue.objects.values('attribute', 'value').annotate(
+        keep=Min('id'), count=Count('id')
+    ).filter(count__gt=1)
+    for duplicate in duplicates:
+        others = AttributeValue.objects.filter(
+            attribute_id=duplicate['attribute'], value=duplicate['value']
+        ).exclude(id=duplicate['keep'])
+        for link in ProductAttributeValue.objects.filter(
+            attribute_value__in=others
+        ):
+            if ProductAttributeValue.objects.filter(
+                product_id=link.product_id,
+                attribute_value_id=duplicate['keep']
+            ).exists():
+                link.delete()
+            else:
+                link.attribute_value_id = duplicate['keep']
+                link.save(update_fields=['attribute_value'])
+        others.delete()
+    check_constraints(schema_editor)
+
+
+def fill_attribute(apps, schema_editor):
+    """
+    Copying the attribute of the values to the link table and keeping
+    the oldest value when a product has more than one for an attribute.
+    """
+    AttributeValue = apps.get_model('product', 'AttributeValue')
+    ProductAttributeValue = apps.get_model('product', 'ProductAttributeValue')
+
+    ProductAttributeValue.objects.update(
+        attribute_id=Subquery(
+            AttributeValue.objects.filter(
+                id=OuterRef('attribute_value_id')
+            ).values('attribute_id')[:1]
+        )
+    )
+    duplicates = ProductAttributeValue.objects.values(
+        'product', 'attribute'
+    ).annotate(keep=Min('id'), count=Count('id')).filter(count__gt=1)
+    for duplicate in duplicates:
+        ProductAttributeValue.objects.filter(
+            product_id=duplicate['product'],
+            attribute_id=duplicate['attribute']
+        ).exclude(id=duplicate['keep']).delete()
+    check_constraints(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0002_attribute_value_product_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='productattributevalue',
+            name='attribute',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='attr_product_attribute_value', to='product.attribute'),
+        ),
+        migrations.RunPython(fill_attribute, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='productattributevalue',
+            name='attribute',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='attr_product_attribute_value', to='product.attribute'),
+        ),
+        migrations.AlterField(
+            model_name='attribute',
+            name='name',
+            field=models.CharField(unique=True, verbose_name='attribute name'),
+        ),
+        # Creating the composite indexes before dropping the FK indexes
+        migrations.AddConstraint(
+            model_name='attributevalue',
+            constraint=models.UniqueConstraint(fields=('attribute', 'value'), name='unique_attribute_value'),
+        ),
+        migrations.AddConstraint(
+            model_name='productattributevalue',
+            constraint=models.UniqueConstraint(fields=('product', 'attribute'), name='unique_product_attribute'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='productattributevalue',
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name='attributevalue',
+            name='attribute',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='attribute_value', to='product.attribute'),
+        ),
+        migrations.AlterField(
+            model_name='productattributevalue',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='product_product_attribute_value', to='product.product'),
+        ),
+    ]
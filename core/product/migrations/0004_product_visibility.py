@@ -0,0 +1,52 @@
+# Generated by Django 4.2 on 2026-10-19 12:17
+
+from django.db import migrations, models
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0003_attribute_constraints'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='brand',
+            options={'default_manager_name': 'all_objects'},
+        ),
+        migrations.AlterModelOptions(
+            name='product',
+            options={'default_manager_name': 'all_objects'},
+        ),
+        migrations.AlterModelOptions(
+            name='producttype',
+            options={'default_manager_name': 'all_objects'},
+        ),
+        migrations.AlterModelManagers(
+            name='brand',
+            managers=[
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AlterModelManagers(
+            name='product',
+            managers=[
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AlterModelManagers(
+            name='producttype',
+            managers=[
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['price'], name='product_live_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-views'], name='product_live_views_idx'),
+        ),
+    ]
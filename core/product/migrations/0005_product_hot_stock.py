@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-19 12:40
+
+from django.db import migrations, models
+
+
+def clamp_negative_stock(apps, schema_editor):
+    """Oversold products have no stock left, the constraint needs >= 0."""
+    Product = apps.get_model('product', 'Product')
+    Product._default_manager.filter(stock__lt=0).update(stock=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0004_product_visibility'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='is_hot',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(
+            clamp_negative_stock, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.CheckConstraint(check=models.Q(('stock__gte', 0)), name='product_stock_gte_0'),
+        ),
+    ]
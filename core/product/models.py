@@ -5,8 +5,14 @@ import os
 import uuid
 
 from django.db import models
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save
+)
+from django.dispatch import receiver
 from django.core.exceptions import ValidationError
-from django.core.cache import cache
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
 from django.utils.text import Truncator
@@ -21,8 +27,12 @@ from autoslug import AutoSlugField
 from .fields import OrderField
 from .managers import (
     Active,
-    CustomManager
+    ActiveManager,
+    AttributeValueManager,
+    CustomManager,
+    VisibleManager
 )
+from core.cache import invalidate
 from core.timestamp import TimeStamp
 
 User = get_user_model()
@@ -45,7 +55,7 @@ def sku_generator():
     return y
 
 
-class Brand(TimeStamp):
+class Brand(LifecycleModel, TimeStamp):
     """
     This class defines attributes of the Brand model.
     """
@@ -72,7 +82,18 @@ class Brand(TimeStamp):
     )
     is_active = models.BooleanField(default=True)
 
-    objects = Active.as_manager()
+    # Active brands only, all_objects for the admin and lookups by name
+    objects = ActiveManager()
+    all_objects = Active.as_manager()
+
+    @hook(AFTER_SAVE)
+    @hook(AFTER_DELETE)
+    def invalid_cache(self):
+        """
+        Invalidating the cached products, they contain
+        the brand and hide products of inactive brands.
+        """
+        invalidate('product_objects')
 
     def desc_snippet(self):
         """Return snippet for description fields."""
@@ -82,6 +103,9 @@ class Brand(TimeStamp):
     def __str__(self):
         return self.name
 
+    class Meta:
+        default_manager_name = 'all_objects'
+
 
 class ProductImage(TimeStamp):
     """
@@ -122,7 +146,7 @@ class Attribute(TimeStamp):
     This class defines attributes of the Attribute model.
     """
     name = models.CharField(
-        _('attribute name'), max_length=None
+        _('attribute name'), max_length=None, unique=True
     )
 
     def __str__(self):
@@ -133,14 +157,26 @@ class AttributeValue(TimeStamp):
     """
     This class defines attributes of the AttributeValue model.
     """
+    # Indexed by the (attribute, value) constraint
     attribute = models.ForeignKey(
-        Attribute, on_delete=models.CASCADE, related_name='attribute_value'
+        Attribute, on_delete=models.CASCADE, related_name='attribute_value',
+        db_index=False
     )
     value = models.CharField(_('value'), max_length=None)
 
+    objects = AttributeValueManager()
+
     def __str__(self):
         return f'{self.attribute.name}: {self.value}'
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['attribute', 'value'],
+                name='unique_attribute_value'
+            ),
+        ]
+
 
 class Product(LifecycleModel, TimeStamp):
     """
@@ -169,6 +205,8 @@ class Product(LifecycleModel, TimeStamp):
         default=sku_generator
     )
     stock = models.IntegerField(_('stock quantity'), default=0)
+    # Stock kept in Redis by product.inventory
+    is_hot = models.BooleanField(default=False, editable=False)
     price = models.DecimalField(_('price'), max_digits=20, decimal_places=3)
     discount = models.PositiveIntegerField(_('discount'), default=0)
     views = models.PositiveIntegerField(_('views'), default=0)
@@ -189,7 +227,10 @@ class Product(LifecycleModel, TimeStamp):
         through='ProductAttributeValue'
     )
 
-    objects = CustomManager()
+    # Visible products only (see CustomQuerySet.visible),
+    # all_objects for the admin, inventory and unique checks
+    objects = VisibleManager()
+    all_objects = CustomManager()
 
     @hook(AFTER_SAVE)
     @hook(AFTER_DELETE)
@@ -198,7 +239,7 @@ class Product(LifecycleModel, TimeStamp):
         Invalidating cache key automatically
         after any changes in the product model.
         """
-        cache.delete('product_objects')
+        invalidate('product_objects')
 
     def desc_snippet(self):
         """Return snippet for description fields."""
@@ -208,8 +249,28 @@ class Product(LifecycleModel, TimeStamp):
     def __str__(self):
         return self.name
 
-
-class ProductType(TimeStamp):
+    class Meta:
+        default_manager_name = 'all_objects'
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(stock__gte=0), name='product_stock_gte_0'
+            ),
+        ]
+        indexes = [
+            # Partial indexes of the live rows, for the price
+            # filters and the most viewed products
+            models.Index(
+                fields=['price'], name='product_live_price_idx',
+                condition=models.Q(is_active=True)
+            ),
+            models.Index(
+                fields=['-views'], name='product_live_views_idx',
+                condition=models.Q(is_active=True)
+            ),
+        ]
+
+
+class ProductType(LifecycleModel, TimeStamp):
     """
     This class defines attributes of the ProductType model.
     """
@@ -236,46 +297,58 @@ class ProductType(TimeStamp):
     )
     is_active = models.BooleanField(default=True)
 
-    objects = Active.as_manager()
+    # Active product types only, all_objects for the admin
+    # and lookups by name
+    objects = ActiveManager()
+    all_objects = Active.as_manager()
+
+    @hook(AFTER_SAVE)
+    @hook(AFTER_DELETE)
+    def invalid_cache(self):
+        """
+        Invalidating the cached products, they contain the
+        product type and hide products of inactive types.
+        """
+        invalidate('product_objects')
 
     def __str__(self):
         return self.name
 
+    class Meta:
+        default_manager_name = 'all_objects'
+
 
 class ProductAttributeValue(TimeStamp):
     """
     Link table for many to many relations
     between Product and AttributeValue models.
     """
+    # Indexed by the (product, attribute) constraint
     product = models.ForeignKey(
         Product,
         on_delete=models.CASCADE,
-        related_name='product_product_attribute_value'
+        related_name='product_product_attribute_value',
+        db_index=False
     )
+    # Indexed by the (attribute_value, product) index
     attribute_value = models.ForeignKey(
         AttributeValue,
         on_delete=models.CASCADE,
-        related_name='attr_value_product_attribute_value'
+        related_name='attr_value_product_attribute_value',
+        db_index=False
+    )
+    # Copy of attribute_value.attribute for the one value
+    # per attribute constraint, set on save
+    attribute = models.ForeignKey(
+        Attribute,
+        on_delete=models.CASCADE,
+        related_name='attr_product_attribute_value',
+        editable=False
     )
-
-    def clean(self):
-        """
-        Preventing from entering two same
-        attributes to a specific product.
-        """
-        qs = ProductAttributeValue.objects.filter(product=self.product).filter(
-            attribute_value=self.attribute_value
-        ).exists()
-
-        if not qs:
-            attributes = Attribute.objects.filter(
-                attribute_value__product_attribute_value=self.product
-            ).values_list('name', flat=True)
-            if self.attribute_value.attribute.name in list(attributes):
-                raise ValidationError(_('Duplicate attribute exists.'))
 
     def save(self, *args, **kwargs):
         """Ensure executing clean function."""
+        self.attribute_id = self.attribute_value.attribute_id
         self.full_clean()
         return super().save()
 
@@ -285,7 +358,18 @@ class ProductAttributeValue(TimeStamp):
                 {self.attribute_value.value}'
 
     class Meta:
-        unique_together = ('product', 'attribute_value')
+        constraints = [
+            # Preventing from entering two values
+            # of an attribute to a specific product
+            models.UniqueConstraint(
+                fields=['product', 'attribute'],
+                name='unique_product_attribute'
+            ),
+        ]
+        indexes = [
+            # Products of attribute values, for filters and facets
+            models.Index(fields=['attribute_value', 'product']),
+        ]
 
 
 class ProductTypeAttribute(TimeStamp):
@@ -309,3 +393,50 @@ class ProductTypeAttribute(TimeStamp):
 
     class Meta:
         unique_together = ('product_type', 'attribute')
+
+
+def touch_products(queryset):
+    """
+    Stamping updated_at of the products, their ETags (and the
+    cached products) cover their images and specifications.
+    """
+    queryset.update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=ProductAttributeValue)
+def touch_product_of_row(sender, instance, **kwargs):
+    touch_products(Product.all_objects.filter(pk=instance.product_id))
+
+
+@receiver(m2m_changed, sender=Product.attribute_value.through)
+def touch_products_of_specifications(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """Stamping the products of add, remove, clear and set."""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            touch_products(Product.all_objects.filter(pk=instance.pk))
+    elif action in ('post_add', 'post_remove'):
+        touch_products(Product.all_objects.filter(pk__in=pk_set))
+    elif action == 'pre_clear':
+        # The products of the value are unknown after the clear
+        touch_products(
+            Product.all_objects.filter(attribute_value=instance)
+        )
+
+
+@receiver(post_save, sender=AttributeValue)
+def touch_products_of_value(sender, instance, created, **kwargs):
+    if not created:
+        touch_products(
+            Product.all_objects.filter(attribute_value=instance)
+        )
+
+
+@receiver(post_save, sender=Attribute)
+def touch_products_of_attribute(sender, instance, created, **kwargs):
+    if not created:
+        touch_products(
+            Product.all_objects.filter(attribute_value__attribute=instance)
+        )
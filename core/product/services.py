@@ -0,0 +1,116 @@
+"""
+Services for Product app.
+"""
+from django.db import transaction
+
+from core.refcache import ReferenceCache
+from .models import (
+    Attribute,
+    AttributeValue,
+    Brand,
+    Product,
+    ProductAttributeValue,
+    ProductType
+)
+
+
+def _load_by_name(model):
+    def loader(names):
+        return {
+            obj.name: obj
+            for obj in model.all_objects.filter(name__in=names)
+        }
+    return loader
+
+
+brands = ReferenceCache('brand:name', _load_by_name(Brand), models=[Brand])
+product_types = ReferenceCache(
+    'product_type:name', _load_by_name(ProductType), models=[ProductType]
+)
+attribute_ids = ReferenceCache(
+    'attribute:id',
+    lambda names: dict(
+        Attribute.objects.filter(name__in=names).values_list('name', 'id')
+    ),
+    models=[Attribute]
+)
+
+
+def get_or_create_brand(name):
+    """Return the brand with the name, creating it if it's missing."""
+    brand = brands.get(name)
+    if brand is None:
+        brand, _ = Brand.all_objects.get_or_create(name=name)
+    return brand
+
+
+def get_or_create_product_type(name):
+    """Return the product type with the name, creating it if it's missing."""
+    product_type = product_types.get(name)
+    if product_type is None:
+        product_type, _ = ProductType.all_objects.get_or_create(
+            name=name
+        )
+    return product_type
+
+
+def resolve_attribute_values(pairs):
+    """
+    Return AttributeValue objects for (attribute name, value) pairs
+    in the same order, creating missing attributes and values.
+
+    Runs a fixed number of queries whatever the number of pairs:
+    an insert ignoring existing rows and a select for each table.
+    Ids of known attributes come from the reference cache.
+    """
+    pairs = list(dict.fromkeys(pairs))
+    names = list(dict.fromkeys(name for name, _ in pairs))
+
+    ids = attribute_ids.get_many(names)
+    missing = [name for name in names if name not in ids]
+    if missing:
+        Attribute.objects.bulk_create(
+            [Attribute(name=name) for name in missing], ignore_conflicts=True
+        )
+        ids.update(attribute_ids.get_many(missing))
+
+    AttributeValue.objects.bulk_create(
+        [
+            AttributeValue(attribute_id=ids[name], value=value)
+            for name, value in pairs
+        ],
+        ignore_conflicts=True
+    )
+    attribute_values = {
+        (attribute_value.attribute_id, attribute_value.value): attribute_value
+        for attribute_value in AttributeValue.objects.filter(
+            attribute_id__in=ids.values(),
+            value__in={value for _, value in pairs}
+        )
+    }
+    return [
+        attribute_values[(ids[name], value)]
+        for name, value in pairs
+    ]
+
+
+def set_attribute_values(product, pairs):
+    """
+    Replacing the specifications of the product with the
+    (attribute name, value) pairs, one value per attribute.
+    The product row is locked, concurrent replacements would
+    otherwise insert their rows next to each other.
+    """
+    attribute_values = resolve_attribute_values(pairs)
+    with transaction.atomic():
+        list(Product.all_objects.select_for_update().filter(
+            pk=product.pk
+        ).values_list('pk', flat=True))
+        product.attribute_value.clear()
+        ProductAttributeValue.objects.bulk_create([
+            ProductAttributeValue(
+                product=product,
+                attribute_value=attribute_value,
+                attribute_id=attribute_value.attribute_id
+            ) for attribute_value in attribute_values
+        ])
@@ -0,0 +1,631 @@
+"""
+Tests for product app.
+"""
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import (
+    IntegrityError,
+    connection,
+    transaction
+)
+from django.db.models.expressions import RawSQL
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+    override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from redis.exceptions import ConnectionError
+from rest_framework.test import APIClient
+
+from accounts.services import provision_user
+from core import refcache
+from core.cache import get_or_compute
+from core.resilience import (
+    OPEN,
+    redis_breaker
+)
+from . import (
+    inventory,
+    services
+)
+from .management.commands.fault_injection_benchmark import (
+    inject_faults,
+    set_fault
+)
+from .models import (
+    AttributeValue,
+    Brand,
+    Product,
+    ProductAttributeValue,
+    ProductImage,
+    ProductType
+)
+from .services import (
+    resolve_attribute_values,
+    set_attribute_values
+)
+
+
+def create_product(name='Phone', brand='Acme', product_type='Mobile'):
+    return Product.objects.create(
+        name=name,
+        price=100,
+        stock=10,
+        brand=Brand.all_objects.get_or_create(name=brand)[0],
+        product_type=ProductType.all_objects.get_or_create(
+            name=product_type
+        )[0]
+    )
+
+
+class ProductTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        # Ids of rows rolled back by the previous tests
+        for reference_cache in refcache.registry.values():
+            reference_cache.clear_local()
+        self.client = APIClient()
+        self.product = create_product()
+        self.url = f'/product/api/v1/product/{self.product.sku}/'
+
+
+class FacetTests(ProductTestCase):
+    """Facet counts of the filtered products."""
+    facets_url = '/product/api/v1/product/facets/'
+
+    def setUp(self):
+        super().setUp()
+        specifications = [
+            ('Acme', [('color', 'red'), ('size', 'L')]),
+            ('Acme', [('color', 'blue'), ('size', 'L')]),
+            ('Acme', [('color', 'red'), ('size', 'M')]),
+            ('Other', [('color', 'red'), ('size', 'L')]),
+        ]
+        for index, (brand, pairs) in enumerate(specifications):
+            product = create_product(name=f'Shirt {index}', brand=brand)
+            set_attribute_values(product, pairs)
+
+    def facets(self, query):
+        response = self.client.get(f'{self.facets_url}?{query}')
+        self.assertEqual(response.status_code, 200)
+        return {
+            attribute: {row['value']: row['count'] for row in rows}
+            for attribute, rows in response.data.items()
+        }
+
+    def test_counts_of_every_value(self):
+        self.assertEqual(self.facets(''), {
+            'color': {'red': 3, 'blue': 1}, 'size': {'L': 3, 'M': 1}
+        })
+
+    def test_selected_attribute_keeps_its_other_values(self):
+        self.assertEqual(self.facets('attr=color:red'), {
+            'color': {'red': 3, 'blue': 1}, 'size': {'L': 2, 'M': 1}
+        })
+
+    def test_every_attribute_is_counted_without_its_own_filter(self):
+        self.assertEqual(
+            self.facets('attr=color:red&attr=size:L&brand=acme'),
+            {'color': {'red': 1, 'blue': 1}, 'size': {'L': 1, 'M': 1}}
+        )
+
+    def test_counts_take_one_query(self):
+        self.facets('')
+        with self.assertNumQueries(1):
+            self.facets('attr=color:red&attr=color:blue&attr=size:M')
+
+
+class AttributeValueTests(ProductTestCase):
+    """Resolving and setting specifications in batches."""
+
+    def test_values_are_resolved_in_order_with_fixed_queries(self):
+        pairs = [('color', 'red'), ('size', 'L'), ('color', 'red')]
+        # Looking the attributes up, inserting the missing ones and
+        # reading their ids, then inserting and reading the values
+        with self.assertNumQueries(5):
+            values = resolve_attribute_values(pairs)
+        self.assertEqual(
+            [(value.attribute.name, value.value) for value in values],
+            [('color', 'red'), ('size', 'L')]
+        )
+        pairs = [(f'name {index}', 'value') for index in range(30)]
+        with self.assertNumQueries(5):
+            self.assertEqual(len(resolve_attribute_values(pairs)), 30)
+        # Known attribute ids come from the reference cache
+        with self.assertNumQueries(2):
+            resolve_attribute_values(pairs)
+
+    def test_specifications_are_replaced(self):
+        set_attribute_values(self.product, [('color', 'red'), ('size', 'L')])
+        set_attribute_values(self.product, [('color', 'blue')])
+        self.assertEqual(
+            [str(value) for value in self.product.attribute_value.all()],
+            ['color: blue']
+        )
+
+    def test_one_value_per_attribute(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            set_attribute_values(
+                self.product, [('color', 'red'), ('color', 'blue')]
+            )
+
+
+class ConcurrentAttributeValueTests(TransactionTestCase):
+    """Concurrent requests writing the same specifications."""
+
+    def setUp(self):
+        cache.clear()
+        for reference_cache in refcache.registry.values():
+            reference_cache.clear_local()
+        self.product = create_product()
+
+    def run_concurrently(self, target, count=4):
+        barrier = threading.Barrier(count)
+        results, errors = [], []
+
+        def run():
+            try:
+                barrier.wait(5)
+                results.append(target())
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return results
+
+    def test_new_values_are_created_once(self):
+        pairs = [(f'name {index}', 'value') for index in range(10)]
+        results = self.run_concurrently(
+            lambda: [value.pk for value in resolve_attribute_values(pairs)]
+        )
+        self.assertEqual(len({tuple(ids) for ids in results}), 1)
+        self.assertEqual(AttributeValue.objects.count(), 10)
+
+    def test_products_keep_one_set_of_specifications(self):
+        self.run_concurrently(lambda: set_attribute_values(
+            self.product, [('color', 'red'), ('size', 'L')]
+        ))
+        self.assertEqual(
+            ProductAttributeValue.objects.filter(
+                product=self.product
+            ).count(), 2
+        )
+
+
+class CacheInvalidatingQuerySetTests(ProductTestCase):
+    """Set-based writes of products and the cached product list."""
+
+    def setUp(self):
+        super().setUp()
+        self.computed = 0
+        self.assert_recomputed(True)
+
+    def assert_recomputed(self, recomputed):
+        computed = self.computed
+
+        def compute():
+            self.computed += 1
+            return Product.objects.select_related('brand', 'product_type')
+
+        get_or_compute('product_objects', compute)
+        self.assertEqual(self.computed > computed, recomputed)
+
+    def write(self, write):
+        with self.captureOnCommitCallbacks() as callbacks:
+            result = write()
+        # Invalidated once the transaction commits
+        self.assert_recomputed(False)
+        for callback in callbacks:
+            callback()
+        return result
+
+    def test_update_returns_count_stamps_and_invalidates(self):
+        updated_at = self.product.updated_at
+        etag = self.client.get(self.url)['ETag']
+        rows = self.write(lambda: Product.all_objects.filter(
+            pk=self.product.pk
+        ).update(price=200))
+        self.assertEqual(rows, 1)
+        self.assert_recomputed(True)
+        self.product.refresh_from_db()
+        self.assertGreater(self.product.updated_at, updated_at)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_update_untracked_keeps_cache_and_etag(self):
+        updated_at = self.product.updated_at
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            rows = Product.all_objects.filter(
+                pk=self.product.pk
+            ).update_untracked(discount=5)
+        self.assertEqual(rows, 1)
+        self.assert_recomputed(False)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.updated_at, updated_at)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_bulk_update_stamps_and_invalidates(self):
+        updated_at = self.product.updated_at
+        self.product.price = 300
+        rows = self.write(lambda: Product.all_objects.bulk_update(
+            [self.product], ['price']
+        ))
+        self.assertEqual(rows, 1)
+        self.assert_recomputed(True)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price, 300)
+        self.assertGreater(self.product.updated_at, updated_at)
+
+    def test_bulk_create_delete_and_m2m_changes_invalidate(self):
+        writes = [
+            lambda: Product.all_objects.bulk_create([Product(
+                name='Other', price=1, stock=1,
+                brand=self.product.brand,
+                product_type=self.product.product_type
+            )]),
+            lambda: set_attribute_values(self.product, [('color', 'red')]),
+            lambda: Product.all_objects.filter(name='Other').delete(),
+        ]
+        for write in writes:
+            self.write(write)
+            self.assert_recomputed(True)
+
+    def test_writes_without_rows_dont_invalidate(self):
+        self.assertEqual(self.write(
+            lambda: Product.all_objects.filter(pk=0).update(price=1)
+        ), 0)
+        self.assert_recomputed(False)
+
+
+class ConditionalProductTests(ProductTestCase):
+    """ETags of products cover their specifications."""
+
+    def test_unchanged_product_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_specification_change_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        set_attribute_values(self.product, [('color', 'red')])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [dict(item) for item in response.data['specifications']],
+            [{'attribute': 'color', 'value': 'red'}]
+        )
+
+    def assert_reservation_changes_etags(self):
+        list_url = '/product/api/v1/product/'
+        etags = {url: self.client.get(url)['ETag'] for url in (
+            list_url, self.url
+        )}
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.reserve_stock({self.product.pk: 1})
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stock'], 9)
+
+    def test_stock_change_changes_etag(self):
+        self.assert_reservation_changes_etags()
+
+    def test_hot_stock_change_changes_etag(self):
+        inventory.warm([self.product.pk])
+        self.assert_reservation_changes_etags()
+
+
+class CachedProductsTests(ProductTestCase):
+    """Slow product querysets are recomputed before they expire."""
+
+    def test_slow_queryset_is_recomputed_early(self):
+        computed = []
+
+        def compute():
+            computed.append(1)
+            return Product.objects.annotate(
+                nap=RawSQL('SELECT pg_sleep(0.05)', ())
+            )
+
+        # -log(0.5) * delta of 0.05s * beta of 100 is above the timeout
+        with mock.patch('core.cache.random.random', return_value=0.5):
+            get_or_compute('slow_products', compute, timeout=1, beta=100)
+            self.assertGreaterEqual(cache.get('slow_products')[1], 0.05)
+            get_or_compute('slow_products', compute, timeout=1, beta=100)
+        self.assertEqual(len(computed), 2)
+
+
+class InventoryTests(TestCase):
+    """Hot products are never reserved against a stale Product.stock."""
+
+    def setUp(self):
+        cache.clear()
+        self.hot = create_product(name='Hot')
+        self.cold = create_product(name='Cold')
+        inventory.warm([self.hot.pk])
+
+    def reserve_while_redis_is_down(self, quantities):
+        with mock.patch.object(
+            inventory, 'RESERVE_SCRIPT',
+            side_effect=ConnectionError('Connection refused.')
+        ), self.assertLogs('product.inventory', 'WARNING'):
+            return inventory.reserve_stock(quantities)
+
+    def test_hot_products_are_refused_while_redis_is_down(self):
+        self.assertEqual(inventory.reserve_stock({self.hot.pk: 10}), {
+            self.hot.pk: 10
+        })
+        with self.assertRaises(inventory.InventoryUnavailable):
+            self.reserve_while_redis_is_down({self.hot.pk: 1})
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.stock, 10)
+
+        inventory.sync_product(self.hot.pk)
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.stock, 0)
+
+    def test_cold_products_are_reserved_in_db_while_redis_is_down(self):
+        self.assertEqual(
+            self.reserve_while_redis_is_down({self.cold.pk: 3}), {}
+        )
+        self.cold.refresh_from_db()
+        self.assertEqual(self.cold.stock, 7)
+
+    def test_cooled_products_are_reserved_in_db(self):
+        inventory.cool([self.hot.pk])
+        self.assertEqual(
+            self.reserve_while_redis_is_down({self.hot.pk: 3}), {}
+        )
+
+    def test_idle_hot_products_are_synced(self):
+        # Nothing to write behind, the delta is 0
+        self.assertEqual(inventory.sync(), {self.hot.pk: 0})
+        inventory.cool([self.hot.pk])
+        self.hot.refresh_from_db()
+        self.assertFalse(self.hot.is_hot)
+
+    def test_stock_cant_be_negative(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Product.all_objects.filter(pk=self.cold.pk).update(stock=-1)
+
+
+class LiveStockTests(ProductTestCase):
+    """Hot products are listed with their stock in Redis."""
+
+    def setUp(self):
+        super().setUp()
+        self.other = create_product(name='Other')
+        inventory.warm([self.product.pk])
+        inventory.reserve_stock({self.product.pk: 4})
+
+    def stocks(self, response):
+        return {
+            product['sku']: product['stock']
+            for product in response.data['results']
+        }
+
+    def test_list_reads_the_stocks_of_a_page_at_once(self):
+        with mock.patch(
+            'product.api.v1.serializers.get_stocks',
+            wraps=inventory.get_stocks
+        ) as get_stocks:
+            response = self.client.get('/product/api/v1/product/')
+        get_stocks.assert_called_once()
+        self.assertEqual(self.stocks(response), {
+            self.product.sku: 6, self.other.sku: 10
+        })
+        self.assertEqual(self.client.get(self.url).data['stock'], 6)
+
+    def test_database_stock_is_listed_while_redis_is_down(self):
+        with mock.patch(
+            'product.inventory.get_connection',
+            side_effect=ConnectionError('Connection refused.')
+        ), self.assertLogs('product.inventory', 'WARNING'):
+            response = self.client.get('/product/api/v1/product/')
+        self.assertEqual(self.stocks(response), {
+            self.product.sku: 10, self.other.sku: 10
+        })
+
+
+@override_settings(REDIS_SOCKET_TIMEOUT=0.01)
+class FaultInjectionTests(ProductTestCase):
+    """Product endpoints keep answering from the database when Redis fails."""
+
+    def test_products_are_served_while_redis_is_slow_or_down(self):
+        urls = ('/product/api/v1/product/', self.url)
+        with inject_faults() as fault_class:
+            for fault in ('slow', 'down'):
+                with self.subTest(fault=fault):
+                    set_fault(fault_class, fault)
+                    rejections = redis_breaker.counters['rejections']
+                    with self.assertLogs(level='WARNING'):
+                        for index in range(20):
+                            response = self.client.get(urls[index % 2])
+                            self.assertEqual(response.status_code, 200)
+                    # Failing fast instead of waiting for timeouts
+                    self.assertEqual(redis_breaker.state, OPEN)
+                    self.assertGreater(
+                        redis_breaker.counters['rejections'], rejections
+                    )
+            set_fault(fault_class, None)
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+
+class ArchivedReferenceTests(ProductTestCase):
+    """Owners reach their archived brands and product types."""
+
+    def setUp(self):
+        super().setUp()
+        self.owner = provision_user('09120000001', 'S3cure-pass!')
+        self.references = {
+            'brand': self.product.brand, 'type': self.product.product_type
+        }
+        for reference in self.references.values():
+            reference.owner = self.owner
+            reference.is_active = False
+            reference.save()
+
+    def patch(self, path, reference, data):
+        return self.client.patch(
+            f'/product/api/v1/{path}/{reference.slug}/', data
+        )
+
+    def test_owners_can_reactivate_archived_references(self):
+        self.client.force_authenticate(self.owner)
+        for path, reference in self.references.items():
+            with self.subTest(path=path):
+                response = self.patch(path, reference, {'is_active': True})
+                self.assertEqual(response.status_code, 200)
+                reference.refresh_from_db()
+                self.assertTrue(reference.is_active)
+
+    def test_archived_references_are_hidden_from_others(self):
+        self.client.force_authenticate(
+            provision_user('09120000002', 'S3cure-pass!')
+        )
+        for path, reference in self.references.items():
+            with self.subTest(path=path):
+                response = self.patch(path, reference, {'is_active': True})
+                self.assertEqual(response.status_code, 404)
+
+    def test_products_cant_be_added_to_archived_references(self):
+        self.client.force_authenticate(self.owner)
+        response = self.client.post('/product/api/v1/product/', {
+            'name': 'Tablet',
+            'price': 100,
+            'stock': 10,
+            'brand': self.product.brand.name,
+            'product_type': self.product.product_type.name
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'brand', 'product_type'})
+        self.assertFalse(Product.all_objects.filter(name='Tablet').exists())
+
+    def test_references_archived_by_a_queryset_are_rejected(self):
+        brand = create_product(name='Tablet', brand='Other').brand
+        # Cached while the brand is active
+        self.assertTrue(services.brands.get(brand.name).is_active)
+        with self.captureOnCommitCallbacks(execute=True):
+            Brand.all_objects.filter(pk=brand.pk).update(is_active=False)
+        self.client.force_authenticate(self.owner)
+        response = self.client.post('/product/api/v1/product/', {
+            'name': 'Laptop',
+            'price': 100,
+            'stock': 10,
+            'brand': brand.name,
+            'product_type': 'Computer'
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'brand'})
+
+
+@override_settings(STORAGES={
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage'
+    },
+    'staticfiles': {
+        # No manifest of collected files in tests
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'
+    },
+})
+class AdminTests(ProductTestCase):
+    """Bulk activation actions and changelists of the admin."""
+    products_url = '/product/api/v1/product/'
+
+    def setUp(self):
+        super().setUp()
+        admin = provision_user(
+            '09120000002', None, is_staff=True, is_superuser=True
+        )
+        self.client.force_login(admin)
+
+    def listed(self):
+        response = self.client.get(self.products_url)
+        return [product['sku'] for product in response.data['results']]
+
+    def run_action(self, model, action, objs):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/admin/product/{model}/',
+                {'action': action, '_selected_action': [o.pk for o in objs]}
+            )
+        self.assertEqual(response.status_code, 302)
+
+    def test_products_are_deactivated_and_activated(self):
+        other = create_product(name='Other')
+        self.assertEqual(
+            set(self.listed()), {self.product.sku, other.sku}
+        )
+        updated_at = self.product.updated_at
+        self.run_action('product', 'deactivate', [self.product])
+        self.assertEqual(self.listed(), [other.sku])
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.is_active)
+        self.assertGreater(self.product.updated_at, updated_at)
+
+        self.run_action('product', 'activate', [self.product])
+        self.assertEqual(
+            set(self.listed()), {self.product.sku, other.sku}
+        )
+
+    def test_deactivated_brands_leave_the_reference_cache(self):
+        self.assertTrue(services.brands.get('Acme').is_active)
+        self.run_action('brand', 'deactivate', [self.product.brand])
+        self.assertFalse(services.brands.get('Acme').is_active)
+
+    def test_changelist_queries_dont_grow_with_rows(self):
+        def count_queries(model):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(f'/admin/product/{model}/')
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        set_attribute_values(self.product, [('color', 'red')])
+        queries = {
+            model: count_queries(model)
+            for model in ('product', 'productattributevalue')
+        }
+        for index in range(5):
+            product = create_product(
+                name=f'Phone {index}', brand=f'Brand {index}'
+            )
+            set_attribute_values(product, [(f'name {index}', 'value')])
+        for model, count in queries.items():
+            self.assertEqual(count_queries(model), count, model)
+
+    def test_change_form_queries_dont_grow_with_images(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    f'/admin/product/product/{self.product.pk}/change/'
+                )
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        ProductImage.objects.bulk_create([ProductImage(
+            product=self.product, url='products/0.jpg', order=0
+        )])
+        # Filling the content types cache first
+        count_queries()
+        queries = count_queries()
+        ProductImage.objects.bulk_create([
+            ProductImage(
+                product=self.product, url=f'products/{order}.jpg',
+                order=order
+            ) for order in range(1, 6)
+        ])
+        self.assertEqual(count_queries(), queries)
@@ -14,9 +14,23 @@ class ResponseInline(admin.TabularInline):
     Inline admin panel for using in TicketingAdmin.
     """
     model = Response
+    autocomplete_fields = ['supporter']
+
+    def get_queryset(self, request):
+        # Shown with its __str__, which reads the supporter
+        return super().get_queryset(request).select_related('supporter')
 
 
 @admin.register(Ticketing)
 class TicketingAdmin(admin.ModelAdmin):
     """Admin panel config for Ticketing app."""
     inlines = [ResponseInline]
+    list_display = [
+        'subject', 'customer', 'has_response', 'assigned_to', 'created_at'
+    ]
+    list_filter = ['has_response']
+    list_select_related = ['customer', 'assigned_to']
+    search_fields = ['subject']
+    ordering = ['-created_at']
+    autocomplete_fields = ['customer', 'assigned_to']
+    list_per_page = 50
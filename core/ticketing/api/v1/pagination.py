@@ -0,0 +1,26 @@
+"""
+Custom pagination.
+"""
+from rest_framework import pagination
+
+
+class TicketQueuePagination(pagination.CursorPagination):
+    """
+    Keyset pagination over the (has_response, created_at) index,
+    pages don't slow down or shift while the queue is changing.
+    """
+    page_size = 20
+    ordering = ('created_at', 'id')
+
+
+class CustomerTicketPagination(pagination.CursorPagination):
+    """Keyset pagination over the (customer, created_at) index."""
+    page_size = 20
+    ordering = '-created_at'
+
+
+class TicketSearchPagination(pagination.PageNumberPagination):
+    """Pages of ranked search results."""
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
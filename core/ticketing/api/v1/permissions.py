@@ -0,0 +1,15 @@
+"""
+Custom permissions.
+"""
+from rest_framework import permissions
+
+
+class IsTicketCustomerOrStaff(permissions.IsAuthenticated):
+    """
+    Allowing the customer of the ticket (or the ticket
+    of an attachment) and the supporters.
+    """
+
+    def has_object_permission(self, request, view, obj):
+        ticket = getattr(obj, 'ticket', obj)
+        return request.user.is_staff or ticket.customer_id == request.user.id
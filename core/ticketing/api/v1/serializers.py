@@ -8,6 +8,7 @@ from django.contrib.auth import get_user_model
 User = get_user_model()
 
 from ...models import (
+    Attachment,
     Ticketing,
     Response
 )
@@ -36,3 +37,55 @@ class TicketingSerializer(serializers.ModelSerializer):
         if request.parser_context.get('kwargs').get('pk'):
             data.pop('absolute_url')
         return data
+
+
+class ResponseSerializer(serializers.ModelSerializer):
+    """Serializing responses of the supporters."""
+    supporter = serializers.CharField(
+        source='supporter.phone_number', read_only=True
+    )
+
+    class Meta:
+        model = Response
+        fields = ['ticket', 'supporter', 'response', 'created_at']
+        read_only_fields = ['ticket', 'created_at']
+
+
+class CustomerTicketSerializer(TicketingSerializer):
+    """
+    Serializing tickets of a customer together with their response
+    (null while unanswered), the response should be loaded with
+    select_related('tickets').
+    """
+    response = ResponseSerializer(
+        source='tickets', read_only=True, allow_null=True, default=None
+    )
+
+    class Meta(TicketingSerializer.Meta):
+        fields = TicketingSerializer.Meta.fields + [
+            'has_response', 'created_at', 'response'
+        ]
+
+
+class AttachmentSerializer(serializers.ModelSerializer):
+    """
+    Serializing attachments, created with their size before
+    uploading the content in chunks.
+    """
+    upload_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Attachment
+        fields = [
+            'id', 'file_name', 'content_type', 'size', 'offset',
+            'sha256', 'completed_at', 'created_at', 'upload_url'
+        ]
+        read_only_fields = [
+            'id', 'offset', 'sha256', 'completed_at', 'created_at'
+        ]
+
+    def get_upload_url(self, obj):
+        request = self.context.get('request')
+        return request.build_absolute_uri(
+            reverse('attachment-upload', args=[obj.pk])
+        )
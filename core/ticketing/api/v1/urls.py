@@ -8,7 +8,10 @@ from . import views
 router = DefaultRouter()
 
 router.register('ticketing', views.TicketApiViewSet, basename='ticketing')
+router.register(
+    'attachments', views.AttachmentApiViewSet, basename='attachment'
+)
 
 urlpatterns = [
 ]
-urlpatterns += router.urls
\ No newline at end of file
+urlpatterns += router.urls
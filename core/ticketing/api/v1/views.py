@@ -1,22 +1,54 @@
 """
 Endpoints of the Ticketing app.
 """
-from django.db.models import Q
-from django.core.cache import cache
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    HttpResponse
+)
+from django.utils.http import content_disposition_header
+from django.utils.translation import gettext_lazy as _
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework import (
+    mixins,
     viewsets,
     status
 )
 
+from accounts.services import get_user_id
+from core.cache import get_or_compute
+
+from .permissions import IsTicketCustomerOrStaff
+from .pagination import (
+    CustomerTicketPagination,
+    TicketQueuePagination,
+    TicketSearchPagination
+)
 from .serializers import (
-    TicketingSerializer
+    TicketingSerializer,
+    ResponseSerializer,
+    CustomerTicketSerializer,
+    AttachmentSerializer
 )
 
+from ...attachments import (
+    UploadError,
+    append_chunk,
+    attachment_path,
+    create_attachment
+)
 from ...models import (
+    Attachment,
     Ticketing
 )
+from ...search import search_tickets
+from ...services import (
+    claim_next_ticket,
+    respond_to_ticket
+)
 
 
 class TicketApiViewSet(viewsets.ModelViewSet):
@@ -24,13 +56,12 @@ class TicketApiViewSet(viewsets.ModelViewSet):
     serializer_class = TicketingSerializer
 
     def get_queryset(self):
-        queryset = cache.get('ticket_objects')
-        if queryset is None:
-            queryset = Ticketing.objects.select_related(
+        return get_or_compute(
+            'ticket_objects',
+            lambda: Ticketing.objects.select_related(
                 'customer'
-            ).all()
-            cache.set('ticket_objects', queryset)
-        return queryset
+            ).defer('search_vector')
+        )
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -47,62 +78,255 @@ class TicketApiViewSet(viewsets.ModelViewSet):
             serializer.data, status=status.HTTP_201_CREATED
         )
 
+    @action(
+        methods=['GET'],
+        detail=False,
+        url_path=r'search',
+        pagination_class=TicketSearchPagination
+    )
+    def search(self, request, *args, **kwargs):
+        """
+        Full-text search of tickets by the 'q' parameter ranked by
+        relevance, supports "phrases", or, -word and prefix* terms.
+        """
+        queryset = search_tickets(
+            self.get_queryset(), request.query_params.get('q', '')
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.serializer_class(
+            page, many=True, context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
+
     @action(
             methods=['GET'],
             detail=False,
-            url_path=r'search/(?P<subject_or_content>[\w-]+)'
+            url_path=r'search/(?P<subject_or_content>[\w-]+)',
+            pagination_class=TicketSearchPagination
     )
     def search_by_subject_or_content(
         self, request, subject_or_content=None, *args, **kwargs
     ):
         """
         Search tickets by 'subject_or_content' word either
-        if content or subject insensitivity contain it.
+        if content or subject contain it or a word starting with it.
         """
-        queryset = self.get_queryset().filter(
-            Q(subject__icontains=subject_or_content) | Q(content__icontains=subject_or_content)
+        queryset = search_tickets(
+            self.get_queryset(), f'{subject_or_content}*'
         )
+        page = self.paginate_queryset(queryset)
         serializer = self.serializer_class(
-            queryset, many=True, context={'request': request}
+            page, many=True, context={'request': request}
         )
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(serializer.data)
 
     @action(
             methods=['GET'],
             detail=False,
-            url_path=r'phone-number/(?P<phone_number>[\w-]+)'
+            url_path=r'phone-number/(?P<phone_number>[\w-]+)',
+            pagination_class=CustomerTicketPagination
     )
     def list_all_tickets_belong_to_specific_user(
         self, request, phone_number=None, *args, **kwargs
     ):
         """
-        List all tickets which belong to a provided phone number.
+        List tickets which belong to a provided phone number, newest
+        first with their responses.
         """
-        queryset = self.get_queryset().filter(
-            customer__phone_number=phone_number
-        )
-        serializer = self.serializer_class(
-            queryset, many=True, context={'request': request}
+        customer_id = get_user_id(phone_number)
+        if customer_id is None:
+            raise NotFound
+        queryset = Ticketing.objects.filter(
+            customer_id=customer_id
+        ).select_related('customer', 'tickets__supporter').defer(
+            'search_vector'
         )
-        return Response(
-            serializer.data, status=status.HTTP_200_OK
+        page = self.paginate_queryset(queryset)
+        serializer = CustomerTicketSerializer(
+            page, many=True, context={'request': request}
         )
+        return self.get_paginated_response(serializer.data)
 
     @action(
         methods=['GET'],
         detail=False,
-        url_path=r'without-response'
+        url_path=r'without-response',
+        permission_classes=[IsAdminUser],
+        pagination_class=TicketQueuePagination
     )
     def list_all_tickets_without_response(
         self, request, *args, **kwargs
     ):
         """
-        List all tickets which has no responses.
+        List the queue of tickets which has no responses, oldest first.
         """
-        queryset = self.get_queryset().filter(has_response=False)
+        queryset = self.get_queryset().queue()
+        page = self.paginate_queryset(queryset)
         serializer = self.serializer_class(
-            queryset, many=True, context={'request': request}
+            page, many=True, context={'request': request}
         )
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        methods=['POST'],
+        detail=False,
+        url_path=r'claim',
+        permission_classes=[IsAdminUser]
+    )
+    def claim(self, request, *args, **kwargs):
+        """
+        Assigning the oldest unanswered ticket to the supporter.
+        """
+        ticket = claim_next_ticket(request.user)
+        if ticket is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        serializer = self.serializer_class(
+            ticket, context={'request': request}
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(
+        methods=['POST'],
+        detail=True,
+        permission_classes=[IsAdminUser],
+        serializer_class=ResponseSerializer
+    )
+    def respond(self, request, pk=None, *args, **kwargs):
+        """
+        Responding to the ticket by the supporter.
+        """
+        serializer = ResponseSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            response = respond_to_ticket(
+                pk, request.user, serializer.validated_data['response']
+            )
+        except Ticketing.DoesNotExist:
+            raise NotFound
+        if response is None:
+            return Response(
+                {'detail': _('This ticket has already been responded.')},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         return Response(
-            serializer.data, status=status.HTTP_200_OK
+            ResponseSerializer(response).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    @action(
+        methods=['GET', 'POST'],
+        detail=True,
+        permission_classes=[IsTicketCustomerOrStaff],
+        serializer_class=AttachmentSerializer
+    )
+    def attachments(self, request, pk=None, *args, **kwargs):
+        """
+        List attachments of the ticket or start uploading a new one,
+        the content is sent to `upload_url` afterwards.
+        """
+        ticket = self.get_object()
+        if request.method == 'GET':
+            serializer = AttachmentSerializer(
+                ticket.attachments.order_by('created_at'),
+                many=True, context={'request': request}
+            )
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        serializer = AttachmentSerializer(
+            data=request.data, context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        try:
+            attachment = create_attachment(
+                ticket.pk, request.user, **serializer.validated_data
+            )
+        except UploadError as e:
+            return Response({'detail': str(e)}, status=e.status_code)
+        serializer = AttachmentSerializer(
+            attachment, context={'request': request}
+        )
+        return Response(
+            serializer.data, status=status.HTTP_201_CREATED,
+            headers={
+                'Location': serializer.data['upload_url'],
+                'Upload-Offset': 0,
+                'Upload-Length': attachment.size
+            }
+        )
+
+
+class AttachmentApiViewSet(
+    mixins.RetrieveModelMixin, viewsets.GenericViewSet
+):
+    """
+    Endpoints for uploading and downloading ticket attachments.
+    """
+    serializer_class = AttachmentSerializer
+    permission_classes = [IsTicketCustomerOrStaff]
+    queryset = Attachment.objects.select_related('ticket')
+
+    def upload_status(self, attachment, status_code=status.HTTP_200_OK):
+        return Response(
+            status=status_code,
+            headers={
+                'Upload-Offset': attachment.offset,
+                'Upload-Length': attachment.size,
+                'Cache-Control': 'no-store'
+            }
+        )
+
+    @action(methods=['HEAD', 'PATCH'], detail=True)
+    def upload(self, request, pk=None, *args, **kwargs):
+        """
+        HEAD returns the uploaded size of the attachment (Upload-Offset),
+        PATCH appends the raw body at Upload-Offset. The body is read
+        from the request stream in blocks and never parsed by DRF.
+        """
+        attachment = self.get_object()
+        if request.method == 'HEAD':
+            return self.upload_status(attachment)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return Response(
+                {'detail': _(
+                    'Upload-Offset and Content-Length are required.'
+                )},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            attachment = append_chunk(
+                attachment.pk, request._request, offset, length,
+                checksum=request.headers.get('Upload-Checksum')
+            )
+        except UploadError as e:
+            return Response({'detail': str(e)}, status=e.status_code)
+        return self.upload_status(attachment, status.HTTP_204_NO_CONTENT)
+
+    @action(methods=['GET'], detail=True)
+    def download(self, request, pk=None, *args, **kwargs):
+        """
+        Sending the file through nginx (X-Accel-Redirect), so workers
+        aren't busy with the transfer, or streaming it in development.
+        """
+        attachment = self.get_object()
+        if not attachment.is_complete:
+            raise NotFound(_('The attachment is not uploaded completely.'))
+        if settings.ATTACHMENTS_X_ACCEL:
+            response = HttpResponse(content_type=attachment.content_type)
+            response['X-Accel-Redirect'] = (
+                settings.ATTACHMENTS_X_ACCEL_LOCATION
+                + attachment.storage_name
+            )
+        else:
+            response = FileResponse(
+                open(attachment_path(attachment), 'rb'),
+                content_type=attachment.content_type
+            )
+        response['Content-Disposition'] = content_disposition_header(
+            True, attachment.file_name
         )
+        response['Content-Length'] = attachment.size
+        response['ETag'] = f'"{attachment.sha256}"'
+        return response
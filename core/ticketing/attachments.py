@@ -0,0 +1,259 @@
+"""
+Resumable and streaming storage of ticket attachments.
+
+Files are written under ATTACHMENTS_ROOT, which is outside MEDIA_ROOT
+so they aren't public, and downloads are served by nginx through
+X-Accel-Redirect. Uploads are sent in chunks (PATCH requests with an
+Upload-Offset header), every chunk is spooled and then appended to the
+file in blocks, so memory usage doesn't depend on the size of the
+attachment. The sha256 of the file is computed while it's appended,
+its state is saved with the offset between chunks.
+"""
+import base64
+import binascii
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Sum,
+    Value
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import (
+    Attachment,
+    Ticketing
+)
+
+BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Base class of the errors of attachment uploads."""
+    status_code = 400
+    message = 'Invalid upload.'
+
+    def __init__(self, message=None):
+        super().__init__(message or self.message)
+
+
+class OffsetMismatch(UploadError):
+    status_code = 409
+    message = 'Upload-Offset does not match the uploaded size.'
+
+
+class QuotaExceeded(UploadError):
+    status_code = 413
+    message = 'The attachment exceeds the allowed size.'
+
+
+class IncompleteChunk(UploadError):
+    message = 'The chunk is shorter than its Content-Length.'
+
+
+class ChecksumMismatch(UploadError):
+    # Status code of the tus protocol checksum extension
+    status_code = 460
+    message = 'The chunk does not match Upload-Checksum.'
+
+
+class _Sha256Context(ctypes.Structure):
+    """SHA256_CTX of OpenSSL."""
+    _fields_ = [
+        ('h', ctypes.c_uint * 8),
+        ('Nl', ctypes.c_uint),
+        ('Nh', ctypes.c_uint),
+        ('data', ctypes.c_uint * 16),
+        ('num', ctypes.c_uint),
+        ('md_len', ctypes.c_uint),
+    ]
+
+
+def _load_libcrypto():
+    names = [
+        ctypes.util.find_library('crypto'),
+        'libcrypto.so.3', 'libcrypto.so.1.1', 'libcrypto.dylib'
+    ]
+    for name in filter(None, names):
+        try:
+            libcrypto = ctypes.CDLL(name)
+            libcrypto.SHA256_Update.argtypes = [
+                ctypes.POINTER(_Sha256Context), ctypes.c_char_p,
+                ctypes.c_size_t
+            ]
+        except (OSError, AttributeError):
+            continue
+        return libcrypto
+    return None
+
+
+_libcrypto = _load_libcrypto()
+
+
+class RunningSha256:
+    """
+    SHA-256 whose state can be saved between chunks, hashlib objects
+    can't be serialized so the SHA256_* functions of libcrypto are used.
+    """
+
+    def __init__(self, state=b''):
+        if state:
+            self.context = _Sha256Context.from_buffer_copy(state)
+        else:
+            self.context = _Sha256Context()
+            _libcrypto.SHA256_Init(ctypes.byref(self.context))
+
+    @classmethod
+    def resume(cls, state, offset):
+        """
+        Return the hash of the first `offset` bytes from its saved state,
+        or None if it can't be resumed.
+        """
+        if _libcrypto is None or (offset and not state):
+            return None
+        return cls(state)
+
+    def update(self, data):
+        _libcrypto.SHA256_Update(ctypes.byref(self.context), data, len(data))
+
+    def state(self):
+        return bytes(self.context)
+
+    def hexdigest(self):
+        context = _Sha256Context.from_buffer_copy(self.context)
+        digest = ctypes.create_string_buffer(32)
+        _libcrypto.SHA256_Final(digest, ctypes.byref(context))
+        return digest.raw.hex()
+
+
+def attachment_path(attachment):
+    return os.path.join(settings.ATTACHMENTS_ROOT, attachment.storage_name)
+
+
+def check_quota(ticket_id, size):
+    """Raise QuotaExceeded if a new attachment doesn't fit the ticket."""
+    if size > settings.ATTACHMENT_MAX_SIZE:
+        raise QuotaExceeded
+    used = Attachment.objects.filter(ticket_id=ticket_id).aggregate(
+        used=Coalesce(Sum('size'), Value(0))
+    )['used']
+    if used + size > settings.ATTACHMENT_TICKET_QUOTA:
+        raise QuotaExceeded('The attachments quota of the ticket is full.')
+
+
+def create_attachment(ticket_id, uploader, **fields):
+    """
+    Creating an empty attachment, the ticket row is locked so
+    concurrent uploads can't exceed the quota together.
+    """
+    with transaction.atomic():
+        list(Ticketing.objects.select_for_update().filter(
+            pk=ticket_id
+        ).values_list('pk', flat=True))
+        check_quota(ticket_id, fields['size'])
+        return Attachment.objects.create(
+            ticket_id=ticket_id, uploader=uploader, **fields
+        )
+
+
+def parse_checksum(header):
+    """Return the digest of an `Upload-Checksum: sha256 <base64>` header."""
+    try:
+        algorithm, encoded = header.split()
+        if algorithm.lower() != 'sha256':
+            raise ValueError
+        return base64.b64decode(encoded, validate=True)
+    except (ValueError, binascii.Error):
+        raise UploadError('Only sha256 Upload-Checksum is supported.')
+
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(BLOCK_SIZE), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def spool_chunk(stream, length, digest=None):
+    """
+    Reading `length` bytes of the stream into a temporary file (kept in
+    memory up to FILE_UPLOAD_MAX_MEMORY_SIZE) and checking its digest.
+    """
+    chunk = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    try:
+        sha256 = hashlib.sha256()
+        remaining = length
+        while remaining:
+            block = stream.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                raise IncompleteChunk
+            chunk.write(block)
+            sha256.update(block)
+            remaining -= len(block)
+        if digest is not None and sha256.digest() != digest:
+            raise ChecksumMismatch
+    except BaseException:
+        chunk.close()
+        raise
+    chunk.seek(0)
+    return chunk
+
+
+def append_chunk(attachment_id, stream, offset, length, checksum=None):
+    """
+    Writing `length` bytes of the stream at `offset` of the attachment.
+
+    The chunk is spooled and checked before the row is locked, so a slow
+    client doesn't hold the lock, and the lock keeps concurrent requests
+    from writing the same range. A failed chunk is truncated away, so the
+    upload resumes from the previous offset. Return the updated attachment.
+    """
+    digest = parse_checksum(checksum) if checksum else None
+    if length > settings.ATTACHMENT_MAX_SIZE:
+        raise QuotaExceeded
+    with spool_chunk(stream, length, digest) as chunk, transaction.atomic():
+        attachment = Attachment.objects.select_for_update().get(
+            pk=attachment_id
+        )
+        if offset != attachment.offset:
+            raise OffsetMismatch
+        if offset + length > attachment.size:
+            raise QuotaExceeded
+
+        sha256 = RunningSha256.resume(attachment.sha256_state, offset)
+        path = attachment_path(attachment)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'ab') as file:
+            # Dropping the leftovers of an interrupted chunk
+            file.truncate(offset)
+            try:
+                for block in iter(lambda: chunk.read(BLOCK_SIZE), b''):
+                    file.write(block)
+                    if sha256 is not None:
+                        sha256.update(block)
+            except BaseException:
+                file.truncate(offset)
+                raise
+
+        attachment.offset = offset + length
+        attachment.sha256_state = sha256.state() if sha256 else b''
+        update_fields = ['offset', 'sha256_state', 'updated_at']
+        if attachment.offset == attachment.size:
+            # Reading the file again only if the state was unavailable
+            attachment.sha256 = (
+                sha256.hexdigest() if sha256 else file_sha256(path)
+            )
+            attachment.sha256_state = b''
+            attachment.completed_at = timezone.now()
+            update_fields += ['sha256', 'completed_at']
+        attachment.save(update_fields=update_fields)
+    return attachment
@@ -0,0 +1,60 @@
+"""
+Django command to fill the search vector of existing tickets.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import (
+    connection,
+    transaction
+)
+
+from ...search import search_vector_sql
+
+BACKFILL_SQL = """
+UPDATE ticketing_ticketing AS t
+SET search_vector = {vector}
+WHERE t.id IN (
+    SELECT id FROM ticketing_ticketing
+    WHERE id > %s AND (search_vector IS NULL OR %s)
+    ORDER BY id
+    LIMIT %s
+)
+RETURNING t.id
+"""
+
+
+class Command(BaseCommand):
+    """
+    Updating tickets in batches of primary keys, every batch is a
+    short transaction so the table isn't locked for long.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Rebuild every vector, not only the empty ones.'
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='Seconds to wait between batches.'
+        )
+
+    def handle(self, *args, **options):
+        sql = BACKFILL_SQL.format(vector=search_vector_sql('t.'))
+        last_id, total = 0, 0
+        while True:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    sql, [last_id, options['all'], options['batch_size']]
+                )
+                ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                break
+            last_id = max(ids)
+            total += len(ids)
+            self.stdout.write(f'{total} tickets updated...')
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'{total} tickets updated.'))
@@ -1,23 +1,42 @@
 """
 Ticketing managers.
 """
-from django.db.models import (
-    QuerySet,
-    Manager
-)
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
 from django.utils import timezone
 
-from django.core.cache import cache
+from core.managers import (
+    CacheInvalidatingManager,
+    CacheInvalidatingQuerySet
+)
+
 
-class CustomQuerySet(QuerySet):
-    """Overriding update method for cleaning cached data."""
-    def update(self, **kwargs):
-        cache.delete('ticket_objects')
-        super(CustomQuerySet, self).update(
-            updated=timezone.now(), **kwargs
+class CustomQuerySet(CacheInvalidatingQuerySet):
+    """Tickets queryset, writes invalidate the cached tickets."""
+    cache_keys = ('ticket_objects',)
+
+    def queue(self):
+        """Tickets waiting for response, oldest (closest to SLA) first."""
+        return self.filter(has_response=False).order_by('created_at', 'id')
+
+    def claimable(self):
+        """
+        Unanswered tickets which aren't assigned or their
+        assignment is older than TICKET_CLAIM_TIMEOUT.
+        """
+        expired = timezone.now() - timedelta(
+            seconds=settings.TICKET_CLAIM_TIMEOUT
         )
+        return self.queue().filter(
+            Q(assigned_to__isnull=True) | Q(assigned_at__lt=expired)
+        )
+
+    def mark_responded(self, has_response=True):
+        """Setting the has_response flag of tickets in one statement."""
+        return self.update(has_response=has_response)
 
 
-class CustomManager(Manager):
-    def get_queryset(self):
-        return CustomQuerySet(self.model, using=self._db)
\ No newline at end of file
+class CustomManager(CacheInvalidatingManager.from_queryset(CustomQuerySet)):
+    """Manager exposing the CustomQuerySet methods."""
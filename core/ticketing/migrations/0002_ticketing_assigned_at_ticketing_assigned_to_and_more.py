@@ -0,0 +1,34 @@
+# Generated by Django 4.2 on 2026-10-19 11:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ticketing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticketing',
+            name='assigned_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ticketing',
+            name='assigned_to',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='assigned_tickets', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='ticketing',
+            index=models.Index(fields=['has_response', 'created_at'], name='ticketing_t_has_res_def99b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticketing',
+            index=models.Index(fields=['assigned_to', 'has_response'], name='ticketing_t_assigne_4def58_idx'),
+        ),
+    ]
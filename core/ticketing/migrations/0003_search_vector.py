@@ -0,0 +1,49 @@
+# Generated by Django 4.2 on 2026-10-19 11:32
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Keeping search_vector up to date on inserts and on
+# updates of subject or content, existing rows are filled
+# in by the backfill_ticket_search command.
+CREATE_TRIGGER = """
+CREATE FUNCTION ticketing_ticketing_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.subject, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.content, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER ticketing_ticketing_search_vector_trigger
+BEFORE INSERT OR UPDATE OF subject, content ON ticketing_ticketing
+FOR EACH ROW EXECUTE FUNCTION ticketing_ticketing_search_vector_update();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS ticketing_ticketing_search_vector_trigger
+ON ticketing_ticketing;
+DROP FUNCTION IF EXISTS ticketing_ticketing_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0002_ticketing_assigned_at_ticketing_assigned_to_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticketing',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='ticketing',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='ticketing_t_search__fbd49d_gin'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-19 11:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ticketing', '0003_search_vector'),
+    ]
+
+    operations = [
+        # Creating the composite index before dropping the FK index
+        migrations.AddIndex(
+            model_name='ticketing',
+            index=models.Index(fields=['customer', 'created_at'], name='ticketing_t_custome_e9d495_idx'),
+        ),
+        migrations.AlterField(
+            model_name='ticketing',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='ticketing', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
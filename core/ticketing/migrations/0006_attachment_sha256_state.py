@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 13:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0005_attachment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='sha256_state',
+            field=models.BinaryField(default=b''),
+        ),
+    ]
@@ -1,17 +1,28 @@
 """
 Ticketing models.
 """
-from django.db import models
+import os
+import uuid
+
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import (
+    models,
+    transaction
+)
 from django.contrib.auth import get_user_model
 from django.utils.translation import gettext_lazy as _
-from django.core.cache import cache
 from django_lifecycle import (
     LifecycleModel,
     hook,
+    AFTER_CREATE,
     AFTER_DELETE,
-    AFTER_SAVE
+    AFTER_SAVE,
+    BEFORE_DELETE
 )
 
+from core.cache import invalidate
 from core.timestamp import TimeStamp
 from .managers import CustomManager
 
@@ -23,12 +34,21 @@ class Ticketing(LifecycleModel, TimeStamp):
     This model belongs to Ticketing
     messages received from the customers.
     """
+    # Indexed by the (customer, created_at) index
     customer = models.ForeignKey(
-        User, on_delete=models.CASCADE, related_name='ticketing'
+        User, on_delete=models.CASCADE, related_name='ticketing',
+        db_index=False
     )
     subject = models.CharField(_('subject'), max_length=250, db_index=True)
     content = models.TextField(_('content'))
     has_response = models.BooleanField(default=False)
+    assigned_to = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='assigned_tickets'
+    )
+    assigned_at = models.DateTimeField(null=True, blank=True)
+    # Maintained by a database trigger from subject (A) and content (B)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     objects = CustomManager()
 
@@ -39,13 +59,23 @@ class Ticketing(LifecycleModel, TimeStamp):
         Invalidating cache key automatically after
         any changes in the Ticketing model ocurred.
         """
-        cache.delete('ticket_objects')
+        invalidate('ticket_objects')
 
     def __str__(self):
         return f'{self.customer.phone_number} => {self.subject}'
 
+    class Meta:
+        indexes = [
+            # Queue of the tickets waiting for response, oldest first
+            models.Index(fields=['has_response', 'created_at']),
+            # Timeline of the tickets of a customer
+            models.Index(fields=['customer', 'created_at']),
+            models.Index(fields=['assigned_to', 'has_response']),
+            GinIndex(fields=['search_vector']),
+        ]
 
-class Response(TimeStamp):
+
+class Response(LifecycleModel, TimeStamp):
     """
     This model is about messages
     that belong to supporters.
@@ -60,4 +90,67 @@ class Response(TimeStamp):
     response = models.TextField(_('response'))
 
     def __str__(self):
-        return f'{self.supporter} => Ticket: {self.ticket.id}'
+        return f'{self.supporter} => Ticket: {self.ticket_id}'
+
+    @hook(AFTER_CREATE)
+    def set_has_response(self):
+        """Marking the ticket as responded in the same transaction."""
+        Ticketing.objects.filter(pk=self.ticket_id).mark_responded(True)
+
+    @hook(BEFORE_DELETE)
+    def unset_has_response(self):
+        """
+        Returning the ticket to the queue, before deleting because
+        the primary key (ticket_id) is cleared after that.
+        """
+        Ticketing.objects.filter(pk=self.ticket_id).mark_responded(False)
+
+
+class Attachment(LifecycleModel, TimeStamp):
+    """
+    Files attached to tickets, uploaded in resumable chunks.
+    `offset` is the number of bytes received so far and `sha256_state`
+    the state of their sha256 until the upload completes.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    ticket = models.ForeignKey(
+        Ticketing, on_delete=models.CASCADE, related_name='attachments'
+    )
+    uploader = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='attachments'
+    )
+    file_name = models.CharField(_('file name'), max_length=255)
+    content_type = models.CharField(
+        _('content type'), max_length=100,
+        default='application/octet-stream'
+    )
+    size = models.PositiveBigIntegerField(_('size'))
+    offset = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    sha256_state = models.BinaryField(default=b'')
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def storage_name(self):
+        """Path of the file relative to ATTACHMENTS_ROOT."""
+        return f'{self.ticket_id}/{self.id}'
+
+    @property
+    def is_complete(self):
+        return self.completed_at is not None
+
+    @hook(BEFORE_DELETE)
+    def remove_file(self):
+        """
+        Removing the file once the deletion is committed, the path
+        is computed before since the primary key is cleared after.
+        """
+        path = os.path.join(settings.ATTACHMENTS_ROOT, self.storage_name)
+
+        def remove():
+            if os.path.exists(path):
+                os.remove(path)
+        transaction.on_commit(remove)
+
+    def __str__(self):
+        return f'Ticket: {self.ticket_id} => {self.file_name}'
@@ -0,0 +1,60 @@
+"""
+Full-text search of tickets.
+
+Tickets are matched against the `search_vector` column which a
+trigger keeps up to date, subject words weigh more than content words.
+"""
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank
+)
+from django.db.models import F
+
+# Text search configuration used by the trigger, messages aren't in
+# a single language so words aren't stemmed.
+SEARCH_CONFIG = 'simple'
+
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('{config}', coalesce({table}subject, '')), 'A') || "
+    "setweight(to_tsvector('{config}', coalesce({table}content, '')), 'B')"
+)
+
+PREFIX_TERM = re.compile(r'(\w+)\*')
+
+
+def search_vector_sql(table=''):
+    """SQL expression of the search vector of a ticket row."""
+    return SEARCH_VECTOR_SQL.format(config=SEARCH_CONFIG, table=table)
+
+
+def build_query(text):
+    """
+    Building a query from the web search syntax ("quoted phrases",
+    or, -excluded) plus `word*` for prefix matches.
+    Return None if there is nothing to search.
+    """
+    query = None
+    rest = PREFIX_TERM.sub(' ', text).strip()
+    if rest:
+        query = SearchQuery(
+            rest, config=SEARCH_CONFIG, search_type='websearch'
+        )
+    for term in PREFIX_TERM.findall(text):
+        # Only word characters, so it's safe as a raw tsquery
+        prefix = SearchQuery(
+            f'{term}:*', config=SEARCH_CONFIG, search_type='raw'
+        )
+        query = prefix if query is None else query & prefix
+    return query
+
+
+def search_tickets(queryset, text):
+    """Return the tickets matching the text, ranked by relevance."""
+    query = build_query(text)
+    if query is None:
+        return queryset.none()
+    return queryset.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query)
+    ).order_by('-rank', '-created_at', '-id')
@@ -0,0 +1,44 @@
+"""
+Services for Ticketing app.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    Ticketing,
+    Response
+)
+
+
+def claim_next_ticket(supporter):
+    """
+    Assigning the oldest claimable ticket to the supporter. Rows locked
+    by other supporters are skipped (SELECT ... FOR UPDATE SKIP LOCKED),
+    so concurrent claims never return the same ticket.
+    Return None if the queue is empty.
+    """
+    with transaction.atomic():
+        ticket = Ticketing.objects.claimable().select_for_update(
+            skip_locked=True
+        ).first()
+        if ticket is None:
+            return None
+        ticket.assigned_to = supporter
+        ticket.assigned_at = timezone.now()
+        ticket.save(update_fields=['assigned_to', 'assigned_at', 'updated_at'])
+    return ticket
+
+
+def respond_to_ticket(ticket_id, supporter, response):
+    """
+    Creating the response of the ticket, the ticket row is locked
+    so it's answered once and has_response is set in the same
+    transaction (by the Response hook).
+    """
+    with transaction.atomic():
+        ticket = Ticketing.objects.select_for_update().get(pk=ticket_id)
+        if ticket.has_response:
+            return None
+        return Response.objects.create(
+            ticket=ticket, supporter=supporter, response=response
+        )
@@ -1,3 +1,375 @@
-from django.test import TestCase
+"""
+Tests for ticketing app.
+"""
+import base64
+import hashlib
+import io
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import (
+    connection,
+    transaction
+)
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+    override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.services import provision_user
+from . import attachments
+from .models import (
+    Attachment,
+    Response,
+    Ticketing
+)
+from .services import claim_next_ticket
+
+
+class CustomerTicketsTests(TestCase):
+    """Tickets of a customer together with their responses."""
+
+    def setUp(self):
+        cache.clear()
+        self.customer = provision_user('09123456789', None)
+        self.supporter = provision_user('09120000000', None, is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.supporter)
+
+    def test_every_ticket_has_a_response_key(self):
+        answered, unanswered = [
+            Ticketing.objects.create(
+                customer=self.customer, subject=subject, content=subject
+            ) for subject in ('answered', 'unanswered')
+        ]
+        Response.objects.create(
+            ticket=answered, supporter=self.supporter, response='Done.'
+        )
+        response = self.client.get(
+            '/ticketing/api/v1/ticketing/phone-number/'
+            f'{self.customer.phone_number}/'
+        )
+        self.assertEqual(response.status_code, 200)
+        responses = {
+            ticket['subject']: ticket['response']
+            for ticket in response.data['results']
+        }
+        self.assertIsNone(responses['unanswered'])
+        self.assertEqual(responses['answered']['response'], 'Done.')
+
+
+class TicketQueueTests(TestCase):
+    """Supporters pulling unanswered tickets, oldest first."""
+    base_url = '/ticketing/api/v1/ticketing/'
+
+    def setUp(self):
+        cache.clear()
+        self.customer = provision_user('09123456789', None)
+        self.supporter = provision_user('09120000000', None, is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.supporter)
+        self.tickets = [
+            Ticketing.objects.create(
+                customer=self.customer, subject=f'Ticket {index}',
+                content='Help.'
+            ) for index in range(3)
+        ]
+
+    def queue(self):
+        response = self.client.get(f'{self.base_url}without-response/')
+        self.assertEqual(response.status_code, 200)
+        return [ticket['subject'] for ticket in response.data['results']]
+
+    def claim(self):
+        response = self.client.post(f'{self.base_url}claim/')
+        if response.status_code != 200:
+            return response.status_code
+        return response.data['subject']
+
+    def test_claims_take_the_oldest_unassigned_tickets(self):
+        self.assertEqual(
+            [self.claim() for _ in range(4)],
+            ['Ticket 0', 'Ticket 1', 'Ticket 2', 204]
+        )
+        self.tickets[0].refresh_from_db()
+        self.assertEqual(self.tickets[0].assigned_to, self.supporter)
+
+    def test_expired_assignments_are_claimed_again(self):
+        claim_next_ticket(self.supporter)
+        Ticketing.objects.filter(pk=self.tickets[0].pk).update(
+            assigned_at=timezone.now() - timedelta(hours=1)
+        )
+        with override_settings(TICKET_CLAIM_TIMEOUT=60):
+            self.assertEqual(self.claim(), 'Ticket 0')
+
+    def test_responses_remove_tickets_from_the_queue(self):
+        self.assertEqual(self.queue(), ['Ticket 0', 'Ticket 1', 'Ticket 2'])
+        url = f'{self.base_url}{self.tickets[1].pk}/respond/'
+        response = self.client.post(url, {'response': 'Done.'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.queue(), ['Ticket 0', 'Ticket 2'])
+        response = self.client.post(url, {'response': 'Again.'})
+        self.assertEqual(response.status_code, 400)
+
+        Response.objects.get(ticket=self.tickets[1]).delete()
+        self.assertEqual(self.queue(), ['Ticket 0', 'Ticket 1', 'Ticket 2'])
+
+    def test_customers_cant_use_the_queue(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.post(f'{self.base_url}claim/')
+        self.assertEqual(response.status_code, 403)
+
+
+class ConcurrentClaimTests(TransactionTestCase):
+    """Claims skip the tickets locked by other supporters."""
+
+    def test_locked_tickets_are_skipped(self):
+        cache.clear()
+        customer = provision_user('09123456789', None)
+        supporter = provision_user('09120000000', None, is_staff=True)
+        first, second = [
+            Ticketing.objects.create(
+                customer=customer, subject=subject, content='Help.'
+            ) for subject in ('first', 'second')
+        ]
+        locked = threading.Event()
+        release = threading.Event()
+
+        def hold_first():
+            try:
+                with transaction.atomic():
+                    list(Ticketing.objects.select_for_update().filter(
+                        pk=first.pk
+                    ))
+                    locked.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold_first)
+        holder.start()
+        try:
+            self.assertTrue(locked.wait(5))
+            self.assertEqual(claim_next_ticket(supporter), second)
+        finally:
+            release.set()
+            holder.join()
+        self.assertEqual(claim_next_ticket(supporter), first)
+        self.assertIsNone(claim_next_ticket(supporter))
+
+
+class TicketSearchTests(TestCase):
+    """Ranked full-text search over the trigger maintained vector."""
+    base_url = '/ticketing/api/v1/ticketing/'
+
+    def setUp(self):
+        cache.clear()
+        self.customer = provision_user('09123456789', None)
+        supporter = provision_user('09120000000', None, is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(supporter)
+        for subject, content in [
+            ('Payment failed', 'The card was charged twice.'),
+            ('Delivery', 'The payment page shows an error.'),
+            ('Refund request', 'Please refund the broken charger.'),
+        ]:
+            Ticketing.objects.create(
+                customer=self.customer, subject=subject, content=content
+            )
+
+    def search(self, query, url='search/'):
+        response = self.client.get(f'{self.base_url}{url}', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [ticket['subject'] for ticket in response.data['results']]
+
+    def test_subject_matches_rank_first(self):
+        self.assertEqual(
+            self.search('payment'), ['Payment failed', 'Delivery']
+        )
+
+    def test_phrases_prefixes_and_exclusions(self):
+        self.assertEqual(self.search('"payment page"'), ['Delivery'])
+        self.assertEqual(self.search('payment -error'), ['Payment failed'])
+        self.assertEqual(
+            self.search('charge*'), ['Refund request', 'Payment failed']
+        )
+        self.assertEqual(
+            self.search('', url='search/refund/'), ['Refund request']
+        )
+        self.assertEqual(self.search(''), [])
+
+    def test_changed_tickets_are_searchable(self):
+        ticket = Ticketing.objects.get(subject='Delivery')
+        ticket.content = 'Where is my parcel?'
+        ticket.save()
+        self.assertEqual(self.search('parcel'), ['Delivery'])
+        self.assertEqual(self.search('payment'), ['Payment failed'])
+
+    def test_results_are_paginated(self):
+        Ticketing.objects.bulk_create([
+            Ticketing(
+                customer=self.customer, subject='Payment', content='Help.'
+            ) for _ in range(25)
+        ])
+        response = self.client.get(
+            f'{self.base_url}search/', {'q': 'payment', 'page_size': 10}
+        )
+        self.assertEqual(response.data['count'], 27)
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_backfill_fills_empty_vectors(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE ticketing_ticketing SET search_vector = NULL'
+            )
+        self.assertEqual(self.search('payment'), [])
+        call_command(
+            'backfill_ticket_search', batch_size=2, stdout=io.StringIO()
+        )
+        self.assertEqual(
+            self.search('payment'), ['Payment failed', 'Delivery']
+        )
+
+
+class AttachmentTests(TestCase):
+    """Resumable uploads and downloads of ticket attachments."""
+    content = b'0123456789' * 10000
+
+    def setUp(self):
+        cache.clear()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        patcher = override_settings(ATTACHMENTS_ROOT=root)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        self.customer = provision_user('09123456789', None)
+        self.ticket = Ticketing.objects.create(
+            customer=self.customer, subject='Invoice', content='Attached.'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        response = self.client.post(
+            f'/ticketing/api/v1/ticketing/{self.ticket.pk}/attachments/',
+            {'file_name': 'invoice.txt', 'size': len(self.content)}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.attachment_id = response.data['id']
+        self.url = f'/ticketing/api/v1/attachments/{self.attachment_id}/'
+
+    def send(self, offset, chunk, checksum=None):
+        headers = {'HTTP_UPLOAD_OFFSET': str(offset)}
+        if checksum is not None:
+            headers['HTTP_UPLOAD_CHECKSUM'] = 'sha256 ' + base64.b64encode(
+                checksum
+            ).decode()
+        return self.client.generic(
+            'PATCH', f'{self.url}upload/', chunk,
+            content_type='application/offset+octet-stream', **headers
+        )
+
+    def uploaded_offset(self):
+        response = self.client.head(f'{self.url}upload/')
+        self.assertEqual(response.status_code, 200)
+        return int(response['Upload-Offset'])
+
+    def upload(self, start=0, chunk_size=30000):
+        for offset in range(start, len(self.content), chunk_size):
+            chunk = self.content[offset:offset + chunk_size]
+            response = self.send(offset, chunk, hashlib.sha256(chunk).digest())
+            self.assertEqual(response.status_code, 204)
+        return Attachment.objects.get(pk=self.attachment_id)
+
+    def test_completed_upload_has_the_file_checksum(self):
+        attachment = self.upload()
+        self.assertTrue(attachment.is_complete)
+        self.assertEqual(
+            attachment.sha256, hashlib.sha256(self.content).hexdigest()
+        )
+        self.assertEqual(bytes(attachment.sha256_state), b'')
+        with open(attachments.attachment_path(attachment), 'rb') as file:
+            self.assertEqual(file.read(), self.content)
+
+    def test_completion_does_not_read_the_file_again(self):
+        with mock.patch.object(attachments, 'file_sha256') as file_sha256:
+            attachment = self.upload()
+        file_sha256.assert_not_called()
+        self.assertEqual(
+            attachment.sha256, hashlib.sha256(self.content).hexdigest()
+        )
+
+    def test_checksum_without_libcrypto(self):
+        with mock.patch.object(attachments, '_libcrypto', None):
+            attachment = self.upload()
+        self.assertEqual(
+            attachment.sha256, hashlib.sha256(self.content).hexdigest()
+        )
+
+    def test_offset_mismatch_is_rejected(self):
+        self.send(0, self.content[:1000])
+        response = self.send(500, self.content[500:1500])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.uploaded_offset(), 1000)
+
+    def test_failed_chunks_resume_from_the_previous_offset(self):
+        self.send(0, self.content[:1000])
+        response = self.send(1000, self.content[1000:2000], b'x' * 32)
+        self.assertEqual(response.status_code, 460)
+        with self.assertRaises(attachments.IncompleteChunk):
+            attachments.append_chunk(
+                self.attachment_id, io.BytesIO(self.content[1000:1500]),
+                1000, 1000
+            )
+        self.assertEqual(self.uploaded_offset(), 1000)
+
+        attachment = self.upload(start=1000)
+        self.assertEqual(
+            attachment.sha256, hashlib.sha256(self.content).hexdigest()
+        )
+
+    def test_chunk_is_read_before_the_row_is_locked(self):
+        locked = []
+
+        class Stream(io.BytesIO):
+            def read(stream, size=-1):
+                locked.append(any(
+                    'FOR UPDATE' in query['sql']
+                    for query in queries.captured_queries
+                ))
+                return super().read(size)
+
+        with CaptureQueriesContext(connection) as queries:
+            attachments.append_chunk(
+                self.attachment_id, Stream(self.content), 0,
+                len(self.content)
+            )
+        self.assertNotIn(True, locked)
+        self.assertTrue(any(
+            'FOR UPDATE' in query['sql'] for query in queries.captured_queries
+        ))
+
+    @override_settings(ATTACHMENTS_X_ACCEL=True)
+    def test_download_is_sent_by_nginx(self):
+        response = self.client.get(f'{self.url}download/')
+        self.assertEqual(response.status_code, 404)
+
+        attachment = self.upload()
+        response = self.client.get(f'{self.url}download/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            f'/protected/attachments/{attachment.storage_name}'
+        )
+        self.assertEqual(response['ETag'], f'"{attachment.sha256}"')
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertIn('invoice.txt', response['Content-Disposition'])
+        self.assertEqual(response.content, b'')
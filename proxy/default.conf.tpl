@@ -1,8 +1,59 @@
 server {
     listen ${LISTEN_PORT};
 
-    location /static {
-        alias /vol/static;
+    sendfile    on;
+    tcp_nopush  on;
+    etag        on;
+
+    # Collected static files carry content hashes in their names
+    # (ManifestStaticFilesStorage), so they can be cached forever.
+    # The .br and .gz siblings are written at collectstatic time,
+    # brotli_static comes from the ngx_brotli module built into the
+    # proxy image and falls back to gzip_static for older clients.
+    location /static/static/ {
+        alias           /vol/static/static/;
+        brotli_static   on;
+        gzip_static     on;
+        gzip_vary       on;
+        access_log      off;
+        add_header      Cache-Control "public, max-age=31536000, immutable";
+    }
+
+    # Uploaded files get a uuid file name on upload and are never
+    # rewritten in place.
+    location /media/media/ {
+        alias         /vol/static/media/;
+        access_log    off;
+        add_header    Cache-Control "public, max-age=2592000";
+    }
+
+    # Ticket attachments, only reachable through X-Accel-Redirect
+    # responses of the backend which checks the permissions.
+    location /protected/attachments/ {
+        internal;
+        alias         /vol/static/private/attachments/;
+        add_header    Cache-Control "private, no-cache";
+    }
+
+    # Attachment chunks are streamed to the backend as they arrive
+    # instead of being buffered by nginx first.
+    location ~ ^/ticketing/api/v1/attachments/[^/]+/upload/$ {
+        uwsgi_pass                 ${APP_HOST}:${APP_PORT};
+        include                    /etc/nginx/uwsgi_params;
+        uwsgi_request_buffering    off;
+        client_max_body_size       20M;
+    }
+
+    # Breaker metrics, scraped from the private networks only. The
+    # backend also checks METRICS_ALLOWED_IPS or a staff session.
+    location = /metrics/ {
+        allow                  127.0.0.1;
+        allow                  10.0.0.0/8;
+        allow                  172.16.0.0/12;
+        allow                  192.168.0.0/16;
+        deny                   all;
+        uwsgi_pass             ${APP_HOST}:${APP_PORT};
+        include                /etc/nginx/uwsgi_params;
     }
 
     location / {
@@ -10,4 +61,4 @@ server {
         include                /etc/nginx/uwsgi_params;
         client_max_body_size   20M;
     }
-}
\ No newline at end of file
+}